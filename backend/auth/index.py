@@ -1,8 +1,14 @@
 import json
 import hashlib
 import os
-import psycopg
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+
+from runtime import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_SHARED, Preflight, SyncCursor, apply_cors, exception_response, get_pool,
+    run_sync, shared_rate_limit, token_buckets, too_many_requests_response
+)
+
+PREFLIGHT = Preflight('GET, POST, OPTIONS', 'Content-Type, Authorization')
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -11,21 +17,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context - object with attributes: request_id, function_name, function_version, memory_limit_in_mb
     Returns: HTTP response dict
     '''
+    if event.get('httpMethod') == 'OPTIONS':
+        return PREFLIGHT.response(event)
+    return apply_cors(event, serve_request(event))
+
+def serve_request(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Serve a non-preflight request from the per-process connection pool"""
     method: str = event.get('httpMethod', 'GET')
     
-    # Handle CORS OPTIONS request
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
     # Get database connection string
     dsn = os.environ.get('DATABASE_URL')
     if not dsn:
@@ -39,16 +38,30 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        with psycopg.connect(dsn) as conn:
+        body_data = json.loads(event.get('body') or '{}') if method == 'POST' else {}
+        action = body_data.get('action')
+        
+        # Throttle before any database work
+        limits = rate_limit_keys(event, action, body_data)
+        retry_after = token_buckets.take(limits)
+        if retry_after:
+            return too_many_requests_response(retry_after, TOO_MANY_ATTEMPTS)
+        
+        with get_pool().connection() as conn:
             with conn.cursor() as cur:
+                if RATE_LIMIT_SHARED and limits:
+                    retry_after = run_sync(shared_rate_limit(SyncCursor(cur), limits))
+                    conn.commit()  # release bucket rows before the request's own work
+                    if retry_after:
+                        return too_many_requests_response(retry_after, TOO_MANY_ATTEMPTS)
+                
                 if method == 'POST':
-                    body_data = json.loads(event.get('body', '{}'))
-                    action = body_data.get('action')
-                    
                     if action == 'login':
                         return handle_login(cur, body_data)
                     elif action == 'register':
                         return handle_register(cur, body_data)
+                    elif action in ('delete_account', 'reset_account'):
+                        return handle_purge(conn, cur, body_data, 'delete' if action == 'delete_account' else 'reset')
                     else:
                         return {
                             'statusCode': 400,
@@ -68,38 +81,50 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Method not allowed'})
                 }
     
-    except psycopg.Error as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': f'Database error: {str(e)}'})
-        }
-    except json.JSONDecodeError:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'Invalid JSON'})
-        }
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': f'Server error: {str(e)}'})
-        }
+        return exception_response(e)
+
+# Login and registration draw from the runtime's token buckets, checked before
+# any database work. (requests per minute, burst): login attempts are limited
+# per client IP and per account, so neither one address nor many addresses can
+# guess a password
+LOGIN_IP_LIMIT = (float(os.environ.get('LOGIN_ATTEMPTS_PER_MINUTE', 30)), 10.0)
+LOGIN_EMAIL_LIMIT = (float(os.environ.get('LOGIN_ATTEMPTS_PER_ACCOUNT_PER_MINUTE', 10)), 5.0)
+REGISTER_IP_LIMIT = (float(os.environ.get('REGISTRATIONS_PER_MINUTE', 5)), 5.0)
+
+TOO_MANY_ATTEMPTS = 'Too many attempts, retry later'
+
+def rate_limit_keys(event: Dict[str, Any], action: Any, data: Dict[str, Any]) -> List[Tuple[str, float, float]]:
+    """Buckets a request draws from: (key, requests per minute, burst)"""
+    if not RATE_LIMIT_ENABLED:
+        return []
+    client_ip = ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp') or 'unknown'
+    if action in ('login', 'delete_account', 'reset_account'):
+        # Purges check the password too, so they share the login buckets
+        email = str(data.get('email', '')).strip().lower()
+        limits = [(f'auth:login:ip:{client_ip}',) + LOGIN_IP_LIMIT]
+        if email:
+            limits.append((f'auth:login:email:{email}',) + LOGIN_EMAIL_LIMIT)
+    elif action == 'register':
+        limits = [(f'auth:register:ip:{client_ip}',) + REGISTER_IP_LIMIT]
+    else:
+        return []
+    return [limit for limit in limits if limit[1] > 0]
+
+# Account deletion and data reset run in bounded batches (purge.py). One request
+# works for at most PURGE_TIME_BUDGET_SECONDS and answers 202 with the progress;
+# repeating the request resumes the job until it answers 200.
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 5000))
+PURGE_TIME_BUDGET_SECONDS = float(os.environ.get('PURGE_TIME_BUDGET_SECONDS', 10))
 
 def hash_password(password: str) -> str:
     """Hash password using SHA256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
+def credentials_hash(email: str, password: str) -> str:
+    """Digest a purge job keeps of the credentials it was started with (START_JOB_SQL in purge.py)"""
+    return hashlib.sha256(f'{email}:{hash_password(password)}'.encode()).hexdigest()
+
 def handle_login(cur, data: Dict[str, Any]) -> Dict[str, Any]:
     """Handle user login"""
     email = data.get('email', '').strip().lower()
@@ -119,7 +144,7 @@ def handle_login(cur, data: Dict[str, Any]) -> Dict[str, Any]:
     
     # Check user credentials
     cur.execute(
-        "SELECT id, email, name FROM users WHERE email = %s AND password_hash = %s",
+        "SELECT id, email, name, base_currency FROM users WHERE email = %s AND password_hash = %s",
         (email, password_hash)
     )
     user = cur.fetchone()
@@ -145,7 +170,8 @@ def handle_login(cur, data: Dict[str, Any]) -> Dict[str, Any]:
             'user': {
                 'id': user[0],
                 'email': user[1],
-                'name': user[2]
+                'name': user[2],
+                'base_currency': user[3]
             }
         })
     }
@@ -155,6 +181,7 @@ def handle_register(cur, data: Dict[str, Any]) -> Dict[str, Any]:
     email = data.get('email', '').strip().lower()
     password = data.get('password', '')
     name = data.get('name', '').strip()
+    base_currency = str(data.get('base_currency') or 'RUB').strip().upper()
     
     if not email or not password or not name:
         return {
@@ -176,6 +203,19 @@ def handle_register(cur, data: Dict[str, Any]) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Password must be at least 6 characters'})
         }
     
+    if base_currency != 'RUB':
+        # Stats are converted into the base currency, so it needs exchange rates
+        cur.execute("SELECT 1 FROM exchange_rates WHERE currency = %s LIMIT 1", (base_currency,))
+        if not cur.fetchone():
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Unknown base currency'})
+            }
+    
     # Check if user already exists
     cur.execute("SELECT id FROM users WHERE email = %s", (email,))
     if cur.fetchone():
@@ -192,8 +232,8 @@ def handle_register(cur, data: Dict[str, Any]) -> Dict[str, Any]:
     
     # Create new user
     cur.execute(
-        "INSERT INTO users (email, name, password_hash) VALUES (%s, %s, %s) RETURNING id",
-        (email, name, password_hash)
+        "INSERT INTO users (email, name, password_hash, base_currency) VALUES (%s, %s, %s, %s) RETURNING id",
+        (email, name, password_hash, base_currency)
     )
     user_id = cur.fetchone()[0]
     
@@ -208,7 +248,66 @@ def handle_register(cur, data: Dict[str, Any]) -> Dict[str, Any]:
             'user': {
                 'id': user_id,
                 'email': email,
-                'name': name
+                'name': name,
+                'base_currency': base_currency
             }
         })
-    }
\ No newline at end of file
+    }
+
+def handle_purge(conn, cur, data: Dict[str, Any], mode: str) -> Dict[str, Any]:
+    """Delete the account or reset its data after checking the credentials like login"""
+    email = data.get('email', '').strip().lower()
+    password = data.get('password', '')
+    
+    if not email or not password:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Email and password are required'})
+        }
+    
+    cur.execute(
+        "SELECT id FROM users WHERE email = %s AND password_hash = %s",
+        (email, hash_password(password))
+    )
+    user = cur.fetchone()
+    
+    from purge import get_deleted_job, run_purge, start_purge
+    
+    if not user:
+        # The account row goes with the last batch, so a repeated deletion
+        # (a lost 200, a client retry) finds its finished job instead
+        job = get_deleted_job(conn, credentials_hash(email, password))
+        if job:
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'success': True, 'job': job})
+            }
+        return {
+            'statusCode': 401,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Invalid email or password'})
+        }
+    
+    start_purge(conn, user[0], mode)
+    job = run_purge(conn, user[0], email, PURGE_BATCH_SIZE, time_budget=PURGE_TIME_BUDGET_SECONDS)
+    done = job['status'] == 'done'
+    
+    return {
+        'statusCode': 200 if done else 202,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps({'success': done, 'job': job})
+    }
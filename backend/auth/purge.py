@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Optional
+
+from psycopg import sql
+
+# Tables holding a user's data, emptied in this order: rows go before the rows
+# they reference (flags before transactions, transactions and rollups before
+# categories). transactions is partitioned, so its batches are addressed by
+# primary key (PURGE_KEYS); the other tables by ctid. change_events is not
+# among them: consumers still have to see the user's last writes and the final
+# account event, and outbox/consumer.py purge removes them once every
+# consumer's offset has passed them.
+PURGE_STEPS = (
+    'transaction_flags',
+    'detection_state',
+    'transactions',
+    'transaction_archive_rollups',
+    'notification_outbox',
+    'goal_contributions',
+    'financial_goals',
+    'category_aliases',
+    'categories',
+    'idempotency_keys',
+)
+
+PURGE_KEYS = {
+    'transactions': ('id', 'transaction_date'),
+}
+
+# A deletion or reset in progress is never downgraded: a reset requested while
+# the account is being deleted keeps deleting it. The job keeps sha256 of
+# '<email>:<password_hash>' so the owner of a deleted account can still read
+# its outcome (credentials_hash in auth/index.py).
+START_JOB_SQL = """
+    INSERT INTO account_purge_jobs AS j (user_id, mode, credentials_hash)
+    VALUES (%(user_id)s, %(mode)s, (
+        SELECT encode(sha256(convert_to(email || ':' || password_hash, 'UTF8')), 'hex')
+        FROM users WHERE id = %(user_id)s
+    ))
+    ON CONFLICT (user_id) DO UPDATE SET
+        mode = CASE WHEN j.status = 'running' AND j.mode = 'delete' THEN 'delete' ELSE EXCLUDED.mode END,
+        credentials_hash = COALESCE(EXCLUDED.credentials_hash, j.credentials_hash),
+        deleted_rows = CASE WHEN j.status = 'done' THEN '{}' ELSE j.deleted_rows END,
+        started_at = CASE WHEN j.status = 'done' THEN CURRENT_TIMESTAMP ELSE j.started_at END,
+        status = 'running',
+        finished_at = NULL,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+JOB_SQL = """
+    SELECT user_id, mode, status, step, deleted_rows, started_at, updated_at, finished_at
+    FROM account_purge_jobs
+    WHERE user_id = %s
+"""
+
+# One batch and its progress in one statement, committed together
+BATCH_SQL = """
+    WITH purged AS (
+        DELETE FROM {table} WHERE {key} IN (
+            SELECT {columns} FROM {table} WHERE user_id = %(user_id)s LIMIT %(batch_size)s
+        )
+        RETURNING 1
+    ), progress AS (
+        UPDATE account_purge_jobs
+        SET step = %(step)s,
+            deleted_rows = deleted_rows || jsonb_build_object(
+                %(step)s, COALESCE((deleted_rows->>%(step)s)::BIGINT, 0) + (SELECT COUNT(*) FROM purged)
+            ),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = %(user_id)s
+    )
+    SELECT COUNT(*) FROM purged
+"""
+
+FINISH_JOB_SQL = """
+    WITH finished AS (
+        UPDATE account_purge_jobs
+        SET status = 'done', step = NULL, finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = %(user_id)s
+        RETURNING user_id, mode, deleted_rows
+    )
+    INSERT INTO change_events (user_id, aggregate, aggregate_id, operation, payload)
+    SELECT user_id, 'account', user_id, mode, jsonb_build_object('deleted_rows', deleted_rows)
+    FROM finished
+"""
+
+# The latest finished deletion started with these credentials
+DELETED_JOB_SQL = """
+    SELECT user_id FROM account_purge_jobs
+    WHERE credentials_hash = %s AND mode = 'delete' AND status = 'done'
+    ORDER BY finished_at DESC
+    LIMIT 1
+"""
+
+JOB_FIELDS = ('user_id', 'mode', 'status', 'step', 'deleted_rows', 'started_at', 'updated_at', 'finished_at')
+
+
+def rate_limit_bucket_keys(user_id: int, email: Optional[str]) -> list:
+    """Keys of the shared rate-limit buckets that name the user (see rate_limit_keys in runtime.py and auth/index.py)"""
+    keys = [f'{function}:{kind}:user:{user_id}' for function in ('transactions', 'goals') for kind in ('read', 'write')]
+    if email:
+        keys.append(f'auth:login:email:{email}')
+    return keys
+
+
+def batch_query(step: str) -> sql.Composed:
+    """BATCH_SQL for one table; a composite key is compared as a row"""
+    columns = sql.SQL(', ').join(map(sql.Identifier, PURGE_KEYS.get(step, ('ctid',))))
+    key = sql.SQL('({})').format(columns) if step in PURGE_KEYS else columns
+    return sql.SQL(BATCH_SQL).format(table=sql.Identifier(step), key=key, columns=columns)
+
+
+def get_job(conn, user_id: int) -> Optional[Dict[str, Any]]:
+    """Current state of the user's purge job, or None"""
+    row = conn.execute(JOB_SQL, (user_id,), prepare=True).fetchone()
+    if not row:
+        return None
+    job = dict(zip(JOB_FIELDS, row))
+    for field in ('started_at', 'updated_at', 'finished_at'):
+        job[field] = job[field].isoformat() if job[field] else None
+    return job
+
+
+def get_deleted_job(conn, credentials_hash: str) -> Optional[Dict[str, Any]]:
+    """Finished deletion of the account these credentials belonged to, or None"""
+    row = conn.execute(DELETED_JOB_SQL, (credentials_hash,), prepare=True).fetchone()
+    return get_job(conn, row[0]) if row else None
+
+
+def start_purge(conn, user_id: int, mode: str) -> Dict[str, Any]:
+    '''
+    Business: Create or resume the purge job of a user
+    Args: conn - psycopg connection
+          user_id - account to purge
+          mode - 'delete' removes the account, 'reset' keeps the login and settings
+    Returns: job dict; a finished job of the same user is restarted
+    '''
+    conn.execute(START_JOB_SQL, {'user_id': user_id, 'mode': mode}, prepare=True)
+    conn.commit()
+    return get_job(conn, user_id)
+
+
+def run_purge(conn, user_id: int, email: Optional[str] = None, batch_size: int = 5000,
+              time_budget: Optional[float] = None, pause: float = 0,
+              on_batch: Optional[Callable[[str, int], None]] = None) -> Dict[str, Any]:
+    '''
+    Business: Delete a user's data in bounded, individually committed batches
+    Args: conn - psycopg connection, not in a transaction
+          user_id - account with a started job (start_purge)
+          email - login email, to drop its rate-limit bucket too
+          batch_size - rows per DELETE; bounds lock time and WAL per transaction
+          time_budget - seconds after which to stop and return a running job
+          pause - seconds to sleep between batches, to spread WAL over time
+          on_batch - progress callback(step, deleted)
+    Returns: job dict; status 'done' once everything is gone
+
+    Every call walks all steps from the start: finished ones cost one empty
+    indexed lookup each, and rows written while the purge runs are caught too.
+    A session advisory lock keeps two runs of the same job from competing.
+    '''
+    started = time.monotonic()
+    locked = conn.execute(
+        "SELECT pg_try_advisory_lock(hashtext('account_purge'), %s)", (user_id,)
+    ).fetchone()[0]
+    conn.commit()
+    if not locked:
+        return get_job(conn, user_id)
+
+    try:
+        job = get_job(conn, user_id)
+        if not job or job['status'] == 'done':
+            return job
+
+        for step in PURGE_STEPS:
+            query = batch_query(step)
+            while True:
+                deleted = conn.execute(query, {
+                    'user_id': user_id,
+                    'batch_size': batch_size,
+                    'step': step
+                }).fetchone()[0]
+                conn.commit()
+                if on_batch and deleted:
+                    on_batch(step, deleted)
+                if deleted < batch_size:
+                    break
+                if time_budget is not None and time.monotonic() - started >= time_budget:
+                    return get_job(conn, user_id)
+                if pause:
+                    time.sleep(pause)
+
+        # Small leftovers and the account row go in one transaction with the final event
+        with conn.transaction():
+            conn.execute(
+                "DELETE FROM rate_limit_buckets WHERE bucket_key = ANY(%s)",
+                (rate_limit_bucket_keys(user_id, email),)
+            )
+            if job['mode'] == 'delete':
+                conn.execute("DELETE FROM users WHERE id = %s", (user_id,))
+            conn.execute(FINISH_JOB_SQL, {'user_id': user_id})
+        return get_job(conn, user_id)
+    finally:
+        conn.rollback()
+        conn.execute("SELECT pg_advisory_unlock(hashtext('account_purge'), %s)", (user_id,))
+        conn.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Delete or reset a user account in bounded batches')
+    parser.add_argument('--user-id', type=int, required=True)
+    parser.add_argument('--mode', choices=('delete', 'reset'), default='delete')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--pause', type=float, default=0, help='seconds between batches')
+    parser.add_argument('--status', action='store_true', help='only print the job state')
+    args = parser.parse_args()
+
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        raise SystemExit('DATABASE_URL is not set')
+
+    import psycopg
+
+    def report(step: str, deleted: int) -> None:
+        sys.stderr.write(json.dumps({'step': step, 'deleted': deleted}) + '\n')
+
+    with psycopg.connect(dsn) as conn:
+        if args.status:
+            print(json.dumps(get_job(conn, args.user_id), indent=2))
+            return
+        row = conn.execute("SELECT email FROM users WHERE id = %s", (args.user_id,)).fetchone()
+        if not row and not get_job(conn, args.user_id):
+            raise SystemExit(f'User {args.user_id} not found')
+        start_purge(conn, args.user_id, args.mode)
+        job = run_purge(conn, args.user_id, row[0] if row else None, args.batch_size,
+                        pause=args.pause, on_batch=report)
+    print(json.dumps(job, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,812 @@
+# Request pipeline shared by the cloud functions: CORS, connection pools,
+# replica routing, rate limits, Idempotency-Key replay and response
+# compression. Each function is deployed as its own directory, so this file is
+# copied into every one of them by backend/shared/vendor.py: edit it here and
+# re-run the script, `vendor.py --check` fails on a stale copy.
+#
+# The self-hosted servers load all functions into one process, where the copies
+# resolve to a single `runtime` module. Nothing here is specific to a function:
+# per-function settings live in the UserFunction and Preflight objects, and the
+# module-level pools and buckets are shared by every function of the process.
+import base64
+import gzip
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import date
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# psycopg is imported where the database is first touched: OPTIONS preflights
+# and requests rejected before any query never pay for it on a cold start
+
+Dispatch = Callable[[Any, str, int, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+class UserFunction:
+    '''
+    Business: Request pipeline of a function serving the data of the user in X-User-ID
+    Args: scope - function name; names its rate-limit buckets and Idempotency-Key records
+          dispatch - coroutine (cur, method, user_id, event) running the function's route table
+          on_write - optional callback(user_id) run after every non-GET request
+    Returns: object whose handler() and async_handler() serve events
+    '''
+
+    def __init__(self, scope: str, dispatch: Dispatch, on_write: Optional[Callable[[int], None]] = None):
+        self.scope = scope
+        self.dispatch = dispatch
+        self.on_write = on_write
+        self.preflight = Preflight(
+            'GET, POST, PUT, DELETE, OPTIONS',
+            'Content-Type, Authorization, X-User-ID, Idempotency-Key, X-Min-LSN'
+        )
+
+    def handler(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer an event on the synchronous path"""
+        if event.get('httpMethod') == 'OPTIONS':
+            return self.preflight.response(event)
+        return apply_cors(event, self.serve_request(event))
+
+    async def async_handler(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer an event from the shared AsyncConnectionPool"""
+        if event.get('httpMethod') == 'OPTIONS':
+            return self.preflight.response(event)
+        return apply_cors(event, await self.serve_request_async(event))
+
+    def serve_request(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Serve a non-preflight request from the per-process connection pools"""
+        early_response, method, user_id = self.prepare_request(event)
+        if early_response:
+            return early_response
+
+        limits = self.rate_limit_keys(event, method, user_id) if RATE_LIMIT_SHARED else []
+        use_replica = READ_REPLICA_ENABLED and method == 'GET'
+        try:
+            if limits or not use_replica:
+                with get_pool().connection() as conn:
+                    with conn.cursor() as cur:
+                        if limits:
+                            retry_after = run_sync(shared_rate_limit(SyncCursor(cur), limits))
+                            conn.commit()  # release bucket rows before the request's own work
+                            if retry_after:
+                                return too_many_requests_response(retry_after)
+
+                        if not use_replica:
+                            response = run_sync(self.route_request(SyncCursor(cur), method, user_id, event))
+                            if READ_REPLICA_ENABLED:
+                                conn.commit()
+                                cur.execute("SELECT pg_current_wal_lsn()::text")
+                                response = mark_write(response, user_id, cur.fetchone()[0])
+                            return finalize_response(event, response)
+
+            with get_read_pool().connection() as conn:
+                with conn.cursor() as cur:
+                    min_lsn = read_after_write_lsn(event, user_id)
+                    if min_lsn:
+                        cur.execute(REPLICA_CAUGHT_UP_SQL, (min_lsn,), prepare=True)
+                        caught_up = cur.fetchone()[0]
+                    if not min_lsn or caught_up:
+                        return finalize_response(event, run_sync(self.route_request(SyncCursor(cur), method, user_id, event)))
+
+            # The replica has not replayed this user's last write yet
+            with get_pool().connection() as conn:
+                with conn.cursor() as cur:
+                    return finalize_response(event, run_sync(self.route_request(SyncCursor(cur), method, user_id, event)))
+        except Exception as e:
+            return exception_response(e)
+
+    async def serve_request_async(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Serve a non-preflight request from the per-process async connection pools"""
+        early_response, method, user_id = self.prepare_request(event)
+        if early_response:
+            return early_response
+
+        limits = self.rate_limit_keys(event, method, user_id) if RATE_LIMIT_SHARED else []
+        use_replica = READ_REPLICA_ENABLED and method == 'GET'
+        try:
+            pool = await get_async_pool()
+            if limits or not use_replica:
+                async with pool.connection() as conn:
+                    async with conn.cursor() as cur:
+                        if limits:
+                            retry_after = await shared_rate_limit(cur, limits)
+                            await conn.commit()  # release bucket rows before the request's own work
+                            if retry_after:
+                                return too_many_requests_response(retry_after)
+
+                        if not use_replica:
+                            response = await self.route_request(cur, method, user_id, event)
+                            if READ_REPLICA_ENABLED:
+                                await conn.commit()
+                                await cur.execute("SELECT pg_current_wal_lsn()::text")
+                                response = mark_write(response, user_id, (await cur.fetchone())[0])
+                            return finalize_response(event, response)
+
+            read_pool = await get_async_read_pool()
+            async with read_pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    min_lsn = read_after_write_lsn(event, user_id)
+                    if min_lsn:
+                        await cur.execute(REPLICA_CAUGHT_UP_SQL, (min_lsn,), prepare=True)
+                        caught_up = (await cur.fetchone())[0]
+                    if not min_lsn or caught_up:
+                        return finalize_response(event, await self.route_request(cur, method, user_id, event))
+
+            # The replica has not replayed this user's last write yet
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    return finalize_response(event, await self.route_request(cur, method, user_id, event))
+        except Exception as e:
+            return exception_response(e)
+
+    def prepare_request(self, event: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], str, Optional[int]]:
+        """Reject unconfigured, unauthenticated or rate-limited requests before touching the database"""
+        method: str = event.get('httpMethod', 'GET')
+
+        # Get database connection string
+        if not os.environ.get('DATABASE_URL'):
+            return {
+                'statusCode': 500,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Database connection not configured'})
+            }, method, None
+
+        # Get user ID from headers
+        headers = event.get('headers') or {}
+        user_id = headers.get('X-User-ID') or headers.get('x-user-id')
+        if not user_id:
+            return {
+                'statusCode': 401,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'User ID required in X-User-ID header'})
+            }, method, None
+
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Invalid user ID'})
+            }, method, None
+
+        retry_after = token_buckets.take(self.rate_limit_keys(event, method, user_id))
+        if retry_after:
+            return too_many_requests_response(retry_after), method, None
+
+        return None, method, user_id
+
+    def rate_limit_keys(self, event: Dict[str, Any], method: str, user_id: int) -> List[Tuple[str, float, float]]:
+        """Buckets a request draws from: (key, requests per minute, burst)"""
+        if not RATE_LIMIT_ENABLED:
+            return []
+        kind = 'read' if method == 'GET' else 'write'
+        per_minute, burst = RATE_LIMITS[kind]
+        if per_minute <= 0:
+            return []
+        client_ip = ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp') or 'unknown'
+        return [
+            (f'{self.scope}:{kind}:user:{user_id}', per_minute, burst),
+            (f'{self.scope}:{kind}:ip:{client_ip}', per_minute * IP_LIMIT_FACTOR, burst * IP_LIMIT_FACTOR),
+        ]
+
+    async def route_request(self, cur, method: str, user_id: int, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Dispatch request to the route table; cur is an AsyncCursor or a SyncCursor"""
+        headers = event.get('headers') or {}
+        idempotency_key = headers.get('Idempotency-Key') or headers.get('idempotency-key')
+        if idempotency_key and method in ('POST', 'PUT', 'DELETE'):
+            response = await self.run_idempotent(cur, user_id, idempotency_key, method, event)
+        else:
+            response = await self.dispatch(cur, method, user_id, event)
+        if method != 'GET' and self.on_write:
+            self.on_write(user_id)
+        return response
+
+    async def run_idempotent(self, cur, user_id: int, key: str, method: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a write once per Idempotency-Key; retries get the stored response without re-executing it"""
+        if len(key) > 255:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Idempotency-Key must be at most 255 characters'})
+            }
+
+        request_hash = hashlib.sha256(json.dumps(
+            [method, event.get('queryStringParameters') or {}, event.get('body') or ''], sort_keys=True
+        ).encode('utf-8')).hexdigest()
+        query_params = {
+            'user_id': user_id,
+            'scope': self.scope,
+            'key': key,
+            'request_hash': request_hash,
+            'ttl_hours': IDEMPOTENCY_TTL_HOURS
+        }
+
+        await cur.execute(IDEMPOTENCY_CLAIM_SQL, query_params, prepare=True)
+        row = await cur.fetchone()
+        if not row:
+            # A concurrent request with the same key committed while this one waited
+            # on the unique index; its row is visible to a new statement
+            await cur.execute(IDEMPOTENCY_LOOKUP_SQL, query_params, prepare=True)
+            row = await cur.fetchone()
+        if not row:
+            return {
+                'statusCode': 409,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Request with this Idempotency-Key is in progress, retry later'})
+            }
+
+        claimed, stored_hash, status_code, response_body = row
+        if not claimed:
+            if stored_hash != request_hash:
+                return {
+                    'statusCode': 422,
+                    'headers': {
+                        'Access-Control-Allow-Origin': '*',
+                        'Content-Type': 'application/json'
+                    },
+                    'body': json.dumps({'error': 'Idempotency-Key was already used for a different request'})
+                }
+            return {
+                'statusCode': status_code,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json',
+                    'Idempotent-Replayed': 'true'
+                },
+                'body': response_body
+            }
+
+        # The response is stored in the same transaction as the write: if the write
+        # fails and rolls back, the claim disappears with it and a retry runs anew
+        response = await self.dispatch(cur, method, user_id, event)
+        await cur.execute("""
+            UPDATE idempotency_keys SET status_code = %(status_code)s, response_body = %(response_body)s
+            WHERE user_id = %(user_id)s AND scope = %(scope)s AND idempotency_key = %(key)s
+        """, {**query_params, 'status_code': response['statusCode'], 'response_body': response['body']}, prepare=True)
+        return response
+
+# CORS. By default any origin may call the API ('*'); CORS_ALLOWED_ORIGINS
+# (comma-separated) restricts it and echoes the allowed origin with Vary: Origin.
+# Preflight responses are built once at import and returned as-is: they touch
+# neither the database nor the request beyond its Origin, and are public so a
+# CDN can answer repeated preflights for every user of an origin.
+CORS_ALLOWED_ORIGINS = frozenset(filter(None, (
+    origin.strip() for origin in os.environ.get('CORS_ALLOWED_ORIGINS', '').split(',')
+)))
+PREFLIGHT_MAX_AGE = 86400
+
+PREFLIGHT_FORBIDDEN = {
+    'statusCode': 403,
+    'headers': {'Vary': 'Origin', 'Cache-Control': f'public, max-age={PREFLIGHT_MAX_AGE}'},
+    'body': ''
+}
+
+class Preflight:
+    '''
+    Business: Prebuilt answers to OPTIONS requests of one function
+    Args: allow_methods, allow_headers - Access-Control-Allow-Methods and -Headers values
+    Returns: object whose response() picks the answer for the request's Origin
+    '''
+
+    def __init__(self, allow_methods: str, allow_headers: str):
+        headers = {
+            'Access-Control-Allow-Methods': allow_methods,
+            'Access-Control-Allow-Headers': allow_headers,
+            'Access-Control-Max-Age': str(PREFLIGHT_MAX_AGE),
+            'Cache-Control': f'public, max-age={PREFLIGHT_MAX_AGE}'
+        }
+        self._any_origin = {
+            'statusCode': 200,
+            'headers': {'Access-Control-Allow-Origin': '*', **headers},
+            'body': ''
+        }
+        self._by_origin = {
+            origin: {
+                'statusCode': 200,
+                'headers': {'Access-Control-Allow-Origin': origin, 'Vary': 'Origin', **headers},
+                'body': ''
+            }
+            for origin in CORS_ALLOWED_ORIGINS
+        }
+
+    def response(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Prebuilt answer to an OPTIONS request; callers must not modify it"""
+        if not CORS_ALLOWED_ORIGINS:
+            return self._any_origin
+        headers = event.get('headers') or {}
+        return self._by_origin.get(headers.get('Origin') or headers.get('origin'), PREFLIGHT_FORBIDDEN)
+
+def add_vary(response: Dict[str, Any], *names: str) -> None:
+    """Append request header names to the response's Vary header"""
+    headers = response.setdefault('headers', {})
+    vary = [name for name in headers.get('Vary', '').split(', ') if name]
+    headers['Vary'] = ', '.join(vary + [name for name in names if name not in vary])
+
+def apply_cors(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    """With an origin allow-list, answer only allowed origins and only with their own name"""
+    if not CORS_ALLOWED_ORIGINS:
+        return response
+    headers = event.get('headers') or {}
+    origin = headers.get('Origin') or headers.get('origin')
+    response_headers = {**response.get('headers', {})}
+    response_headers.pop('Access-Control-Allow-Origin', None)
+    if origin in CORS_ALLOWED_ORIGINS:
+        response_headers['Access-Control-Allow-Origin'] = origin
+    response['headers'] = response_headers
+    add_vary(response, 'Origin')
+    return response
+
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', 24))
+
+# Claims the key, or returns the stored request hash and response of a live
+# claim, in a single statement. Expired keys are reclaimed in place.
+IDEMPOTENCY_CLAIM_SQL = """
+    WITH claimed AS (
+        INSERT INTO idempotency_keys (user_id, scope, idempotency_key, request_hash, expires_at)
+        VALUES (%(user_id)s, %(scope)s, %(key)s, %(request_hash)s,
+                CURRENT_TIMESTAMP + %(ttl_hours)s * INTERVAL '1 hour')
+        ON CONFLICT (user_id, scope, idempotency_key) DO UPDATE SET
+            request_hash = EXCLUDED.request_hash,
+            status_code = NULL,
+            response_body = NULL,
+            created_at = CURRENT_TIMESTAMP,
+            expires_at = EXCLUDED.expires_at
+        WHERE idempotency_keys.expires_at < CURRENT_TIMESTAMP
+        RETURNING TRUE AS claimed
+    )
+    SELECT claimed, NULL::TEXT, NULL::SMALLINT, NULL::TEXT FROM claimed
+    UNION ALL
+    SELECT FALSE, request_hash, status_code, response_body
+    FROM idempotency_keys
+    WHERE user_id = %(user_id)s AND scope = %(scope)s AND idempotency_key = %(key)s
+        AND expires_at >= CURRENT_TIMESTAMP
+    ORDER BY 1 DESC
+    LIMIT 1
+"""
+
+IDEMPOTENCY_LOOKUP_SQL = """
+    SELECT FALSE, request_hash, status_code, response_body
+    FROM idempotency_keys
+    WHERE user_id = %(user_id)s AND scope = %(scope)s AND idempotency_key = %(key)s
+"""
+
+def exception_response(e: Exception) -> Dict[str, Any]:
+    """Map an exception raised while serving a request to an HTTP error response"""
+    import psycopg
+    if isinstance(e, psycopg.Error):
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': f'Database error: {str(e)}'})
+        }
+    if isinstance(e, json.JSONDecodeError):
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Invalid JSON'})
+        }
+    return {
+        'statusCode': 500,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps({'error': f'Server error: {str(e)}'})
+    }
+
+# Request handlers are coroutines shared by both entry points. The async path
+# awaits a psycopg AsyncCursor; the sync path wraps a regular cursor in
+# SyncCursor, whose awaitables complete immediately, and drives the coroutine
+# with run_sync without an event loop.
+
+class SyncCursor:
+    """Async-style facade over a psycopg cursor for the shared handlers"""
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    @property
+    def rowcount(self) -> int:
+        return self._cur.rowcount
+
+    @property
+    def connection(self) -> 'SyncConnection':
+        return SyncConnection(self._cur.connection)
+
+    async def execute(self, query, params=None, *, prepare: Optional[bool] = None) -> 'SyncCursor':
+        self._cur.execute(query, params, prepare=prepare)
+        return self
+
+    async def fetchone(self):
+        return self._cur.fetchone()
+
+    async def fetchall(self):
+        return self._cur.fetchall()
+
+class SyncConnection:
+    """Async-style facade over a psycopg connection for the shared handlers"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self) -> SyncCursor:
+        return SyncCursor(self._conn.cursor())
+
+    @asynccontextmanager
+    async def pipeline(self):
+        with self._conn.pipeline():
+            yield
+
+def run_sync(coro):
+    """Run a handler coroutine whose awaits never suspend (SyncCursor path)"""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError('Handler suspended on the synchronous path')
+
+# Pools are opened on first use and reused across warm invocations; in the
+# self-hosted servers every function of a process shares them
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Lazily open the per-process connection pool reused across warm invocations"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from psycopg_pool import ConnectionPool
+            _pool = ConnectionPool(
+                os.environ['DATABASE_URL'],
+                min_size=int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+                max_size=int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+                max_idle=300,
+                open=True
+            )
+    return _pool
+
+_async_pool = None
+_async_pool_lock = None
+
+def async_pool_lock():
+    """Lock guarding async pool creation, made on first use so cold starts skip importing asyncio"""
+    global _async_pool_lock
+    if _async_pool_lock is None:
+        import asyncio
+        _async_pool_lock = asyncio.Lock()
+    return _async_pool_lock
+
+async def get_async_pool():
+    """Lazily open the per-process async connection pool"""
+    global _async_pool
+    async with async_pool_lock():
+        if _async_pool is None:
+            from psycopg_pool import AsyncConnectionPool
+            pool = AsyncConnectionPool(
+                os.environ['DATABASE_URL'],
+                min_size=int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+                max_size=int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+                open=False
+            )
+            await pool.open()
+            _async_pool = pool
+    return _async_pool
+
+_read_pool = None
+
+def get_read_pool():
+    """Lazily open the per-process pool for the read replica (DATABASE_READ_URL)"""
+    global _read_pool
+    with _pool_lock:
+        if _read_pool is None:
+            from psycopg_pool import ConnectionPool
+            _read_pool = ConnectionPool(
+                os.environ['DATABASE_READ_URL'],
+                min_size=int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+                max_size=int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+                max_idle=300,
+                open=True
+            )
+    return _read_pool
+
+_async_read_pool = None
+
+async def get_async_read_pool():
+    """Lazily open the per-process async pool for the read replica"""
+    global _async_read_pool
+    async with async_pool_lock():
+        if _async_read_pool is None:
+            from psycopg_pool import AsyncConnectionPool
+            pool = AsyncConnectionPool(
+                os.environ['DATABASE_READ_URL'],
+                min_size=int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+                max_size=int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+                open=False
+            )
+            await pool.open()
+            _async_read_pool = pool
+    return _async_read_pool
+
+async def close_async_pools() -> None:
+    """Close the async pools (ASGI shutdown); safe to call more than once"""
+    global _async_pool, _async_read_pool
+    async with async_pool_lock():
+        for pool in (_async_pool, _async_read_pool):
+            if pool is not None:
+                await pool.close()
+        _async_pool = _async_read_pool = None
+
+# With DATABASE_READ_URL set, GETs are served by the replica and writes by the
+# primary. A write records the primary's WAL position for its user, in this
+# instance and in the X-Write-LSN response header (clients echo it back as
+# X-Min-LSN, so other instances honour it too). Until the marker expires, that
+# user's reads go to the replica only once it has replayed past the position.
+READ_REPLICA_ENABLED = bool(os.environ.get('DATABASE_READ_URL'))
+READ_AFTER_WRITE_SECONDS = float(os.environ.get('READ_AFTER_WRITE_SECONDS', 60))
+RECENT_WRITES_MAX_USERS = 10000
+
+# NULL replay position means the "replica" is a primary: always caught up
+REPLICA_CAUGHT_UP_SQL = "SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, TRUE)"
+
+_recent_writes: 'OrderedDict[int, Tuple[int, float]]' = OrderedDict()
+_recent_writes_lock = threading.Lock()
+
+def parse_lsn(lsn: Any) -> Optional[int]:
+    """'16/B374D848' -> integer WAL position, None if malformed or not a valid pg_lsn"""
+    try:
+        high, low = (int(part, 16) for part in str(lsn).split('/'))
+    except ValueError:
+        return None
+    # int() accepts signs and any width; pg_lsn is two unsigned 32-bit halves
+    if not (0 <= high <= 0xFFFFFFFF and 0 <= low <= 0xFFFFFFFF):
+        return None
+    return (high << 32) | low
+
+def format_lsn(position: int) -> str:
+    return f'{position >> 32:X}/{position & 0xFFFFFFFF:X}'
+
+def mark_write(response: Dict[str, Any], user_id: int, lsn: str) -> Dict[str, Any]:
+    """Remember the user's last write position and hand it to the client"""
+    position = parse_lsn(lsn)
+    with _recent_writes_lock:
+        previous = _recent_writes.pop(user_id, (0, 0.0))[0]
+        _recent_writes[user_id] = (max(previous, position), time.monotonic() + READ_AFTER_WRITE_SECONDS)
+        while len(_recent_writes) > RECENT_WRITES_MAX_USERS:
+            _recent_writes.popitem(last=False)
+    return {
+        **response,
+        'headers': {
+            **response['headers'],
+            'Access-Control-Expose-Headers': 'X-Write-LSN',
+            'X-Write-LSN': lsn
+        }
+    }
+
+def read_after_write_lsn(event: Dict[str, Any], user_id: int) -> Optional[str]:
+    """WAL position the replica must have replayed to serve this user's read, if any"""
+    headers = event.get('headers') or {}
+    position = parse_lsn(headers.get('X-Min-LSN') or headers.get('x-min-lsn') or '') or 0
+    with _recent_writes_lock:
+        marker = _recent_writes.get(user_id)
+        if marker and marker[1] > time.monotonic():
+            position = max(position, marker[0])
+        elif marker:
+            del _recent_writes[user_id]
+    return format_lsn(position) if position else None
+
+def forget_recent_writes() -> None:
+    """Drop every read-after-write marker of this instance"""
+    with _recent_writes_lock:
+        _recent_writes.clear()
+
+# Token-bucket rate limits, checked before any database work. Buckets live in
+# a bounded per-instance LRU map; with RATE_LIMIT_SHARED=1 they are also
+# enforced across instances through the rate_limit_buckets table. Bucket keys
+# start with the function's scope, so functions of one process never collide.
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMIT_SHARED = os.environ.get('RATE_LIMIT_SHARED') == '1'
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 10000))
+
+# (requests per minute, burst) of one user of a UserFunction; a client IP gets
+# IP_LIMIT_FACTOR times as much, since users behind one NAT share it
+RATE_LIMITS = {
+    'read': (float(os.environ.get('RATE_LIMIT_READS_PER_MINUTE', 600)), 100.0),
+    'write': (float(os.environ.get('RATE_LIMIT_WRITES_PER_MINUTE', 120)), 30.0),
+}
+IP_LIMIT_FACTOR = 5
+
+class TokenBuckets:
+    '''
+    Business: Per-instance token buckets kept in a bounded LRU map
+    Args: max_keys - buckets kept; the least recently used one is evicted beyond that
+    Returns: object whose take() grants or refuses a request
+    '''
+
+    def __init__(self, max_keys: int):
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def take(self, limits: List[Tuple[str, float, float]]) -> float:
+        """Take one token from every (key, per_minute, burst) bucket; returns 0 or seconds to wait"""
+        now = time.monotonic()
+        with self._lock:
+            refilled = []
+            for key, per_minute, burst in limits:
+                tokens, updated_at = self._buckets.pop(key, (burst, now))
+                refilled.append(min(burst, tokens + (now - updated_at) * per_minute / 60))
+
+            # All or nothing, so a refused request costs no bucket a token
+            granted = all(tokens >= 1 for tokens in refilled)
+            retry_after = 0.0
+            for (key, per_minute, burst), tokens in zip(limits, refilled):
+                if granted:
+                    tokens -= 1
+                elif tokens < 1:
+                    retry_after = max(retry_after, (1 - tokens) * 60 / per_minute)
+                self._buckets[key] = (tokens, now)
+
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+token_buckets = TokenBuckets(RATE_LIMIT_MAX_KEYS)
+
+def too_many_requests_response(retry_after: float, message: str = 'Too many requests, retry later') -> Dict[str, Any]:
+    """429 response telling the client when a token will be available"""
+    return {
+        'statusCode': 429,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json',
+            'Access-Control-Expose-Headers': 'Retry-After',
+            'Retry-After': str(max(1, math.ceil(retry_after)))
+        },
+        'body': json.dumps({'error': message})
+    }
+
+# One statement for all buckets of a request; rows are taken in key order so
+# concurrent requests sharing buckets cannot deadlock. The table is UNLOGGED:
+# losing counters on a crash only resets the limits.
+SHARED_RATE_LIMIT_SQL = """
+    WITH taken AS (
+        INSERT INTO rate_limit_buckets AS b (bucket_key, tokens, per_second, burst, allowed, updated_at)
+        SELECT key, burst - 1, per_minute / 60, burst, TRUE, clock_timestamp()
+        FROM unnest(%(keys)s::TEXT[], %(per_minute)s::FLOAT8[], %(burst)s::FLOAT8[]) AS l(key, per_minute, burst)
+        ORDER BY key
+        ON CONFLICT (bucket_key) DO UPDATE SET
+            tokens = CASE
+                WHEN LEAST(EXCLUDED.burst, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * EXCLUDED.per_second) >= 1
+                THEN LEAST(EXCLUDED.burst, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * EXCLUDED.per_second) - 1
+                ELSE LEAST(EXCLUDED.burst, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * EXCLUDED.per_second)
+            END,
+            allowed = LEAST(EXCLUDED.burst, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * EXCLUDED.per_second) >= 1,
+            per_second = EXCLUDED.per_second,
+            burst = EXCLUDED.burst,
+            updated_at = clock_timestamp()
+        RETURNING allowed, tokens, per_second
+    )
+    SELECT COALESCE(MAX(CASE WHEN allowed THEN 0 ELSE (1 - tokens) / per_second END), 0)::FLOAT8
+    FROM taken
+"""
+
+async def shared_rate_limit(cur, limits: List[Tuple[str, float, float]]) -> float:
+    """Take one token from every bucket in Postgres; returns 0 or seconds to wait"""
+    await cur.execute(SHARED_RATE_LIMIT_SQL, {
+        'keys': [key for key, _, _ in limits],
+        'per_minute': [per_minute for _, per_minute, _ in limits],
+        'burst': [burst for _, _, burst in limits]
+    }, prepare=True)
+    return (await cur.fetchone())[0]
+
+# Responses at least this large are compressed when the client accepts it
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+
+_brotli = None
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick 'br' or 'gzip' from an Accept-Encoding header, honouring q=0"""
+    global _brotli
+    qualities: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        coding, *params = part.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    # '*' only speaks for codings the header does not name, so 'gzip;q=0, *' excludes gzip
+    wildcard = qualities.get('*', 0.0)
+    accepted = {coding for coding in ('br', 'gzip') if qualities.get(coding, wildcard) > 0}
+
+    if 'br' in accepted:
+        if _brotli is None:
+            try:
+                import brotli
+                _brotli = brotli
+            except ImportError:
+                _brotli = False
+        if _brotli:
+            return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+# Successful GETs may be kept by the browser for READ_CACHE_SECONDS (default 0:
+# not cached). This saves requests, not preflights: the browser still sends the
+# preflight unless its own preflight cache (Access-Control-Max-Age) holds one.
+# The cache is private and varies by user and by X-Min-LSN, so a client sending
+# a new write position after a write always reaches the server.
+READ_CACHE_SECONDS = int(os.environ.get('READ_CACHE_SECONDS', 0))
+
+def finalize_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    """Mark cacheable reads and compress large response bodies according to the request's Accept-Encoding"""
+    if READ_CACHE_SECONDS and event.get('httpMethod') == 'GET' and response.get('statusCode') == 200:
+        response['headers'] = {**response.get('headers', {}), 'Cache-Control': f'private, max-age={READ_CACHE_SECONDS}'}
+        add_vary(response, 'X-User-ID', 'X-Min-LSN', 'Accept-Encoding')
+
+    body = response.get('body')
+    if not isinstance(body, str) or len(body) < COMPRESSION_MIN_BYTES or response.get('isBase64Encoded'):
+        return response
+
+    headers = event.get('headers') or {}
+    accept_encoding = headers.get('Accept-Encoding') or headers.get('accept-encoding') or ''
+    encoding = negotiate_encoding(accept_encoding)
+    if not encoding:
+        return response
+
+    raw_body = body.encode('utf-8')
+    if encoding == 'br':
+        compressed = _brotli.compress(raw_body, quality=5)
+    else:
+        compressed = gzip.compress(raw_body, compresslevel=5, mtime=0)
+
+    response['headers'] = {**response.get('headers', {}), 'Content-Encoding': encoding}
+    add_vary(response, 'Accept-Encoding')
+    response['body'] = base64.b64encode(compressed).decode('ascii')
+    response['isBase64Encoded'] = True
+    return response
+
+def to_columns(rows: List[Dict[str, Any]], fields: Tuple[str, ...]) -> Dict[str, List[Any]]:
+    """Columnar payload: one array per field instead of repeating keys on every row"""
+    return {field: [row[field] for row in rows] for field in fields}
+
+def decimal_default(obj):
+    """JSON serializer for Decimal (and date) values"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError
@@ -0,0 +1,135 @@
+import unittest
+from contextlib import contextmanager
+
+from psycopg import sql
+
+from purge import FINISH_JOB_SQL, JOB_FIELDS, JOB_SQL, PURGE_STEPS, batch_query, rate_limit_bucket_keys, run_purge
+
+
+def render(composable) -> str:
+    """Statement text with identifiers double-quoted; psycopg 3.1 needs a connection to escape them"""
+    if isinstance(composable, sql.Composed):
+        return ''.join(render(part) for part in composable)
+    if isinstance(composable, sql.Identifier):
+        return '.'.join(f'"{name}"' for name in composable._obj)
+    return composable.as_string(None)
+
+
+class BatchQueryTest(unittest.TestCase):
+    def test_partitioned_transactions_are_deleted_by_primary_key(self):
+        query = ' '.join(render(batch_query('transactions')).split())
+        self.assertIn(
+            'DELETE FROM "transactions" WHERE ("id", "transaction_date") IN ( '
+            'SELECT "id", "transaction_date" FROM "transactions" WHERE user_id = %(user_id)s LIMIT %(batch_size)s )',
+            query
+        )
+
+    def test_other_tables_are_deleted_by_ctid(self):
+        query = ' '.join(render(batch_query('categories')).split())
+        self.assertIn(
+            'DELETE FROM "categories" WHERE "ctid" IN ( '
+            'SELECT "ctid" FROM "categories" WHERE user_id = %(user_id)s LIMIT %(batch_size)s )',
+            query
+        )
+
+
+class PurgeStepsTest(unittest.TestCase):
+    def test_rows_go_before_the_rows_they_reference(self):
+        position = PURGE_STEPS.index
+        self.assertLess(position('transaction_flags'), position('transactions'))
+        self.assertLess(position('transactions'), position('categories'))
+        self.assertLess(position('transaction_archive_rollups'), position('categories'))
+        self.assertLess(position('category_aliases'), position('categories'))
+        self.assertLess(position('goal_contributions'), position('financial_goals'))
+        self.assertLess(position('notification_outbox'), position('financial_goals'))
+
+    def test_change_events_are_left_to_the_consumers(self):
+        self.assertNotIn('change_events', PURGE_STEPS)
+
+    def test_rate_limit_buckets_named_after_the_user(self):
+        self.assertEqual(rate_limit_bucket_keys(7, 'ann@example.com'), [
+            'transactions:read:user:7', 'transactions:write:user:7',
+            'goals:read:user:7', 'goals:write:user:7',
+            'auth:login:email:ann@example.com'
+        ])
+        self.assertEqual(len(rate_limit_bucket_keys(7, None)), 4)
+
+
+class ScriptedConnection:
+    """Connection stand-in: a running job whose batches delete the scripted number of rows per step"""
+
+    def __init__(self, mode, deleted, locked=True):
+        self.job = dict.fromkeys(JOB_FIELDS)
+        self.job.update(user_id=7, mode=mode, status='running', deleted_rows={})
+        self.deleted = {step: list(counts) for step, counts in deleted.items()}
+        self.locked = locked
+        self.batches = []
+        self.statements = []
+        self._row = None
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def execute(self, query, params=None, prepare=None):
+        if isinstance(query, sql.Composed):
+            step = params['step']
+            self.batches.append(step if query == batch_query(step) else ('unexpected query', step))
+            counts = self.deleted.get(step)
+            self._row = (counts.pop(0) if counts else 0,)
+        elif query == JOB_SQL:
+            self._row = tuple(self.job[field] for field in JOB_FIELDS)
+        elif 'pg_try_advisory_lock' in query:
+            self._row = (self.locked,)
+        else:
+            if query == FINISH_JOB_SQL:
+                self.job['status'] = 'done'
+            self.statements.append(' '.join(query.split()))
+        return self
+
+    def fetchone(self):
+        return self._row
+
+
+class RunPurgeTest(unittest.TestCase):
+    def test_walks_every_step_until_a_batch_comes_back_short(self):
+        conn = ScriptedConnection('delete', {'transactions': [2, 2, 1], 'categories': [2, 0]})
+
+        job = run_purge(conn, 7, 'ann@example.com', batch_size=2)
+
+        self.assertEqual(job['status'], 'done')
+        expected = []
+        for step in PURGE_STEPS:
+            expected += [step] * {'transactions': 3, 'categories': 2}.get(step, 1)
+        self.assertEqual(conn.batches, expected)
+        self.assertIn('DELETE FROM users WHERE id = %s', conn.statements)
+
+    def test_reset_keeps_the_account_row(self):
+        conn = ScriptedConnection('reset', {})
+
+        self.assertEqual(run_purge(conn, 7)['status'], 'done')
+        self.assertNotIn('DELETE FROM users WHERE id = %s', conn.statements)
+
+    def test_stops_after_a_full_batch_once_the_time_budget_is_spent(self):
+        conn = ScriptedConnection('delete', {'transaction_flags': [2, 2]})
+
+        job = run_purge(conn, 7, batch_size=2, time_budget=0)
+
+        self.assertEqual(job['status'], 'running')
+        self.assertEqual(conn.batches, ['transaction_flags'])
+
+    def test_a_job_running_elsewhere_is_left_alone(self):
+        conn = ScriptedConnection('delete', {}, locked=False)
+
+        self.assertEqual(run_purge(conn, 7)['status'], 'running')
+        self.assertEqual(conn.batches, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
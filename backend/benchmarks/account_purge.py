@@ -0,0 +1,111 @@
+import json
+import os
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+import psycopg
+from psycopg import sql
+
+from common import call_sync, create_bench_user, delete_bench_user, get_bench_dsn, load_function
+
+# Small batches and a zero time budget make every table take several batches
+# and every run_purge call stop early, so resuming is exercised too
+BATCH_SIZE = 7
+TRANSACTIONS = 30
+
+
+def seed(conn, transactions, goals, user_id: int) -> None:
+    """Transactions over two years (two partitions), a goal and a contribution"""
+    with conn.cursor() as cur:
+        for i in range(TRANSACTIONS):
+            response = call_sync(transactions, 'handle_create_transaction', cur, user_id, {
+                'type': 'expense' if i % 3 else 'income', 'amount': 100 + i,
+                'category': f'Purge {i % 4}', 'description': f'Row {i}',
+                'date': (date.today() - timedelta(days=i * 20)).isoformat()
+            })
+            assert response['statusCode'] == 201, response['body']
+        response = call_sync(goals, 'handle_create_goal', cur, user_id, {
+            'title': 'Purge goal', 'target': 1000, 'deadline': (date.today() + timedelta(days=90)).isoformat()
+        })
+        goal_id = json.loads(response['body'])['goal']['id']
+        response = call_sync(goals, 'handle_contribute_goal', cur, user_id, goal_id, {'amount': 10})
+        assert response['statusCode'] == 200, response['body']
+    conn.commit()
+
+
+def remaining_rows(conn, steps: List[str], user_id: int) -> Dict[str, int]:
+    counts = {}
+    for step in steps:
+        counts[step] = conn.execute(
+            sql.SQL("SELECT COUNT(*) FROM {} WHERE user_id = %s").format(sql.Identifier(step)), (user_id,)
+        ).fetchone()[0]
+    conn.commit()
+    return {step: count for step, count in counts.items() if count}
+
+
+def purge_until_done(conn, purge, user_id: int, mode: str) -> Dict[str, Any]:
+    """Run the job in zero-budget slices the way repeated API calls do"""
+    purge.start_purge(conn, user_id, mode)
+    calls = 0
+    while True:
+        job = purge.run_purge(conn, user_id, batch_size=BATCH_SIZE, time_budget=0)
+        calls += 1
+        if job['status'] == 'done' or calls > 1000:
+            return {'calls': calls, **job}
+
+
+def main() -> None:
+    dsn = get_bench_dsn()
+    os.environ['DATABASE_URL'] = dsn
+    transactions = load_function('transactions')
+    goals = load_function('goals')
+    load_function('auth')  # puts backend/auth on sys.path
+    import purge
+
+    checks: List[Dict[str, Any]] = []
+
+    def check(name: str, ok: bool, **details) -> None:
+        checks.append({'check': name, 'ok': ok, **details})
+
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            user_id = create_bench_user(cur, 'purge')
+        conn.commit()
+        try:
+            seed(conn, transactions, goals, user_id)
+            job = purge_until_done(conn, purge, user_id, 'reset')
+            left = remaining_rows(conn, list(purge.PURGE_STEPS), user_id)
+            check('reset_resumes_to_done', job['status'] == 'done' and job['calls'] > 1, calls=job['calls'])
+            check('reset_empties_tables', not left, left=left)
+            check('reset_counts_transactions', job['deleted_rows'].get('transactions') == TRANSACTIONS,
+                  deleted_rows=job['deleted_rows'])
+            user_kept = conn.execute("SELECT 1 FROM users WHERE id = %s", (user_id,)).fetchone()
+            check('reset_keeps_account', user_kept is not None)
+            # Events stay for the consumers; the account event comes after the writes it closes
+            events = conn.execute(
+                "SELECT aggregate, operation FROM change_events WHERE user_id = %s ORDER BY xact_id, id",
+                (user_id,)
+            ).fetchall()
+            conn.commit()
+            check('reset_keeps_events_for_consumers', len(events) > 1, events=len(events))
+            check('reset_ends_with_account_event', events[-1:] == [('account', 'reset')], last=events[-1:])
+
+            seed(conn, transactions, goals, user_id)
+            job = purge_until_done(conn, purge, user_id, 'delete')
+            left = remaining_rows(conn, list(purge.PURGE_STEPS), user_id)
+            check('delete_resumes_to_done', job['status'] == 'done' and job['calls'] > 1, calls=job['calls'])
+            check('delete_empties_tables', not left, left=left)
+            user_kept = conn.execute("SELECT 1 FROM users WHERE id = %s", (user_id,)).fetchone()
+            conn.commit()
+            check('delete_removes_account', user_kept is None)
+        finally:
+            conn.rollback()
+            delete_bench_user(conn, user_id)
+
+    print(json.dumps(checks, indent=2))
+    if not all(item['ok'] for item in checks):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+# Nothing heavy is imported at module level: the same file runs as the measured
+# child process, which must start as bare as a fresh function instance.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Median milliseconds a fresh instance may spend per function
+COLD_START_BUDGET_MS = {
+    'import': 80,
+    'preflight': 5,
+    'first_request': 400,
+}
+
+# Modules an OPTIONS preflight must never load
+PREFLIGHT_FORBIDDEN_MODULES = ('psycopg', 'psycopg_pool', 'asyncio', 'numpy')
+
+
+def first_request_event(name: str, user_id: int) -> Dict[str, Any]:
+    """The cheapest request of each function that reaches the database"""
+    if name == 'auth':
+        return {
+            'httpMethod': 'POST',
+            'headers': {},
+            'body': json.dumps({'action': 'login', 'email': f'cold-start-{user_id}@example.com', 'password': 'x'})
+        }
+    return {
+        'httpMethod': 'GET',
+        'headers': {'X-User-ID': str(user_id)},
+        'queryStringParameters': {'limit': '1'}
+    }
+
+
+def measure_child(name: str) -> Dict[str, Any]:
+    '''
+    Business: Time one cold start of a function in this (fresh) process
+    Args: name - function name (transactions, goals, auth)
+    Returns: dict with import/preflight/first_request milliseconds and modules loaded by the preflight
+    '''
+    sys.path.insert(0, os.path.join(BACKEND_DIR, 'server'))
+    from loader import load_function
+
+    started = time.perf_counter()
+    module = load_function(name)
+    imported = time.perf_counter()
+    response = module.handler({'httpMethod': 'OPTIONS', 'headers': {}}, None)
+    preflighted = time.perf_counter()
+    assert response['statusCode'] == 200, response
+
+    result = {
+        'import': (imported - started) * 1000,
+        'preflight': (preflighted - imported) * 1000,
+        'preflight_loaded': [module_name for module_name in PREFLIGHT_FORBIDDEN_MODULES if module_name in sys.modules]
+    }
+
+    user_id = os.environ.get('COLD_START_USER_ID')
+    if user_id:
+        response = module.handler(first_request_event(name, int(user_id)), None)
+        result['first_request'] = (time.perf_counter() - preflighted) * 1000
+        assert response['statusCode'] < 500, response['body']
+    return result
+
+
+def run_cold_starts(name: str, runs: int, env: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Start a new interpreter per run so every measurement is a real cold start"""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', name],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Cold-start import time and first-request latency per function')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_child(args.child)))
+        return
+
+    from common import create_bench_user, delete_bench_user
+    from loader import FUNCTION_NAMES
+
+    env = {**os.environ, 'RATE_LIMIT_ENABLED': '0'}
+    dsn = os.environ.get('BENCH_DATABASE_URL') or os.environ.get('DATABASE_URL')
+    conn = user_id = None
+    if dsn:
+        import psycopg
+        conn = psycopg.connect(dsn)
+        with conn.cursor() as cur:
+            user_id = create_bench_user(cur, 'cold-start')
+        conn.commit()
+        env.update(DATABASE_URL=dsn, COLD_START_USER_ID=str(user_id))
+    # Without a database only import and preflight are measured
+
+    report, failures = {}, []
+    try:
+        for name in FUNCTION_NAMES:
+            results = run_cold_starts(name, args.runs, env)
+            report[name] = {}
+            for phase, budget in COLD_START_BUDGET_MS.items():
+                if phase not in results[0]:
+                    continue
+                median = round(statistics.median(result[phase] for result in results), 2)
+                report[name][f'{phase}_ms'] = median
+                if median > budget:
+                    failures.append(f'{name}: {phase} {median} ms > {budget} ms budget')
+            loaded = sorted({module for result in results for module in result['preflight_loaded']})
+            report[name]['preflight_loaded'] = loaded
+            if loaded:
+                failures.append(f'{name}: OPTIONS imported {", ".join(loaded)}')
+    finally:
+        if conn is not None:
+            delete_bench_user(conn, user_id)
+            conn.close()
+
+    print(json.dumps({'budget_ms': COLD_START_BUDGET_MS, 'functions': report}, indent=2))
+    if failures:
+        print('\n'.join(failures), file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from psycopg import pq
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'server'))
+
+from loader import load_function  # noqa: E402
+
+
+def call_sync(module, handler_name: str, cur, *args) -> Dict[str, Any]:
+    """Run one of a function's shared handler coroutines on a sync cursor"""
+    return module.run_sync(getattr(module, handler_name)(module.SyncCursor(cur), *args))
+
+
+def get_bench_dsn() -> str:
+    """Connection string of the database the benchmarks may write to"""
+    dsn = os.environ.get('BENCH_DATABASE_URL') or os.environ.get('DATABASE_URL')
+    if not dsn:
+        raise SystemExit('Set BENCH_DATABASE_URL (or DATABASE_URL) to a migrated database')
+    return dsn
+
+
+def create_bench_user(cur, label: str) -> int:
+    """Insert a throwaway user and return its id"""
+    cur.execute(
+        "INSERT INTO users (email, name, password_hash) VALUES (%s, %s, %s) RETURNING id",
+        (f'bench-{label}-{os.getpid()}-{os.urandom(4).hex()}@example.com', 'Bench', 'x')
+    )
+    return cur.fetchone()[0]
+
+
+def delete_bench_user(conn, user_id: int) -> None:
+    """Remove a bench user together with everything it owns"""
+    with conn.cursor() as cur:
+        for table in ('transactions', 'transaction_archive_rollups', 'category_aliases',
+                      'categories', 'goal_contributions', 'financial_goals', 'change_events',
+                      'idempotency_keys', 'transaction_flags', 'detection_state', 'notification_outbox',
+                      'account_purge_jobs', 'users'):
+            column = 'id' if table == 'users' else 'user_id'
+            cur.execute(f"DELETE FROM {table} WHERE {column} = %s", (user_id,))
+    conn.commit()
+
+
+@contextmanager
+def count_round_trips(conn) -> Iterator[Dict[str, Any]]:
+    '''
+    Business: Count client/server round-trips made on a connection
+    Args: conn - psycopg connection
+    Returns: dict filled with round_trips when the block exits
+
+    Every Sync (extended protocol, also ends a pipeline) and every simple Query
+    is answered by one ReadyForQuery, so their count is the number of times the
+    client waits on the server.
+    '''
+    result = {'round_trips': 0}
+    with tempfile.NamedTemporaryFile(mode='r', suffix='.trace') as trace_file:
+        trace_fd = os.dup(trace_file.fileno())
+        conn.pgconn.trace(trace_fd)
+        conn.pgconn.set_trace_flags(pq.Trace.SUPPRESS_TIMESTAMPS | pq.Trace.REGRESS_MODE)
+        try:
+            yield result
+        finally:
+            conn.pgconn.untrace()
+            with open(trace_file.name) as trace_log:
+                for line in trace_log:
+                    parts = line.split('\t')
+                    if len(parts) > 2 and parts[0] == 'F' and parts[2].strip() in ('Sync', 'Query'):
+                        result['round_trips'] += 1
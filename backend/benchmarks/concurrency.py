@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List
+
+import psycopg
+
+from common import call_sync, create_bench_user, delete_bench_user, get_bench_dsn, load_function
+
+
+def summarize(latencies_ms: List[float], wall_seconds: float) -> Dict[str, Any]:
+    latencies_ms = sorted(latencies_ms)
+    return {
+        'requests': len(latencies_ms),
+        'wall_s': round(wall_seconds, 3),
+        'rps': round(len(latencies_ms) / wall_seconds, 1),
+        'p50_ms': round(statistics.median(latencies_ms), 2),
+        'p95_ms': round(latencies_ms[int(len(latencies_ms) * 0.95) - 1], 2),
+    }
+
+
+def run_sync_path(module, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One request at a time, as a single sync function instance serves them"""
+    latencies = []
+    started = time.perf_counter()
+    for event in events:
+        request_started = time.perf_counter()
+        response = module.handler(event, None)
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        assert response['statusCode'] == 200, response['body']
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def run_async_path(module, events: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """All requests multiplexed on one event loop over the shared async pool"""
+    await module.get_async_pool()  # open outside the measurement, like a warm instance
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(event: Dict[str, Any]) -> None:
+        async with semaphore:
+            request_started = time.perf_counter()
+            response = await module.async_handler(event, None)
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            assert response['statusCode'] == 200, response['body']
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(event) for event in events))
+    wall_seconds = time.perf_counter() - started
+    await module.close_async_pools()
+    return summarize(latencies, wall_seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Sync vs async handler throughput')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--pool-size', type=int, default=20)
+    parser.add_argument('--seed-rows', type=int, default=500)
+    args = parser.parse_args()
+
+    dsn = get_bench_dsn()
+    os.environ['DATABASE_URL'] = dsn
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.pool_size)
+    os.environ['RATE_LIMIT_ENABLED'] = '0'  # one bench user sends every request
+    transactions = load_function('transactions')
+
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            user_id = create_bench_user(cur, 'concurrency')
+            for i in range(args.seed_rows):
+                call_sync(transactions, 'handle_create_transaction', cur, user_id, {
+                    'type': 'expense' if i % 3 else 'income', 'amount': 100 + i,
+                    'category': f'Category {i % 12}', 'description': f'Row {i}',
+                    'date': f'2025-{i % 12 + 1:02d}-15'
+                })
+        conn.commit()
+
+        try:
+            events = [{
+                'httpMethod': 'GET',
+                'headers': {'X-User-ID': str(user_id)},
+                'queryStringParameters': {'action': 'stats'} if i % 2 else {'limit': '50'}
+            } for i in range(args.requests)]
+
+            report = {
+                'sync': run_sync_path(transactions, events),
+                'async': asyncio.run(run_async_path(transactions, events, args.concurrency)),
+            }
+            report['speedup'] = round(report['async']['rps'] / report['sync']['rps'], 2)
+            print(json.dumps(report, indent=2))
+        finally:
+            delete_bench_user(conn, user_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List
+
+import psycopg
+
+from common import call_sync, create_bench_user, delete_bench_user, get_bench_dsn, load_function
+from concurrency import summarize
+
+# Contended writers may be slower per request (they queue on the goal's row
+# lock) but must not make the goal slower as a whole
+MIN_THROUGHPUT_RATIO = 0.8
+
+
+def reset_goal(conn, goal_id: int) -> None:
+    conn.execute("DELETE FROM goal_contributions WHERE goal_id = %s", (goal_id,))
+    conn.execute(
+        "UPDATE financial_goals SET current_amount = 0, is_completed = FALSE WHERE id = %s", (goal_id,)
+    )
+    conn.commit()
+
+
+def run_writers(writers: int, per_writer: int, write: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """writers threads, each calling write() per_writer times; the handler pool is shared"""
+    latencies: List[float] = []
+    failures: List[str] = []
+
+    def writer() -> None:
+        for _ in range(per_writer):
+            request_started = time.perf_counter()
+            response = write()
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            if response['statusCode'] != 200:
+                failures.append(response['body'])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        for future in [pool.submit(writer) for _ in range(writers)]:
+            future.result()
+    report = summarize(latencies, time.perf_counter() - started)
+    report['max_ms'] = round(max(latencies), 2)
+    report['failed'] = len(failures)
+    if failures:
+        report['first_failure'] = failures[0]
+    return report
+
+
+def goal_state(conn, goal_id: int) -> Dict[str, Any]:
+    current, is_completed = conn.execute(
+        "SELECT current_amount, is_completed FROM financial_goals WHERE id = %s", (goal_id,)
+    ).fetchone()
+    count, total, distinct_totals = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(amount), 0), COUNT(DISTINCT current_amount)
+        FROM goal_contributions WHERE goal_id = %s
+    """, (goal_id,)).fetchone()
+    conn.commit()
+    return {
+        'current': float(current),
+        'is_completed': is_completed,
+        'history_rows': count,
+        'history_total': float(total),
+        # Every contribution saw a different running total: none was applied on a stale value
+        'distinct_running_totals': distinct_totals
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Parallel contributions to one goal: lost updates and lock waits')
+    parser.add_argument('--writers', type=int, default=20)
+    parser.add_argument('--contributions', type=int, default=50, help='per writer')
+    parser.add_argument('--amount', type=float, default=10)
+    args = parser.parse_args()
+
+    dsn = get_bench_dsn()
+    os.environ['DATABASE_URL'] = dsn
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.writers)
+    os.environ['RATE_LIMIT_ENABLED'] = '0'  # one bench user sends every request
+    goals = load_function('goals')
+
+    requests_total = args.writers * args.contributions
+    expected = float(Decimal(str(args.amount)) * requests_total)
+
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            user_id = create_bench_user(cur, 'goal-contributions')
+            # The last contribution reaches the target exactly
+            created = call_sync(goals, 'handle_create_goal', cur, user_id, {
+                'title': 'Contention', 'target': expected,
+                'deadline': (date.today() + timedelta(days=365)).isoformat()
+            })
+        conn.commit()
+        goal_id = json.loads(created['body'])['goal']['id']
+
+        def contribute() -> Dict[str, Any]:
+            return goals.handler({
+                'httpMethod': 'PUT',
+                'headers': {'X-User-ID': str(user_id)},
+                'body': json.dumps({'action': 'contribute', 'id': goal_id, 'amount': args.amount})
+            }, None)
+
+        # What clients did before: read the amount, add locally, write the sum back
+        readers: List[psycopg.Connection] = []
+        local = threading.local()
+
+        def read_modify_write() -> Dict[str, Any]:
+            if not hasattr(local, 'reader'):
+                local.reader = psycopg.connect(dsn, autocommit=True)
+                readers.append(local.reader)
+            current = local.reader.execute(
+                "SELECT current_amount FROM financial_goals WHERE id = %s", (goal_id,)
+            ).fetchone()[0]
+            return goals.handler({
+                'httpMethod': 'PUT',
+                'headers': {'X-User-ID': str(user_id)},
+                'body': json.dumps({'id': goal_id, 'current': float(current) + args.amount})
+            }, None)
+
+        try:
+            report = {'writers': args.writers, 'requests': requests_total, 'expected_total': expected}
+
+            reset_goal(conn, goal_id)
+            report['read_modify_write'] = run_writers(args.writers, args.contributions, read_modify_write)
+            state = goal_state(conn, goal_id)
+            report['read_modify_write']['lost_amount'] = round(expected - state['current'], 2)
+
+            reset_goal(conn, goal_id)
+            report['contribute_single_writer'] = run_writers(1, requests_total, contribute)
+            report['contribute_single_writer']['state'] = goal_state(conn, goal_id)
+
+            reset_goal(conn, goal_id)
+            report['contribute'] = run_writers(args.writers, args.contributions, contribute)
+            state = report['contribute']['state'] = goal_state(conn, goal_id)
+        finally:
+            for reader in readers:
+                reader.close()
+            delete_bench_user(conn, user_id)
+
+    failures = []
+    if report['contribute']['failed']:
+        failures.append(f"{report['contribute']['failed']} contributions failed")
+    if state['current'] != expected or state['history_total'] != expected:
+        failures.append(f"lost updates: goal {state['current']}, history {state['history_total']}, expected {expected}")
+    if state['history_rows'] != requests_total or state['distinct_running_totals'] != requests_total:
+        failures.append('contribution history does not match the requests')
+    if not state['is_completed']:
+        failures.append('goal not completed after reaching its target')
+    ratio = report['contribute']['rps'] / report['contribute_single_writer']['rps']
+    report['throughput_ratio'] = round(ratio, 2)
+    if ratio < MIN_THROUGHPUT_RATIO:
+        failures.append(f'{args.writers} writers reach {ratio:.2f}x the single-writer throughput')
+
+    print(json.dumps(report, indent=2))
+    if failures:
+        raise SystemExit('\n'.join(failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+import psycopg
+
+from common import create_bench_user, delete_bench_user, get_bench_dsn, load_function
+
+ORIGIN = 'https://dashboard.example'
+
+# Requests the dashboard sends on load: (function, query string parameters).
+# Each distinct URL needs its own preflight, since X-User-ID is not a simple header.
+DASHBOARD_REQUESTS: List[Tuple[str, Dict[str, str]]] = [
+    ('transactions', {'limit': '50'}),
+    ('transactions', {'action': 'stats'}),
+    ('transactions', {'action': 'categories'}),
+    ('goals', {}),
+]
+
+# Chromium caps Access-Control-Max-Age at two hours
+BROWSER_PREFLIGHT_MAX_AGE = 7200
+
+
+def max_age(headers: Dict[str, str], name: str) -> int:
+    """max-age from Cache-Control, or a plain seconds header such as Access-Control-Max-Age"""
+    value = headers.get(name, '')
+    match = re.search(r'max-age=(\d+)', value) if name == 'Cache-Control' else re.fullmatch(r'\d+', value)
+    if not match or (name == 'Cache-Control' and 'no-store' in value):
+        return 0
+    return int(match.group(1) if name == 'Cache-Control' else match.group(0))
+
+
+class Browser:
+    '''
+    Business: Minimal model of a browser's CORS preflight cache and HTTP cache
+    Args: edge - shared dict standing in for a CDN in front of the functions
+          honour_cache_headers - False replays the behaviour before responses carried Cache-Control
+    Returns: object whose load() issues one dashboard load at a given time
+    '''
+
+    def __init__(self, modules: Dict[str, Any], user_id: int, edge: Dict[str, float], honour_cache_headers: bool):
+        self.modules = modules
+        self.user_id = user_id
+        self.edge = edge
+        self.honour = honour_cache_headers
+        self.preflight_cache: Dict[str, float] = {}
+        self.http_cache: Dict[str, float] = {}
+
+    def load(self, now: float, counts: Dict[str, int]) -> None:
+        for name, params in DASHBOARD_REQUESTS:
+            url = f'/{name}?' + '&'.join(f'{key}={value}' for key, value in sorted(params.items()))
+
+            # The preflight comes before the HTTP cache lookup: a cached read does
+            # not spare it, only the preflight cache (Access-Control-Max-Age) does
+            if self.preflight_cache.get(url, 0) <= now:
+                counts['preflights_sent'] += 1
+                if self.edge.get(url, 0) > now:
+                    counts['preflights_answered_by_edge'] += 1
+                    self.preflight_cache[url] = now + BROWSER_PREFLIGHT_MAX_AGE
+                else:
+                    response = self.modules[name].handler({
+                        'httpMethod': 'OPTIONS',
+                        'headers': {'Origin': ORIGIN, 'Access-Control-Request-Headers': 'x-user-id'}
+                    }, None)
+                    counts['preflights_reaching_function'] += 1
+                    if self.honour and 'public' in response['headers'].get('Cache-Control', ''):
+                        self.edge[url] = now + max_age(response['headers'], 'Cache-Control')
+                    allowed = min(max_age(response['headers'], 'Access-Control-Max-Age'), BROWSER_PREFLIGHT_MAX_AGE)
+                    self.preflight_cache[url] = now + allowed
+
+            if self.http_cache.get(url, 0) > now:
+                counts['served_from_browser_cache'] += 1
+                continue
+
+            response = self.modules[name].handler({
+                'httpMethod': 'GET',
+                'headers': {'Origin': ORIGIN, 'X-User-ID': str(self.user_id)},
+                'queryStringParameters': params
+            }, None)
+            assert response['statusCode'] == 200, response['body']
+            counts['requests_sent'] += 1
+            if self.honour:
+                self.http_cache[url] = now + max_age(response['headers'], 'Cache-Control')
+
+
+def simulate(modules: Dict[str, Any], user_id: int, args, honour_cache_headers: bool) -> Dict[str, Any]:
+    """Several browsers, each loading the dashboard repeatedly, behind one shared edge cache"""
+    counts = dict.fromkeys(('preflights_sent', 'preflights_answered_by_edge', 'preflights_reaching_function',
+                            'requests_sent', 'served_from_browser_cache'), 0)
+    edge: Dict[str, float] = {}
+    for _ in range(args.browsers):
+        browser = Browser(modules, user_id, edge, honour_cache_headers)
+        for load in range(args.loads):
+            browser.load(load * args.reload_after, counts)
+    loads = args.browsers * args.loads
+    return {key: round(value / loads, 2) for key, value in counts.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='CORS preflights and requests per dashboard load')
+    parser.add_argument('--browsers', type=int, default=5, help='fresh browser sessions of the same origin')
+    parser.add_argument('--loads', type=int, default=4, help='dashboard loads per browser')
+    parser.add_argument('--reload-after', type=float, default=20, help='seconds between loads')
+    parser.add_argument('--read-cache-seconds', type=int, default=30)
+    args = parser.parse_args()
+
+    dsn = get_bench_dsn()
+    os.environ['DATABASE_URL'] = dsn
+    os.environ['RATE_LIMIT_ENABLED'] = '0'  # one bench user sends every request
+    os.environ['READ_CACHE_SECONDS'] = str(args.read_cache_seconds)
+    modules = {name: load_function(name) for name in ('transactions', 'goals')}
+
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            user_id = create_bench_user(cur, 'preflight')
+        conn.commit()
+        try:
+            before = simulate(modules, user_id, args, honour_cache_headers=False)
+            after = simulate(modules, user_id, args, honour_cache_headers=True)
+        finally:
+            delete_bench_user(conn, user_id)
+
+    print(json.dumps({
+        'per_dashboard_load': {'before': before, 'after': after},
+        # Without Access-Control-Max-Age every request of every load is preflighted
+        'preflights_saved': round(len(DASHBOARD_REQUESTS) - after['preflights_sent'], 2),
+        'preflights_answered_by_edge': after['preflights_answered_by_edge'],
+        'requests_saved': round(before['requests_sent'] - after['requests_sent'], 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+import psycopg
+
+from common import create_bench_user, delete_bench_user, get_bench_dsn, load_function
+
+
+def wait_for_replica(replica, primary_lsn: str, timeout: float = 10.0) -> None:
+    """Block until the replica has replayed up to primary_lsn"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        caught_up = replica.execute(
+            "SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn", (primary_lsn,)
+        ).fetchone()[0]
+        if caught_up:
+            return
+        time.sleep(0.05)
+    raise SystemExit(f'replica did not reach {primary_lsn} within {timeout}s')
+
+
+def list_request(module, user_id: int, headers: Dict[str, str] = None) -> Dict[str, Any]:
+    """GET the user's transactions; report which pool served it and what it saw"""
+    primary_before = module.get_pool().get_stats()['requests_num']
+    replica_before = module.get_read_pool().get_stats()['requests_num']
+    response = module.handler({
+        'httpMethod': 'GET',
+        'headers': {'X-User-ID': str(user_id), **(headers or {})},
+        'queryStringParameters': {'limit': '50'}
+    }, None)
+    assert response['statusCode'] == 200, response['body']
+    assert module.get_read_pool().get_stats()['requests_num'] > replica_before, 'GET skipped the replica'
+    return {
+        # Reads start on the replica and open the primary only to fall back
+        'served_by': 'primary' if module.get_pool().get_stats()['requests_num'] > primary_before else 'replica',
+        'rows': json.loads(response['body'])['total']
+    }
+
+
+def create_request(module, user_id: int, description: str) -> Dict[str, Any]:
+    response = module.handler({
+        'httpMethod': 'POST',
+        'headers': {'X-User-ID': str(user_id)},
+        'body': json.dumps({'type': 'expense', 'amount': 100, 'category': 'Replica',
+                            'description': description, 'date': '2025-06-15'})
+    }, None)
+    assert response['statusCode'] == 200, response['body']
+    return response
+
+
+def main() -> None:
+    dsn = get_bench_dsn()
+    read_dsn = os.environ.get('DATABASE_READ_URL')
+    if not read_dsn:
+        raise SystemExit('Set DATABASE_READ_URL to a streaming replica of the bench database '
+                         '(see backend/server/docker-compose.replica.yml)')
+    os.environ['DATABASE_URL'] = dsn
+    os.environ['RATE_LIMIT_ENABLED'] = '0'  # one bench user sends every request
+    transactions = load_function('transactions')
+    import runtime  # the copy next to transactions/index.py, importable once the function is loaded
+
+    checks: List[Dict[str, Any]] = []
+
+    def check(name: str, ok: bool, **details) -> None:
+        checks.append({'check': name, 'ok': ok, **details})
+
+    # Pausing replay needs a superuser on the replica; the session stays open so
+    # replay can be resumed even if a check fails
+    with psycopg.connect(dsn) as conn, psycopg.connect(read_dsn, autocommit=True) as replica:
+        with conn.cursor() as cur:
+            user_id = create_bench_user(cur, 'replica')
+        conn.commit()
+        wait_for_replica(replica, conn.execute("SELECT pg_current_wal_lsn()::text").fetchone()[0])
+
+        try:
+            # Read-after-write on the same instance: the local marker pins the read
+            # to a replica that has replayed the write (or to the primary)
+            create_request(transactions, user_id, 'first')
+            seen = list_request(transactions, user_id)
+            check('read_after_write', seen['rows'] == 1, **seen)
+
+            # Simulate lag: the replica stops replaying, so the next write is missing there
+            replica.execute("SELECT pg_wal_replay_pause()")
+            response = create_request(transactions, user_id, 'second')
+            write_lsn = response['headers']['X-Write-LSN']
+
+            seen = list_request(transactions, user_id)
+            check('lagging_replica_falls_back', seen == {'served_by': 'primary', 'rows': 2}, **seen)
+
+            # Another instance: no local marker, only the LSN the client echoes back
+            runtime.forget_recent_writes()
+            seen = list_request(transactions, user_id, {'X-Min-LSN': write_lsn})
+            check('client_lsn_falls_back', seen == {'served_by': 'primary', 'rows': 2}, **seen)
+
+            # Without a marker the replica answers, stale by design
+            seen = list_request(transactions, user_id)
+            check('no_marker_reads_replica', seen == {'served_by': 'replica', 'rows': 1}, **seen)
+
+            replica.execute("SELECT pg_wal_replay_resume()")
+            wait_for_replica(replica, write_lsn)
+            seen = list_request(transactions, user_id, {'X-Min-LSN': write_lsn})
+            check('caught_up_replica_serves', seen == {'served_by': 'replica', 'rows': 2}, **seen)
+        finally:
+            replica.execute("SELECT pg_wal_replay_resume()")
+            delete_bench_user(conn, user_id)
+
+    print(json.dumps(checks, indent=2))
+    if not all(item['ok'] for item in checks):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import json
+import sys
+import time
+from typing import Any, Callable, Dict
+
+import psycopg
+
+from common import call_sync, count_round_trips, create_bench_user, get_bench_dsn, load_function
+
+# Round-trips a warm connection (statements already prepared) may spend per request
+ROUND_TRIP_BUDGET = {
+    'transactions_stats': 1,
+    'transactions_categories': 1,
+    'transactions_categories_list': 1,  # 0 once cached by the instance
+    'transactions_list': 1,
+    'transactions_update': 1,
+    'goals_list': 1,
+    'goals_update': 1,
+}
+
+
+def measure(conn, scenario: Callable[[Any], Dict[str, Any]]) -> Dict[str, Any]:
+    """Run scenario once cold and once warm, returning round-trips and latency"""
+    runs = {}
+    for run in ('cold', 'warm'):
+        with conn.cursor() as cur:
+            with count_round_trips(conn) as counter:
+                started = time.perf_counter()
+                response = scenario(cur)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+        if response['statusCode'] >= 400:
+            raise RuntimeError(f'Scenario failed: {response["body"]}')
+        runs[run] = {'round_trips': counter['round_trips'], 'ms': round(elapsed_ms, 2)}
+    return runs
+
+
+def main() -> None:
+    transactions = load_function('transactions')
+    goals = load_function('goals')
+
+    # Everything runs in one transaction that is rolled back at the end
+    with psycopg.connect(get_bench_dsn()) as conn:
+        with conn.cursor() as cur:
+            user_id = create_bench_user(cur, 'roundtrips')
+            created = call_sync(transactions, 'handle_create_transaction', cur, user_id, {
+                'type': 'expense', 'amount': 1500, 'category': 'Food',
+                'description': 'Lunch', 'date': '2025-09-18'
+            })
+            transaction_id = json.loads(created['body'])['transaction']['id']
+            created = call_sync(goals, 'handle_create_goal', cur, user_id, {
+                'title': 'Bench goal', 'target': 100000, 'current': 1000, 'deadline': '2099-12-31'
+            })
+            goal_id = json.loads(created['body'])['goal']['id']
+
+        scenarios = {
+            'transactions_stats': lambda cur: call_sync(
+                transactions, 'handle_get_transactions', cur, user_id, {'action': 'stats'}),
+            'transactions_categories': lambda cur: call_sync(
+                transactions, 'handle_get_transactions', cur, user_id, {'action': 'categories'}),
+            'transactions_categories_list': lambda cur: call_sync(
+                transactions, 'handle_get_transactions', cur, user_id, {'action': 'categories_list'}),
+            'transactions_list': lambda cur: call_sync(
+                transactions, 'handle_get_transactions', cur, user_id, {'date_from': '2025-01-01'}),
+            'transactions_update': lambda cur: call_sync(
+                transactions, 'handle_update_transaction', cur, user_id, transaction_id, {'description': 'Dinner'}),
+            'goals_list': lambda cur: call_sync(goals, 'handle_get_goals', cur, user_id, {}),
+            'goals_update': lambda cur: call_sync(goals, 'handle_update_goal', cur, user_id, goal_id, {'current': 2000}),
+        }
+
+        report = {name: measure(conn, scenario) for name, scenario in scenarios.items()}
+        conn.rollback()
+
+    over_budget = {
+        name: runs['warm']['round_trips']
+        for name, runs in report.items()
+        if runs['warm']['round_trips'] > ROUND_TRIP_BUDGET[name]
+    }
+
+    print(json.dumps({'report': report, 'over_budget': over_budget}, indent=2))
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,19 @@
+import base64
 import json
-import os
-import psycopg
 from datetime import datetime, date
-from decimal import Decimal
-from typing import Dict, Any
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Any, Tuple
+
+from rates import validate_currency
+from runtime import UserFunction, to_columns
+# The servers and benchmarks reach the process's pools and the sync path through the function module
+from runtime import SyncCursor, close_async_pools, get_async_pool, get_pool, get_read_pool, run_sync  # noqa: F401
+
+# psycopg is imported where the database is first touched: OPTIONS preflights
+# and requests rejected before any query never pay for it on a cold start
+if TYPE_CHECKING:
+    from psycopg import sql
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -12,134 +22,188 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context - object with attributes: request_id, function_name, function_version, memory_limit_in_mb
     Returns: HTTP response dict
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    # Handle CORS OPTIONS request
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-User-ID',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    # Get database connection string
-    dsn = os.environ.get('DATABASE_URL')
-    if not dsn:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'Database connection not configured'})
-        }
-    
-    # Get user ID from headers
-    headers = event.get('headers', {})
-    user_id = headers.get('X-User-ID') or headers.get('x-user-id')
-    if not user_id:
-        return {
-            'statusCode': 401,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'User ID required in X-User-ID header'})
-        }
-    
-    try:
-        user_id = int(user_id)
-    except ValueError:
+    return api.handler(event)
+
+async def async_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Same as handler, served from a shared AsyncConnectionPool for ASGI-style servers
+    Args: event - dict with httpMethod, body, queryStringParameters
+          context - request context object (may be None)
+    Returns: HTTP response dict
+    '''
+    return await api.async_handler(event)
+
+async def dispatch_request(cur, method: str, user_id: int, event: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the handler for the HTTP method"""
+    if method == 'GET':
+        return await handle_get_goals(cur, user_id, event.get('queryStringParameters') or {})
+    elif method == 'POST':
+        body_data = json.loads(event.get('body') or '{}')
+        return await handle_create_goal(cur, user_id, body_data)
+    elif method == 'PUT':
+        body_data = json.loads(event.get('body') or '{}')
+        goal_id = body_data.get('id')
+        if body_data.get('action') == 'contribute':
+            return await handle_contribute_goal(cur, user_id, goal_id, body_data)
+        return await handle_update_goal(cur, user_id, goal_id, body_data)
+    elif method == 'DELETE':
+        query_params = event.get('queryStringParameters') or {}
+        goal_id = query_params.get('id')
+        return await handle_delete_goal(cur, user_id, goal_id)
+    else:
         return {
-            'statusCode': 400,
+            'statusCode': 405,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({'error': 'Invalid user ID'})
+            'body': json.dumps({'error': 'Method not allowed'})
         }
+
+GOAL_FIELDS = ('id', 'title', 'target', 'current', 'currency', 'deadline', 'is_completed', 'is_overdue', 'created_at', 'updated_at', 'progress', 'remaining')
+
+# Progress and remaining amount are computed by Postgres and returned as float8,
+# so rows are mapped to dicts without any per-row arithmetic
+GOAL_SELECT = """
+    SELECT g.id, g.title, g.target_amount::float8, g.current_amount::float8, g.deadline_date,
+           g.is_completed, g.created_at, g.updated_at,
+           (COALESCE(g.current_amount, 0) / g.target_amount * 100)::float8 AS progress,
+           GREATEST(g.target_amount - COALESCE(g.current_amount, 0), 0)::float8 AS remaining,
+           g.is_overdue, g.currency
+"""
+
+# sort name -> (key expression, default direction, cursor value parser); key
+# expressions match the expression indexes on financial_goals. current_amount
+# is nullable: a NULL key would put NULL into the cursor, so it counts as 0
+GOAL_SORTS = {
+    'created': ('g.created_at', 'desc', datetime.fromisoformat),
+    'deadline': ('g.deadline_date', 'asc', date.fromisoformat),
+    'progress': ('(COALESCE(g.current_amount, 0) / g.target_amount)', 'desc', Decimal),
+    'remaining': ('(g.target_amount - COALESCE(g.current_amount, 0))', 'asc', Decimal),
+}
+
+GOAL_LIST_FILTERS = (
+    ('completed', 'g.is_completed = %(completed)s'),
+    ('overdue', 'g.is_overdue = %(overdue)s'),
+    ('due_within', 'g.deadline_date BETWEEN CURRENT_DATE AND CURRENT_DATE + %(due_within)s::integer'),
+    # Behind schedule: funded share is below the elapsed share of the goal's lifetime
+    ('at_risk', """COALESCE(g.current_amount, 0) < g.target_amount AND (
+        g.deadline_date < CURRENT_DATE
+        OR COALESCE(g.current_amount, 0) / g.target_amount
+            < (CURRENT_DATE - g.created_at::date)::numeric / GREATEST(g.deadline_date - g.created_at::date, 1)
+    )"""),
+)
+
+def goal_to_dict(goal) -> Dict[str, Any]:
+    """Map a GOAL_SELECT row to the API representation"""
+    return {
+        'id': goal[0],
+        'title': goal[1],
+        'target': goal[2],
+        'current': goal[3],
+        'currency': goal[11],
+        'deadline': goal[4].isoformat(),
+        'is_completed': goal[5],
+        'created_at': goal[6].isoformat(),
+        'updated_at': goal[7].isoformat(),
+        'progress': goal[8],
+        'remaining': goal[9],
+        'is_overdue': goal[10]
+    }
+
+def encode_goal_cursor(sort_value: str, goal_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_value, goal_id]).encode()).decode('ascii')
+
+def parse_goal_list_params(params: Dict[str, Any]) -> Tuple[Tuple[str, ...], str, str, Dict[str, Any]]:
+    """Parse list filters, sort and cursor into (filter shape, sort, direction, named parameters)"""
+    parsed: Dict[str, Any] = {}
+    
+    status_filter = params.get('status')  # 'active', 'completed', 'overdue', 'all'
+    if status_filter == 'completed':
+        parsed['completed'] = True
+    elif status_filter == 'overdue':
+        parsed['completed'] = False
+        parsed['overdue'] = True
+    elif status_filter == 'active' or not status_filter:
+        parsed['completed'] = False
+    elif status_filter != 'all':
+        raise ValueError('Status must be "active", "completed", "overdue" or "all"')
+    
+    if params.get('due_within'):
+        try:
+            parsed['due_within'] = int(params['due_within'])
+        except ValueError:
+            raise ValueError('due_within must be a number of days')
+        if parsed['due_within'] < 0:
+            raise ValueError('due_within must not be negative')
+    
+    if params.get('at_risk') in ('1', 'true'):
+        parsed['at_risk'] = True
+    
+    sort = params.get('sort', 'created')
+    if sort not in GOAL_SORTS:
+        raise ValueError(f'Sort must be one of: {", ".join(GOAL_SORTS)}')
+    direction = params.get('order', GOAL_SORTS[sort][1])
+    if direction not in ('asc', 'desc'):
+        raise ValueError('Order must be "asc" or "desc"')
+    
+    # Paging is opt-in: without limit or cursor every matching goal is returned
+    # (LIMIT NULL), as before the list was paged
+    parsed['limit'] = None
+    if params.get('limit') or params.get('cursor'):
+        try:
+            parsed['limit'] = min(max(int(params.get('limit', 50)), 1), 100)  # Max 100 goals per page
+        except ValueError:
+            raise ValueError('Invalid limit')
     
-    try:
-        with psycopg.connect(dsn) as conn:
-            with conn.cursor() as cur:
-                if method == 'GET':
-                    return handle_get_goals(cur, user_id, event.get('queryStringParameters', {}))
-                elif method == 'POST':
-                    body_data = json.loads(event.get('body', '{}'))
-                    return handle_create_goal(cur, user_id, body_data)
-                elif method == 'PUT':
-                    body_data = json.loads(event.get('body', '{}'))
-                    goal_id = body_data.get('id')
-                    return handle_update_goal(cur, user_id, goal_id, body_data)
-                elif method == 'DELETE':
-                    query_params = event.get('queryStringParameters', {})
-                    goal_id = query_params.get('id')
-                    return handle_delete_goal(cur, user_id, goal_id)
-                else:
-                    return {
-                        'statusCode': 405,
-                        'headers': {
-                            'Access-Control-Allow-Origin': '*',
-                            'Content-Type': 'application/json'
-                        },
-                        'body': json.dumps({'error': 'Method not allowed'})
-                    }
-    
-    except psycopg.Error as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': f'Database error: {str(e)}'})
-        }
-    except json.JSONDecodeError:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'Invalid JSON'})
-        }
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': f'Server error: {str(e)}'})
-        }
+    if params.get('cursor'):
+        try:
+            sort_value, after_id = json.loads(base64.urlsafe_b64decode(params['cursor'].encode()))
+            parsed['after_value'] = GOAL_SORTS[sort][2](sort_value)
+            parsed['after_id'] = int(after_id)
+        except (ValueError, TypeError, ArithmeticError):
+            raise ValueError('Invalid cursor')
+    
+    shape = tuple(name for name, _ in GOAL_LIST_FILTERS if name in parsed)
+    if 'after_id' in parsed:
+        shape += ('after',)
+    return shape, sort, direction, parsed
 
-def decimal_default(obj):
-    """JSON serializer for Decimal objects"""
-    if isinstance(obj, Decimal):
-        return float(obj)
-    if isinstance(obj, date):
-        return obj.isoformat()
-    raise TypeError
+@lru_cache(maxsize=64)
+def build_goals_list_query(filter_shape: Tuple[str, ...], sort: str, direction: str) -> 'sql.Composed':
+    """Build the keyset-paged list query for a filter shape and sort order"""
+    from psycopg import sql
+    key = GOAL_SORTS[sort][0]
+    predicates = [sql.SQL('g.user_id = %(user_id)s')]
+    predicates.extend(sql.SQL(clause) for name, clause in GOAL_LIST_FILTERS if name in filter_shape)
+    if 'after' in filter_shape:
+        comparison = '>' if direction == 'asc' else '<'
+        predicates.append(sql.SQL(f'({key}, g.id) {comparison} (%(after_value)s, %(after_id)s)'))
+    
+    return sql.SQL(GOAL_SELECT.rstrip() + """,
+           ({key})::text AS sort_value
+        FROM financial_goals g
+        WHERE {where}
+        ORDER BY {key} {direction}, g.id {direction}
+        LIMIT %(limit)s + 1
+    """).format(
+        key=sql.SQL(key),
+        where=sql.SQL(' AND ').join(predicates),
+        direction=sql.SQL(direction.upper())
+    )
 
-def handle_get_goals(cur, user_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+async def handle_get_goals(cur, user_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
     """Get financial goals for user"""
     goal_id = params.get('id')
     
     if goal_id:
         # Get specific goal
-        cur.execute("""
-            SELECT id, title, target_amount, current_amount, deadline_date, 
-                   is_completed, created_at, updated_at
-            FROM financial_goals 
-            WHERE id = %s AND user_id = %s
-        """, (goal_id, user_id))
+        await cur.execute(GOAL_SELECT + """
+            FROM financial_goals g
+            WHERE g.id = %s AND g.user_id = %s
+        """, (goal_id, user_id), prepare=True)
         
-        goal = cur.fetchone()
+        goal = await cur.fetchone()
         if not goal:
             return {
                 'statusCode': 404,
@@ -150,63 +214,45 @@ def handle_get_goals(cur, user_id: int, params: Dict[str, Any]) -> Dict[str, Any
                 'body': json.dumps({'error': 'Goal not found'})
             }
         
-        goal_data = {
-            'id': goal[0],
-            'title': goal[1],
-            'target': float(goal[2]),
-            'current': float(goal[3]),
-            'deadline': goal[4].isoformat(),
-            'is_completed': goal[5],
-            'created_at': goal[6].isoformat(),
-            'updated_at': goal[7].isoformat(),
-            'progress': (float(goal[3]) / float(goal[2])) * 100 if goal[2] > 0 else 0
-        }
-        
         return {
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({'goal': goal_data})
+            'body': json.dumps({'goal': goal_to_dict(goal)})
         }
     
     else:
-        # Get all goals for user
-        status_filter = params.get('status')  # 'active', 'completed', 'all'
-        
-        query = """
-            SELECT id, title, target_amount, current_amount, deadline_date, 
-                   is_completed, created_at, updated_at
-            FROM financial_goals 
-            WHERE user_id = %s
-        """
-        query_params = [user_id]
-        
-        if status_filter == 'completed':
-            query += " AND is_completed = true"
-        elif status_filter == 'active' or not status_filter:
-            query += " AND is_completed = false"
+        # Get a page of goals for user
+        try:
+            filter_shape, sort, direction, query_params = parse_goal_list_params(params)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': str(e)})
+            }
         
-        query += " ORDER BY created_at DESC"
+        query_params['user_id'] = user_id
+        await cur.execute(build_goals_list_query(filter_shape, sort, direction), query_params, prepare=True)
+        goals = await cur.fetchall()
         
-        cur.execute(query, query_params)
-        goals = cur.fetchall()
+        # One extra row is fetched to tell whether another page exists
+        limit = query_params['limit']
+        next_cursor = None
+        if limit is not None and len(goals) > limit:
+            next_cursor = encode_goal_cursor(goals[limit - 1][12], goals[limit - 1][0])
+        result = [goal_to_dict(goal) for goal in goals[:limit]]
         
-        result = []
-        for goal in goals:
-            progress = (float(goal[3]) / float(goal[2])) * 100 if goal[2] > 0 else 0
-            result.append({
-                'id': goal[0],
-                'title': goal[1],
-                'target': float(goal[2]),
-                'current': float(goal[3]),
-                'deadline': goal[4].isoformat(),
-                'is_completed': goal[5],
-                'created_at': goal[6].isoformat(),
-                'updated_at': goal[7].isoformat(),
-                'progress': progress
-            })
+        payload = {'total': len(result), 'limit': limit, 'next_cursor': next_cursor}
+        if params.get('format') == 'columnar':
+            payload['columns'] = to_columns(result, GOAL_FIELDS)
+        else:
+            payload['goals'] = result
         
         return {
             'statusCode': 200,
@@ -214,18 +260,34 @@ def handle_get_goals(cur, user_id: int, params: Dict[str, Any]) -> Dict[str, Any
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({
-                'goals': result,
-                'total': len(result)
-            })
+            'body': json.dumps(payload, separators=(',', ':'))
         }
 
-def handle_create_goal(cur, user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+def goal_event_cte(source: str, operation: str) -> str:
+    """CTE appending a change event for every row returned by the source CTE"""
+    # Written by the same statement as the row itself: the event commits or
+    # rolls back with it and costs no extra round-trip
+    return f"""change_event AS (
+            INSERT INTO change_events (user_id, aggregate, aggregate_id, operation, payload)
+            SELECT user_id, 'goal', id, '{operation}', jsonb_build_object(
+                'title', title,
+                'target', target_amount,
+                'current', current_amount,
+                'currency', currency,
+                'deadline', deadline_date,
+                'is_completed', is_completed,
+                'is_overdue', is_overdue
+            )
+            FROM {source}
+        )"""
+
+async def handle_create_goal(cur, user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
     """Create new financial goal"""
     title = data.get('title', '').strip()
     target_amount = data.get('target')
     deadline_date = data.get('deadline')
     current_amount = data.get('current', 0)
+    currency = data.get('currency')
     
     # Validation
     if not title:
@@ -282,14 +344,29 @@ def handle_create_goal(cur, user_id: int, data: Dict[str, Any]) -> Dict[str, Any
     if current_amount < 0:
         current_amount = 0
     
+    if currency:
+        currency = await validate_currency(cur, currency)
+        if not currency:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Unknown currency'})
+            }
+    
     # Insert goal
-    cur.execute("""
-        INSERT INTO financial_goals (user_id, title, target_amount, current_amount, deadline_date)
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING id, created_at, updated_at
-    """, (user_id, title, target_amount, current_amount, deadline_parsed))
+    await cur.execute(f"""
+        WITH inserted AS (
+            INSERT INTO financial_goals (user_id, title, target_amount, current_amount, currency, deadline_date)
+            VALUES (%s, %s, %s, %s, COALESCE(%s, (SELECT base_currency FROM users WHERE id = %s)), %s)
+            RETURNING *
+        ), {goal_event_cte('inserted', 'create')}
+        SELECT id, created_at, updated_at, currency FROM inserted
+    """, (user_id, title, target_amount, current_amount, currency, user_id, deadline_parsed), prepare=True)
     
-    goal_id, created_at, updated_at = cur.fetchone()
+    goal_id, created_at, updated_at, currency = await cur.fetchone()
     
     progress = (float(current_amount) / float(target_amount)) * 100 if target_amount > 0 else 0
     
@@ -306,6 +383,7 @@ def handle_create_goal(cur, user_id: int, data: Dict[str, Any]) -> Dict[str, Any
                 'title': title,
                 'target': float(target_amount),
                 'current': float(current_amount),
+                'currency': currency,
                 'deadline': deadline_parsed.isoformat(),
                 'is_completed': False,
                 'created_at': created_at.isoformat(),
@@ -315,7 +393,7 @@ def handle_create_goal(cur, user_id: int, data: Dict[str, Any]) -> Dict[str, Any
         })
     }
 
-def handle_update_goal(cur, user_id: int, goal_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+async def handle_update_goal(cur, user_id: int, goal_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
     """Update existing financial goal"""
     if not goal_id:
         return {
@@ -327,19 +405,7 @@ def handle_update_goal(cur, user_id: int, goal_id: int, data: Dict[str, Any]) ->
             'body': json.dumps({'error': 'Goal ID is required'})
         }
     
-    # Check if goal belongs to user
-    cur.execute("SELECT id FROM financial_goals WHERE id = %s AND user_id = %s", (goal_id, user_id))
-    if not cur.fetchone():
-        return {
-            'statusCode': 404,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'Goal not found'})
-        }
-    
-    # Build update query dynamically
+    # Build update query dynamically; ownership is checked by the UPDATE itself
     updates = []
     params = []
     
@@ -355,11 +421,27 @@ def handle_update_goal(cur, user_id: int, goal_id: int, data: Dict[str, Any]) ->
         updates.append("current_amount = %s")
         params.append(data['current'])
     
+    if data.get('currency'):
+        currency = await validate_currency(cur, data['currency'])
+        if not currency:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Unknown currency'})
+            }
+        updates.append("currency = %s")
+        params.append(currency)
+    
     if 'deadline' in data:
         try:
             deadline_parsed = datetime.fromisoformat(data['deadline'].replace('Z', '+00:00')).date()
             updates.append("deadline_date = %s")
             params.append(deadline_parsed)
+            # A moved deadline is re-evaluated (and re-notified) by the next deadline sweep
+            updates.append("is_overdue = FALSE")
         except ValueError:
             return {
                 'statusCode': 400,
@@ -388,15 +470,29 @@ def handle_update_goal(cur, user_id: int, goal_id: int, data: Dict[str, Any]) ->
     updates.append("updated_at = CURRENT_TIMESTAMP")
     params.extend([goal_id, user_id])
     
-    cur.execute(f"""
-        UPDATE financial_goals 
-        SET {', '.join(updates)}
-        WHERE id = %s AND user_id = %s
-        RETURNING id, title, target_amount, current_amount, deadline_date, 
-                  is_completed, created_at, updated_at
+    await cur.execute(f"""
+        WITH updated AS (
+            UPDATE financial_goals 
+            SET {', '.join(updates)}
+            WHERE id = %s AND user_id = %s
+            RETURNING *
+        ), {goal_event_cte('updated', 'update')}
+        SELECT id, title, target_amount, current_amount, deadline_date, 
+               is_completed, created_at, updated_at, currency
+        FROM updated
     """, params)
     
-    updated_goal = cur.fetchone()
+    updated_goal = await cur.fetchone()
+    if not updated_goal:
+        return {
+            'statusCode': 404,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Goal not found'})
+        }
+    
     progress = (float(updated_goal[3]) / float(updated_goal[2])) * 100 if updated_goal[2] > 0 else 0
     
     return {
@@ -412,6 +508,7 @@ def handle_update_goal(cur, user_id: int, goal_id: int, data: Dict[str, Any]) ->
                 'title': updated_goal[1],
                 'target': float(updated_goal[2]),
                 'current': float(updated_goal[3]),
+                'currency': updated_goal[8],
                 'deadline': updated_goal[4].isoformat(),
                 'is_completed': updated_goal[5],
                 'created_at': updated_goal[6].isoformat(),
@@ -421,7 +518,93 @@ def handle_update_goal(cur, user_id: int, goal_id: int, data: Dict[str, Any]) ->
         })
     }
 
-def handle_delete_goal(cur, user_id: int, goal_id: str) -> Dict[str, Any]:
+# Contributions add to the stored amount inside the UPDATE itself, so concurrent
+# contributions queue on the row lock instead of overwriting each other. The
+# history row and the change event are written by the same statement.
+CONTRIBUTE_GOAL_SQL = f"""
+    WITH updated AS (
+        UPDATE financial_goals
+        SET current_amount = COALESCE(current_amount, 0) + %(amount)s::numeric,
+            is_completed = is_completed OR COALESCE(current_amount, 0) + %(amount)s::numeric >= target_amount,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = %(goal_id)s AND user_id = %(user_id)s
+        RETURNING *
+    ), contribution AS (
+        INSERT INTO goal_contributions (goal_id, user_id, amount, current_amount, note)
+        SELECT id, user_id, %(amount)s::numeric, current_amount, %(note)s FROM updated
+        RETURNING id, amount::float8, created_at
+    ), {goal_event_cte('updated', 'update')}
+    {GOAL_SELECT.rstrip()}, c.id, c.amount, c.created_at
+    FROM updated g CROSS JOIN contribution c
+"""
+
+async def handle_contribute_goal(cur, user_id: int, goal_id: Any, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Add money to a goal atomically and record the contribution"""
+    try:
+        goal_id = int(goal_id)
+    except (TypeError, ValueError):
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Goal ID is required'})
+        }
+    
+    try:
+        amount = Decimal(str(data.get('amount'))).quantize(Decimal('0.01'))  # stored with cents
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite() or amount <= 0:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Amount must be positive'})
+        }
+    
+    note = str(data.get('note') or '').strip()[:255] or None
+    
+    await cur.execute(CONTRIBUTE_GOAL_SQL, {
+        'goal_id': goal_id,
+        'user_id': user_id,
+        'amount': str(amount),
+        'note': note
+    }, prepare=True)
+    
+    row = await cur.fetchone()
+    if not row:
+        return {
+            'statusCode': 404,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Goal not found'})
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps({
+            'success': True,
+            'goal': goal_to_dict(row),
+            'contribution': {
+                'id': row[12],
+                'amount': row[13],
+                'note': note,
+                'created_at': row[14].isoformat()
+            }
+        })
+    }
+
+async def handle_delete_goal(cur, user_id: int, goal_id: str) -> Dict[str, Any]:
     """Delete financial goal"""
     if not goal_id:
         return {
@@ -446,9 +629,15 @@ def handle_delete_goal(cur, user_id: int, goal_id: str) -> Dict[str, Any]:
         }
     
     # Delete goal
-    cur.execute("DELETE FROM financial_goals WHERE id = %s AND user_id = %s", (goal_id, user_id))
-    
-    if cur.rowcount == 0:
+    await cur.execute(f"""
+        WITH deleted AS (
+            DELETE FROM financial_goals WHERE id = %s AND user_id = %s
+            RETURNING *
+        ), {goal_event_cte('deleted', 'delete')}
+        SELECT id FROM deleted
+    """, (goal_id, user_id), prepare=True)
+    
+    if not await cur.fetchone():
         return {
             'statusCode': 404,
             'headers': {
@@ -465,4 +654,8 @@ def handle_delete_goal(cur, user_id: int, goal_id: str) -> Dict[str, Any]:
             'Content-Type': 'application/json'
         },
         'body': json.dumps({'success': True, 'message': 'Goal deleted'})
-    }
\ No newline at end of file
+    }
+
+# CORS, rate limits, Idempotency-Key replay, replica routing and compression
+# come from the vendored runtime; this function only adds its route table
+api = UserFunction('goals', dispatch_request)
@@ -0,0 +1,238 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Exchange rates shared by the transactions and goals functions and
+# reports.py. Copied next to their index.py by backend/shared/vendor.py: edit
+# it here and re-run the script. psycopg is only needed by the loader below
+# and is imported there.
+
+# rub_rate() for many (currency, date) pairs in one statement
+RATES_SQL = """
+    SELECT m.currency, m.rate_date, rub_rate(m.currency, m.rate_date)
+    FROM unnest(%s::CHAR(3)[], %s::DATE[]) AS m(currency, rate_date)
+"""
+
+CENT = Decimal('0.01')
+
+
+class RateCache:
+    '''
+    Business: Bounded per-process cache of rub_rate() results by (currency, date)
+    Args: max_entries - pairs kept; the least recently used one is evicted beyond that
+          ttl_seconds - how long a rate is trusted; reloaded rates show up after this
+    Returns: object whose get_many() splits pairs into cached rates and misses
+
+    Aggregations group foreign-currency amounts by (currency, day) in SQL and
+    convert the groups here, so a warm instance looks up no rate at all.
+    '''
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._rates: 'OrderedDict[Tuple[str, date], Tuple[Optional[Decimal], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+
+    def get_many(self, keys: Iterable[Tuple[str, date]]) -> Tuple[Dict[Tuple[str, date], Optional[Decimal]], List[Tuple[str, date]]]:
+        """Cached rates and the keys still to be looked up (RUB is always 1)"""
+        rates: Dict[Tuple[str, date], Optional[Decimal]] = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                if key[0] == 'RUB':
+                    rates[key] = Decimal(1)
+                    continue
+                cached = self._rates.get(key)
+                if cached and cached[1] > now:
+                    self._rates.move_to_end(key)
+                    rates[key] = cached[0]
+                else:
+                    missing.append(key)
+        return rates, missing
+
+    def put_many(self, rows: Iterable[Tuple[str, date, Optional[Decimal]]]) -> Dict[Tuple[str, date], Optional[Decimal]]:
+        """Store RATES_SQL rows; returns them as a key -> rate dict"""
+        rates = {(currency, rate_date): rate for currency, rate_date, rate in rows}
+        expires_at = time.monotonic() + self._ttl
+        with self._lock:
+            for key, rate in rates.items():
+                self._rates.pop(key, None)
+                self._rates[key] = (rate, expires_at)
+            while len(self._rates) > self._max_entries:
+                self._rates.popitem(last=False)
+        return rates
+
+
+def rate_keys(groups: Iterable[Tuple[str, str, Optional[date]]]) -> set:
+    """(currency, date) pairs needed to convert (from, to, rate_date) groups; same-currency groups need none"""
+    keys = set()
+    for from_currency, to_currency, rate_date in groups:
+        if rate_date is not None and from_currency != to_currency:
+            keys.add((from_currency, rate_date))
+            keys.add((to_currency, rate_date))
+    return keys
+
+
+def convert(amount: Any, from_currency: str, to_currency: str, rate_date: Optional[date],
+            rates: Dict[Tuple[str, date], Optional[Decimal]]) -> Optional[Decimal]:
+    """Amount in to_currency at the rub_rate() rates of rate_date; None where a currency has no rates"""
+    if amount is None or from_currency == to_currency:
+        return amount
+    rate_from, rate_to = rates.get((from_currency, rate_date)), rates.get((to_currency, rate_date))
+    if rate_from is None or rate_to is None:
+        return None
+    # ROUND(numeric, 2) in Postgres rounds half away from zero
+    return (Decimal(amount) * rate_from / rate_to).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class ConvertedSum:
+    '''
+    Business: Sum of amounts converted into one currency
+    Args: none; add() takes one (amount, from, to, rate_date) group at a time
+    Returns: object with total (converted amounts) and unconverted (currency -> amount)
+
+    An amount whose currency has no rate for its date is never dropped: it is
+    kept in its own currency under unconverted, so the response shows it.
+    '''
+
+    def __init__(self):
+        self.total = Decimal(0)
+        self.unconverted: Dict[str, Decimal] = {}
+
+    def add(self, amount: Any, from_currency: str, to_currency: str, rate_date: Optional[date],
+            rates: Dict[Tuple[str, date], Optional[Decimal]]) -> None:
+        if amount is None:
+            return
+        converted = convert(amount, from_currency, to_currency, rate_date, rates)
+        if converted is None:
+            self.unconverted[from_currency] = self.unconverted.get(from_currency, Decimal(0)) + Decimal(amount)
+        else:
+            self.total += converted
+
+
+def unconverted_by_currency(sums: Dict[str, ConvertedSum]) -> Dict[str, Dict[str, float]]:
+    """{currency: {label: amount}} of the amounts the labelled sums could not convert"""
+    result: Dict[str, Dict[str, float]] = {}
+    for label, converted_sum in sums.items():
+        for currency, amount in converted_sum.unconverted.items():
+            result.setdefault(currency, {})[label] = float(amount)
+    return result
+
+
+# Currencies with loaded exchange rates, cached per process so validating the
+# currency of a write costs no query; an unknown code refreshes the set at most
+# once per KNOWN_CURRENCIES_REFRESH_SECONDS
+KNOWN_CURRENCIES_REFRESH_SECONDS = 300
+_known_currencies = {'RUB'}
+_known_currencies_loaded_at: Optional[float] = None
+_known_currencies_lock = threading.Lock()
+
+
+async def validate_currency(cur, currency: Any) -> Optional[str]:
+    """Normalize a currency code; None if it is malformed or has no exchange rates"""
+    global _known_currencies, _known_currencies_loaded_at
+    code = str(currency).strip().upper()
+    with _known_currencies_lock:
+        if code in _known_currencies:
+            return code
+    if len(code) != 3 or not code.isalpha():
+        return None
+
+    # The lock is never held across the query: one thread claims the refresh
+    # and the others answer from the set they have
+    now = time.monotonic()
+    with _known_currencies_lock:
+        refresh = _known_currencies_loaded_at is None or now - _known_currencies_loaded_at >= KNOWN_CURRENCIES_REFRESH_SECONDS
+        if refresh:
+            _known_currencies_loaded_at = now
+    if refresh:
+        await cur.execute("SELECT DISTINCT currency FROM exchange_rates", prepare=True)
+        loaded = {'RUB'} | {row[0] for row in await cur.fetchall()}
+        with _known_currencies_lock:
+            _known_currencies = loaded
+    with _known_currencies_lock:
+        return code if code in _known_currencies else None
+
+
+def read_rates_csv(path: str) -> Iterator[Tuple[str, date, Decimal]]:
+    '''
+    Business: Parse an exchange-rate CSV export
+    Args: path - CSV with a header row: date, currency, rate and optional nominal
+    Returns: iterator of (currency, rate_date, RUB per one unit)
+
+    Rates are rubles per `nominal` units, as published by the CBR (e.g. 100 JPY).
+    '''
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        for line_number, row in enumerate(csv.DictReader(csv_file), start=2):
+            try:
+                currency = row['currency'].strip().upper()
+                rate = Decimal(row['rate'].strip().replace(',', '.')) / Decimal(row.get('nominal') or 1)
+                rate_date = date.fromisoformat(row['date'].strip())
+            except (KeyError, ArithmeticError, ValueError) as e:
+                raise ValueError(f'{path}:{line_number}: invalid row {row}: {e}')
+            if len(currency) != 3 or not currency.isalpha() or rate <= 0:
+                raise ValueError(f'{path}:{line_number}: invalid row {row}')
+            if currency != 'RUB':
+                yield currency, rate_date, rate
+
+
+def load_rates(conn, path: str) -> Dict[str, int]:
+    '''
+    Business: Upsert exchange rates from a CSV file in one transaction
+    Args: conn - psycopg connection
+          path - CSV file, see read_rates_csv
+    Returns: dict with number of loaded rows and currencies
+    '''
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TEMP TABLE exchange_rates_load (LIKE exchange_rates) ON COMMIT DROP
+            """)
+            # COPY streams the file in one round-trip; the upsert is then set-based
+            with cur.copy("COPY exchange_rates_load (currency, rate_date, rate) FROM STDIN") as copy:
+                for row in read_rates_csv(path):
+                    copy.write_row(row)
+
+            cur.execute("""
+                INSERT INTO exchange_rates (currency, rate_date, rate)
+                SELECT DISTINCT ON (currency, rate_date) currency, rate_date, rate
+                FROM exchange_rates_load
+                ORDER BY currency, rate_date
+                ON CONFLICT (currency, rate_date) DO UPDATE SET rate = EXCLUDED.rate
+            """)
+            loaded = cur.rowcount
+
+            cur.execute("SELECT COUNT(DISTINCT currency) FROM exchange_rates_load")
+            currencies = cur.fetchone()[0]
+
+    return {'rows': loaded, 'currencies': currencies}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Load exchange rates (RUB per unit) into exchange_rates')
+    parser.add_argument('csv_path')
+    args = parser.parse_args()
+
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        raise SystemExit('DATABASE_URL is not set')
+
+    import psycopg
+
+    started = time.perf_counter()
+    with psycopg.connect(dsn) as conn:
+        result = load_rates(conn, args.csv_path)
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+import psycopg
+
+# One statement per batch: lock the next slice of open goals in index order,
+# classify them, flip completed/overdue flags in bulk, record change events for
+# the flipped goals and queue notifications.
+SWEEP_BATCH_SQL = """
+    WITH batch AS (
+        SELECT id, user_id, title, deadline_date, current_amount, target_amount, currency
+        FROM financial_goals
+        WHERE is_completed = FALSE AND is_overdue = FALSE
+            AND deadline_date <= %(horizon)s
+            AND (deadline_date, id) > (%(after_deadline)s, %(after_id)s)
+        ORDER BY deadline_date, id
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED
+    ), classified AS (
+        SELECT b.*,
+            CASE
+                WHEN b.current_amount >= b.target_amount THEN 'goal_completed'
+                WHEN b.deadline_date < %(today)s THEN 'goal_overdue'
+                ELSE 'goal_deadline_approaching'
+            END AS kind
+        FROM batch b
+    ), completed AS (
+        UPDATE financial_goals g
+        SET is_completed = TRUE, updated_at = CURRENT_TIMESTAMP
+        FROM classified c
+        WHERE g.id = c.id AND c.kind = 'goal_completed'
+        RETURNING g.*
+    ), overdue AS (
+        UPDATE financial_goals g
+        SET is_overdue = TRUE, updated_at = CURRENT_TIMESTAMP
+        FROM classified c
+        WHERE g.id = c.id AND c.kind = 'goal_overdue'
+        RETURNING g.*
+    ), changed AS (
+        INSERT INTO change_events (user_id, aggregate, aggregate_id, operation, payload)
+        SELECT user_id, 'goal', id, 'update', jsonb_build_object(
+            'title', title,
+            'target', target_amount,
+            'current', current_amount,
+            'currency', currency,
+            'deadline', deadline_date,
+            'is_completed', is_completed,
+            'is_overdue', is_overdue
+        )
+        FROM (SELECT * FROM completed UNION ALL SELECT * FROM overdue) flipped
+    ), notified AS (
+        INSERT INTO notification_outbox (user_id, goal_id, kind, payload, dedup_key)
+        SELECT user_id, id, kind,
+            jsonb_build_object(
+                'title', title,
+                'deadline', deadline_date,
+                'current', current_amount,
+                'target', target_amount,
+                'currency', currency
+            ),
+            kind || ':' || id || ':' || deadline_date
+        FROM classified
+        ON CONFLICT (dedup_key) DO NOTHING
+        RETURNING id
+    ), last_row AS (
+        SELECT deadline_date, id FROM batch ORDER BY deadline_date DESC, id DESC LIMIT 1
+    )
+    SELECT
+        (SELECT deadline_date FROM last_row),
+        (SELECT id FROM last_row),
+        (SELECT COUNT(*) FROM batch),
+        (SELECT COUNT(*) FROM completed),
+        (SELECT COUNT(*) FROM overdue),
+        (SELECT COUNT(*) FROM notified)
+"""
+
+
+def run_deadline_sweep(conn, horizon_days: int = 7, batch_size: int = 1000,
+                       today: Optional[date] = None) -> Dict[str, Any]:
+    '''
+    Business: Mark overdue/completed goals and queue deadline reminders for all users
+    Args: conn - psycopg connection (not autocommit; each batch is committed)
+          horizon_days - goals due within this many days get a reminder
+          batch_size - goals locked and processed per statement
+          today - day goals are classified against, defaults to the current date
+    Returns: dict with totals of scanned, completed, overdue and notified goals
+
+    Goals are walked in (deadline_date, id) order over the partial index of
+    open goals, one keyset batch per transaction, so memory stays constant and
+    locks are short. Overdue goals leave the index, and reminders are
+    deduplicated per goal and deadline, so re-running the sweep is safe.
+    '''
+    today = today or date.today()
+    params = {
+        'today': today,
+        'horizon': today + timedelta(days=horizon_days),
+        'batch_size': batch_size,
+        'after_deadline': date.min,
+        'after_id': 0,
+    }
+    totals = {'batches': 0, 'scanned': 0, 'completed': 0, 'overdue': 0, 'notified': 0}
+
+    with conn.cursor() as cur:
+        while True:
+            cur.execute(SWEEP_BATCH_SQL, params, prepare=True)
+            last_deadline, last_id, scanned, completed, overdue, notified = cur.fetchone()
+            conn.commit()
+
+            if not scanned:
+                break
+
+            totals['batches'] += 1
+            totals['scanned'] += scanned
+            totals['completed'] += completed
+            totals['overdue'] += overdue
+            totals['notified'] += notified
+            params['after_deadline'], params['after_id'] = last_deadline, last_id
+
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Goal deadline reminder sweep')
+    parser.add_argument('--horizon-days', type=int, default=7)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        raise SystemExit('DATABASE_URL is not set')
+
+    started = time.perf_counter()
+    with psycopg.connect(dsn) as conn:
+        totals = run_deadline_sweep(conn, args.horizon_days, args.batch_size)
+    totals['seconds'] = round(time.perf_counter() - started, 3)
+    print(json.dumps(totals, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import unittest
+from datetime import date
+
+from sweep import run_deadline_sweep
+
+
+class ScriptedConnection:
+    """Connection and cursor stand-in answering each statement with the next scripted row"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.params = []
+        self.commits = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None, prepare=None):
+        self.params.append(dict(params))
+
+    def fetchone(self):
+        return self.rows.pop(0)
+
+    def commit(self):
+        self.commits += 1
+
+
+EMPTY_BATCH = (None, None, 0, 0, 0, 0)
+
+
+class DeadlineSweepTest(unittest.TestCase):
+    def test_window_ends_horizon_days_after_today(self):
+        conn = ScriptedConnection([EMPTY_BATCH])
+        run_deadline_sweep(conn, horizon_days=7, batch_size=100, today=date(2026, 2, 25))
+
+        params = conn.params[0]
+        self.assertEqual(params['today'], date(2026, 2, 25))
+        self.assertEqual(params['horizon'], date(2026, 3, 4))
+        self.assertEqual(params['batch_size'], 100)
+
+    def test_batches_continue_after_the_last_goal_of_the_previous_one(self):
+        conn = ScriptedConnection([
+            (date(2026, 3, 1), 42, 2, 1, 0, 2),
+            (date(2026, 3, 3), 17, 2, 0, 1, 1),
+            EMPTY_BATCH,
+        ])
+        totals = run_deadline_sweep(conn, batch_size=2, today=date(2026, 3, 1))
+
+        keysets = [(params['after_deadline'], params['after_id']) for params in conn.params]
+        self.assertEqual(keysets, [(date.min, 0), (date(2026, 3, 1), 42), (date(2026, 3, 3), 17)])
+        self.assertEqual(totals, {'batches': 2, 'scanned': 4, 'completed': 1, 'overdue': 1, 'notified': 3})
+        self.assertEqual(conn.commits, 3)
+
+    def test_an_empty_first_batch_ends_the_sweep(self):
+        conn = ScriptedConnection([EMPTY_BATCH])
+        totals = run_deadline_sweep(conn, today=date(2026, 3, 1))
+
+        self.assertEqual(totals, {'batches': 0, 'scanned': 0, 'completed': 0, 'overdue': 0, 'notified': 0})
+        self.assertEqual(len(conn.params), 1)
+        self.assertEqual(conn.commits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg
+
+# Must match the shard expression of change_events (V0007): user_id % 16
+SHARD_COUNT = 16
+
+EVENT_FIELDS = ('id', 'user_id', 'aggregate', 'aggregate_id', 'operation', 'payload', 'xact_id', 'created_at')
+
+# The least recently polled shard that no other worker holds right now
+CLAIM_SHARD_SQL = """
+    SELECT shard, last_xact_id::text, last_event_id
+    FROM change_event_offsets
+    WHERE consumer = %s
+    ORDER BY polled_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+"""
+
+# Events are read in commit-safe order: only transactions older than every
+# running one are visible, and every later event gets a larger (xact_id, id),
+# so an offset never jumps over an event that commits late
+FETCH_EVENTS_SQL = """
+    SELECT id, user_id, aggregate, aggregate_id, operation, payload, xact_id::text, created_at
+    FROM change_events
+    WHERE shard = %s
+        AND (xact_id, id) > (%s::xid8, %s)
+        AND xact_id < pg_snapshot_xmin(pg_current_snapshot())
+    ORDER BY xact_id, id
+    LIMIT %s
+"""
+
+ADVANCE_OFFSET_SQL = """
+    UPDATE change_event_offsets
+    SET last_xact_id = %s::xid8, last_event_id = %s, polled_at = clock_timestamp()
+    WHERE consumer = %s AND shard = %s
+"""
+
+# Deletes events every registered consumer has already passed
+PURGE_CONSUMED_SQL = """
+    WITH low_water AS (
+        SELECT DISTINCT ON (shard) shard, last_xact_id, last_event_id
+        FROM change_event_offsets
+        ORDER BY shard, last_xact_id, last_event_id
+    ), consumed AS (
+        SELECT e.id
+        FROM change_events e
+        JOIN low_water w ON w.shard = e.shard
+        WHERE (e.xact_id, e.id) <= (w.last_xact_id, w.last_event_id)
+        LIMIT %s
+    )
+    DELETE FROM change_events WHERE id IN (SELECT id FROM consumed)
+"""
+
+EventHandler = Callable[[Any, List[Dict[str, Any]]], None]
+
+
+class ChangeEventConsumer:
+    '''
+    Business: Drains the change_events outbox for one named consumer
+    Args: name - consumer name; each name keeps its own offsets
+          handle - callable(conn, events) invoked with a batch of event dicts
+          batch_size - maximum events passed to one handle call
+    Returns: object whose poll_once()/run() process batches
+
+    Each poll claims one shard row in change_event_offsets with FOR UPDATE
+    SKIP LOCKED, so any number of workers (threads or processes) can run the
+    same consumer and never see the same shard at once. The batch is handled
+    and the offset advanced in one transaction: writes made through the given
+    connection are applied exactly once, external side effects at least once.
+    '''
+
+    def __init__(self, name: str, handle: EventHandler, batch_size: int = 500):
+        self.name = name
+        self.handle = handle
+        self.batch_size = batch_size
+
+    def register(self, conn) -> None:
+        """Create offset rows for every shard; new consumers start from the oldest retained event"""
+        with conn.transaction():
+            conn.execute("""
+                INSERT INTO change_event_offsets (consumer, shard)
+                SELECT %s, generate_series(0, %s - 1)
+                ON CONFLICT (consumer, shard) DO NOTHING
+            """, (self.name, SHARD_COUNT))
+
+    def poll_once(self, conn) -> Optional[int]:
+        '''
+        Business: Handle the next batch of one shard
+        Args: conn - psycopg connection (not shared with other workers)
+        Returns: number of events handled, or None if every shard is claimed by other workers
+        '''
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute(CLAIM_SHARD_SQL, (self.name,), prepare=True)
+                claimed = cur.fetchone()
+                if not claimed:
+                    return None
+                shard, last_xact_id, last_event_id = claimed
+
+                cur.execute(FETCH_EVENTS_SQL, (shard, last_xact_id, last_event_id, self.batch_size), prepare=True)
+                events = [dict(zip(EVENT_FIELDS, row)) for row in cur.fetchall()]
+
+                if events:
+                    self.handle(conn, events)
+                    last_xact_id, last_event_id = events[-1]['xact_id'], events[-1]['id']
+
+                # Also bumps polled_at for empty shards so workers rotate through all of them
+                cur.execute(ADVANCE_OFFSET_SQL, (last_xact_id, last_event_id, self.name, shard), prepare=True)
+        return len(events)
+
+    def run(self, conn, stop: threading.Event, idle_seconds: float = 1.0) -> None:
+        """Poll until stop is set, sleeping once a full round over the shards found nothing"""
+        empty_polls = 0
+        while not stop.is_set():
+            handled = self.poll_once(conn)
+            empty_polls = 0 if handled else empty_polls + 1
+            if empty_polls >= SHARD_COUNT or handled is None:
+                empty_polls = 0
+                stop.wait(idle_seconds)
+
+
+def run_workers(dsn: str, consumer: ChangeEventConsumer, workers: int, stop: threading.Event,
+                idle_seconds: float = 1.0) -> None:
+    '''
+    Business: Run a consumer on several threads, each with its own connection
+    Args: dsn - database connection string
+          consumer - consumer to run
+          workers - number of threads (at most SHARD_COUNT are useful)
+          stop - event that ends all workers
+          idle_seconds - sleep after an empty round
+    Returns: None once every worker has stopped
+    '''
+    with psycopg.connect(dsn) as conn:
+        consumer.register(conn)
+
+    def work() -> None:
+        with psycopg.connect(dsn) as conn:
+            consumer.run(conn, stop, idle_seconds)
+
+    threads = [threading.Thread(target=work, name=f'{consumer.name}-{index}') for index in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def purge_consumed(conn, batch_size: int = 10000) -> int:
+    '''
+    Business: Delete events that all registered consumers have processed
+    Args: conn - psycopg connection in autocommit mode
+          batch_size - events deleted per statement
+    Returns: number of deleted events
+    '''
+    deleted = 0
+    with conn.cursor() as cur:
+        while True:
+            cur.execute(PURGE_CONSUMED_SQL, (batch_size,))
+            deleted += cur.rowcount
+            if cur.rowcount < batch_size:
+                return deleted
+
+
+def print_events(conn, events: List[Dict[str, Any]]) -> None:
+    """Debug handler: write events to stdout as NDJSON"""
+    for event in events:
+        sys.stdout.write(json.dumps(event, default=str) + '\n')
+    sys.stdout.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Change event outbox tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    tail_parser = subparsers.add_parser('tail', help='Consume events and print them as NDJSON')
+    tail_parser.add_argument('--consumer', default='tail')
+    tail_parser.add_argument('--workers', type=int, default=1)
+    tail_parser.add_argument('--batch-size', type=int, default=500)
+
+    purge_parser = subparsers.add_parser('purge', help='Delete events consumed by every consumer')
+    purge_parser.add_argument('--batch-size', type=int, default=10000)
+
+    args = parser.parse_args()
+
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        raise SystemExit('DATABASE_URL is not set')
+
+    if args.command == 'purge':
+        started = time.perf_counter()
+        with psycopg.connect(dsn, autocommit=True) as conn:
+            deleted = purge_consumed(conn, args.batch_size)
+        print(json.dumps({'deleted': deleted, 'seconds': round(time.perf_counter() - started, 3)}))
+        return
+
+    stop = threading.Event()
+    consumer = ChangeEventConsumer(args.consumer, print_events, args.batch_size)
+    try:
+        run_workers(dsn, consumer, args.workers, stop)
+    except KeyboardInterrupt:
+        stop.set()
+
+
+if __name__ == '__main__':
+    main()
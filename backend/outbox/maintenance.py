@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import time
+
+import psycopg
+
+# Cleanup of tables shared by several functions. Partition maintenance of
+# transactions stays in backend/transactions/archive.py.
+
+
+def purge_idempotency_keys(conn, batch_size: int = 10000) -> int:
+    '''
+    Business: Delete expired Idempotency-Key records of all write functions
+    Args: conn - psycopg connection in autocommit mode
+          batch_size - rows deleted per statement
+    Returns: number of deleted records
+    '''
+    deleted = 0
+    with conn.cursor() as cur:
+        while True:
+            cur.execute("""
+                DELETE FROM idempotency_keys
+                WHERE ctid IN (
+                    SELECT ctid FROM idempotency_keys
+                    WHERE expires_at < CURRENT_TIMESTAMP
+                    LIMIT %s
+                )
+            """, (batch_size,))
+            deleted += cur.rowcount
+            if cur.rowcount < batch_size:
+                return deleted
+
+
+def purge_rate_limit_buckets(conn, idle_hours: int = 24) -> int:
+    '''
+    Business: Delete shared rate-limit buckets that have been idle long enough to be full again
+    Args: conn - psycopg connection in autocommit mode
+          idle_hours - buckets untouched for this long are deleted
+    Returns: number of deleted buckets
+    '''
+    with conn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM rate_limit_buckets WHERE updated_at < clock_timestamp() - %s * INTERVAL '1 hour'",
+            (idle_hours,)
+        )
+        return cur.rowcount
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Cleanup of tables shared by the functions')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    purge_parser = subparsers.add_parser('purge-idempotency-keys', help='Delete expired Idempotency-Key records')
+    purge_parser.add_argument('--batch-size', type=int, default=10000)
+
+    buckets_parser = subparsers.add_parser('purge-rate-limits', help='Delete idle shared rate-limit buckets')
+    buckets_parser.add_argument('--idle-hours', type=int, default=24)
+
+    args = parser.parse_args()
+
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        raise SystemExit('DATABASE_URL is not set')
+
+    started = time.perf_counter()
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        if args.command == 'purge-idempotency-keys':
+            deleted = purge_idempotency_keys(conn, args.batch_size)
+        else:
+            deleted = purge_rate_limit_buckets(conn, args.idle_hours)
+    print(json.dumps({'deleted': deleted, 'seconds': round(time.perf_counter() - started, 3)}))
+
+
+if __name__ == '__main__':
+    main()
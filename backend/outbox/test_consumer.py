@@ -0,0 +1,148 @@
+import os
+import re
+import unittest
+from contextlib import contextmanager
+
+from consumer import (
+    ADVANCE_OFFSET_SQL, CLAIM_SHARD_SQL, FETCH_EVENTS_SQL, PURGE_CONSUMED_SQL, SHARD_COUNT,
+    ChangeEventConsumer, purge_consumed
+)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'db_migrations')
+
+
+class ScriptedConnection:
+    """Connection and cursor stand-in: each statement gets the next of its queued results, else no rows"""
+
+    def __init__(self, results):
+        self.results = results
+        self.statements = []
+        self.rowcount = 0
+        self._rows = []
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None, prepare=None):
+        self.statements.append((query, params))
+        queued = self.results.get(query)
+        self._rows = queued.pop(0) if queued else []
+        self.rowcount = len(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+    def executed(self, query):
+        return [params for statement, params in self.statements if statement == query]
+
+
+def event_row(event_id, xact_id, user_id=3):
+    return (event_id, user_id, 'transaction', event_id, 'create', {}, xact_id, None)
+
+
+class ShardTest(unittest.TestCase):
+    def test_shard_count_matches_the_change_events_shard_column(self):
+        with open(os.path.join(MIGRATIONS_DIR, 'V0007__change_events_outbox.sql'), encoding='utf-8') as migration:
+            modulus = re.search(r'shard SMALLINT GENERATED ALWAYS AS \(\(user_id % (\d+)\)', migration.read())
+        self.assertEqual(int(modulus.group(1)), SHARD_COUNT)
+
+    def test_fetch_stops_below_the_oldest_running_transaction(self):
+        self.assertIn('xact_id < pg_snapshot_xmin(pg_current_snapshot())', FETCH_EVENTS_SQL)
+        # The offset is compared and advanced in the same (xact_id, id) order the events are read in
+        self.assertIn('(xact_id, id) > (%s::xid8, %s)', FETCH_EVENTS_SQL)
+        self.assertIn('ORDER BY xact_id, id', FETCH_EVENTS_SQL)
+
+
+class PollOnceTest(unittest.TestCase):
+    def test_handles_the_claimed_shard_from_its_offset_and_advances_it(self):
+        conn = ScriptedConnection({
+            CLAIM_SHARD_SQL: [[(5, '900', 41)]],
+            FETCH_EVENTS_SQL: [[event_row(42, '901'), event_row(44, '905')]],
+        })
+        batches = []
+        consumer = ChangeEventConsumer('budgets', lambda conn, events: batches.append(events), batch_size=50)
+
+        self.assertEqual(consumer.poll_once(conn), 2)
+        self.assertEqual(conn.executed(CLAIM_SHARD_SQL), [('budgets',)])
+        self.assertEqual(conn.executed(FETCH_EVENTS_SQL), [(5, '900', 41, 50)])
+        self.assertEqual([[event['id'] for event in events] for events in batches], [[42, 44]])
+        self.assertEqual(batches[0][1]['xact_id'], '905')
+        self.assertEqual(conn.executed(ADVANCE_OFFSET_SQL), [('905', 44, 'budgets', 5)])
+
+    def test_an_empty_shard_keeps_its_offset_but_is_marked_polled(self):
+        conn = ScriptedConnection({CLAIM_SHARD_SQL: [[(5, '900', 41)]]})
+        consumer = ChangeEventConsumer('budgets', lambda conn, events: self.fail('handled an empty batch'))
+
+        self.assertEqual(consumer.poll_once(conn), 0)
+        self.assertEqual(conn.executed(ADVANCE_OFFSET_SQL), [('900', 41, 'budgets', 5)])
+
+    def test_returns_none_when_every_shard_is_claimed(self):
+        conn = ScriptedConnection({})
+        consumer = ChangeEventConsumer('budgets', lambda conn, events: None)
+
+        self.assertIsNone(consumer.poll_once(conn))
+        self.assertEqual(conn.executed(FETCH_EVENTS_SQL), [])
+
+    def test_a_failing_handler_leaves_the_offset_alone(self):
+        conn = ScriptedConnection({CLAIM_SHARD_SQL: [[(5, '900', 41)]], FETCH_EVENTS_SQL: [[event_row(42, '901')]]})
+
+        def handle(conn, events):
+            raise RuntimeError('downstream unavailable')
+
+        with self.assertRaises(RuntimeError):
+            ChangeEventConsumer('budgets', handle).poll_once(conn)
+        self.assertEqual(conn.executed(ADVANCE_OFFSET_SQL), [])
+
+
+class IdleStop:
+    """threading.Event stand-in that records waits and stops after the first one"""
+
+    def __init__(self):
+        self.waits = []
+
+    def is_set(self):
+        return bool(self.waits)
+
+    def wait(self, seconds):
+        self.waits.append(seconds)
+
+
+class RunTest(unittest.TestCase):
+    def test_sleeps_only_after_a_full_round_of_empty_shards(self):
+        polls = []
+
+        class EmptyConsumer(ChangeEventConsumer):
+            def poll_once(self, conn):
+                polls.append(conn)
+                return 0
+
+        stop = IdleStop()
+        EmptyConsumer('budgets', lambda conn, events: None).run('conn', stop, idle_seconds=2.5)
+
+        self.assertEqual(len(polls), SHARD_COUNT)
+        self.assertEqual(stop.waits, [2.5])
+
+
+class PurgeConsumedTest(unittest.TestCase):
+    def test_deletes_in_batches_until_one_comes_back_short(self):
+        conn = ScriptedConnection({PURGE_CONSUMED_SQL: [[None] * 3, [None] * 3, [None]]})
+
+        self.assertEqual(purge_consumed(conn, batch_size=3), 7)
+        self.assertEqual(conn.executed(PURGE_CONSUMED_SQL), [(3,), (3,), (3,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
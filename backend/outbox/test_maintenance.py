@@ -0,0 +1,60 @@
+import unittest
+
+from maintenance import purge_idempotency_keys, purge_rate_limit_buckets
+
+
+class ScriptedCursor:
+    """Connection and cursor stand-in deleting the scripted number of rows per statement"""
+
+    def __init__(self, rowcounts):
+        self.rowcounts = list(rowcounts)
+        self.statements = []
+        self.rowcount = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        self.statements.append((' '.join(query.split()), params))
+        self.rowcount = self.rowcounts.pop(0)
+
+
+class PurgeIdempotencyKeysTest(unittest.TestCase):
+    def test_deletes_expired_keys_in_batches_until_one_comes_back_short(self):
+        conn = ScriptedCursor([500, 500, 12])
+
+        self.assertEqual(purge_idempotency_keys(conn, batch_size=500), 1012)
+        self.assertEqual([params for _, params in conn.statements], [(500,)] * 3)
+        self.assertIn('WHERE expires_at < CURRENT_TIMESTAMP LIMIT %s', conn.statements[0][0])
+
+    def test_a_single_statement_when_nothing_has_expired(self):
+        conn = ScriptedCursor([0])
+
+        self.assertEqual(purge_idempotency_keys(conn), 0)
+        self.assertEqual(conn.statements[0][1], (10000,))
+
+
+class PurgeRateLimitBucketsTest(unittest.TestCase):
+    def test_deletes_buckets_idle_for_the_given_hours(self):
+        conn = ScriptedCursor([3])
+
+        self.assertEqual(purge_rate_limit_buckets(conn, idle_hours=6), 3)
+        query, params = conn.statements[0]
+        self.assertIn("WHERE updated_at < clock_timestamp() - %s * INTERVAL '1 hour'", query)
+        self.assertEqual(params, (6,))
+
+    def test_idle_for_a_day_by_default(self):
+        conn = ScriptedCursor([0])
+
+        purge_rate_limit_buckets(conn)
+        self.assertEqual(conn.statements[0][1], (24,))
+
+
+if __name__ == '__main__':
+    unittest.main()
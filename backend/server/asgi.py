@@ -0,0 +1,72 @@
+import asyncio
+from typing import Any, Dict
+
+from loader import FUNCTION_NAMES, build_event, decode_response, load_function, resolve_route
+
+
+async def call_function(name: str, event: Dict[str, Any]) -> Dict[str, Any]:
+    """Call the function's async_handler, or its sync handler in a worker thread"""
+    module = load_function(name)
+    if hasattr(module, 'async_handler'):
+        return await module.async_handler(event, None)
+    return await asyncio.to_thread(module.handler, event, None)
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def send_response(send, status: int, headers: Dict[str, str], body: bytes) -> None:
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            for name in FUNCTION_NAMES:
+                load_function(name)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for name in FUNCTION_NAMES:
+                # Functions sharing one runtime share its pools; closing twice is a no-op
+                close_async_pools = getattr(load_function(name), 'close_async_pools', None)
+                if close_async_pools is not None:
+                    await close_async_pools()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    '''
+    Business: ASGI application serving /transactions, /goals and /auth
+    Args: scope, receive, send - ASGI interface
+    Returns: None
+    '''
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    name = resolve_route(scope['path'])
+    if name is None:
+        await send_response(send, 404, {'Content-Type': 'application/json'}, b'{"error": "Not found"}')
+        return
+
+    body = await read_body(receive)
+    headers = {key.decode('latin-1'): value.decode('latin-1') for key, value in scope['headers']}
+    client_ip = scope['client'][0] if scope.get('client') else ''
+    event = build_event(scope['method'], scope['path'], scope['query_string'].decode('latin-1'),
+                        headers, body, client_ip)
+
+    status, response_headers, response_body = decode_response(await call_function(name, event))
+    await send_response(send, status, response_headers, response_body)
@@ -0,0 +1,268 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+from loader import FUNCTION_NAMES, build_event, decode_response, load_function, resolve_route
+
+STATUS_CLASSES = ('2xx', '3xx', '4xx', '5xx')
+
+
+class Metrics:
+    '''
+    Business: Request counters shared by all worker processes
+    Args: none
+    Returns: object recording per-function request counts and latency
+
+    Values live in one shared-memory array created by the master before
+    forking, so /metrics on any worker reports totals for the whole server.
+    '''
+
+    def __init__(self):
+        slots = len(FUNCTION_NAMES) * len(STATUS_CLASSES)
+        self._requests = multiprocessing.Array('d', slots)
+        self._seconds = multiprocessing.Array('d', slots)
+        self._in_flight = multiprocessing.Value('i', 0)
+        self._worker_starts = multiprocessing.Value('i', 0)
+
+    def _slot(self, name: str, status: int) -> int:
+        status_index = min(max(status // 100 - 2, 0), len(STATUS_CLASSES) - 1)
+        return FUNCTION_NAMES.index(name) * len(STATUS_CLASSES) + status_index
+
+    def request_started(self) -> None:
+        with self._in_flight.get_lock():
+            self._in_flight.value += 1
+
+    def request_finished(self, name: str, status: int, seconds: float) -> None:
+        slot = self._slot(name, status)
+        with self._requests.get_lock():
+            self._requests[slot] += 1
+            self._seconds[slot] += seconds
+        with self._in_flight.get_lock():
+            self._in_flight.value -= 1
+
+    def worker_started(self) -> None:
+        with self._worker_starts.get_lock():
+            self._worker_starts.value += 1
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = [
+            '# TYPE function_requests_total counter',
+            '# TYPE function_request_seconds_total counter',
+        ]
+        with self._requests.get_lock():
+            for name in FUNCTION_NAMES:
+                for status_class in STATUS_CLASSES:
+                    slot = self._slot(name, int(status_class[0]) * 100)
+                    labels = f'function="{name}",status="{status_class}"'
+                    lines.append(f'function_requests_total{{{labels}}} {int(self._requests[slot])}')
+                    lines.append(f'function_request_seconds_total{{{labels}}} {self._seconds[slot]:.6f}')
+        lines.append('# TYPE http_requests_in_flight gauge')
+        lines.append(f'http_requests_in_flight {self._in_flight.value}')
+        lines.append('# TYPE worker_starts_total counter')
+        lines.append(f'worker_starts_total {self._worker_starts.value}')
+        return '\n'.join(lines) + '\n'
+
+
+class FunctionRequestHandler(BaseHTTPRequestHandler):
+    """Translates HTTP/1.1 requests into function events; connections are kept alive"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FinTrackerFunctions/1.0'
+    timeout = 5  # seconds an idle keep-alive connection is held open
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == '/metrics':
+            self.write_response(200, {'Content-Type': 'text/plain; version=0.0.4'},
+                                self.server.metrics.render().encode('utf-8'))
+            return
+        if url.path == '/healthz':
+            self.write_response(200, {'Content-Type': 'text/plain'}, b'ok\n')
+            return
+
+        name = resolve_route(url.path)
+        if name is None:
+            self.write_response(404, {'Content-Type': 'application/json'}, b'{"error": "Not found"}')
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        event = build_event(self.command, url.path, url.query, dict(self.headers.items()),
+                            body, self.client_address[0])
+
+        self.server.metrics.request_started()
+        started = time.perf_counter()
+        status = 500
+        try:
+            status, headers, raw_body = decode_response(load_function(name).handler(event, None))
+        except Exception as e:
+            headers = {'Content-Type': 'application/json'}
+            raw_body = json.dumps({'error': f'Server error: {str(e)}'}).encode('utf-8')
+        finally:
+            self.server.metrics.request_finished(name, status, time.perf_counter() - started)
+
+        self.write_response(status, headers, raw_body)
+
+    do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = do_GET
+
+    def write_response(self, status: int, headers: Dict[str, str], body: bytes) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            if name.lower() not in ('content-length', 'connection'):
+                self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.draining:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+
+class WorkerServer(ThreadingHTTPServer):
+    """Threaded server accepting on a listening socket inherited from the master"""
+
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, listen_socket: socket.socket, metrics: Metrics, access_log: bool):
+        super().__init__(listen_socket.getsockname()[:2], FunctionRequestHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = listen_socket
+        self.metrics = metrics
+        self.access_log = access_log
+        self.draining = False
+
+
+def worker_main(listen_socket: socket.socket, metrics: Metrics, access_log: bool) -> None:
+    '''
+    Business: Worker process entry point: warm the functions, then serve until SIGTERM
+    Args: listen_socket - shared listening socket
+          metrics - shared counters
+          access_log - log every request to stderr
+    Returns: None
+    '''
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the master coordinates shutdown
+    server = WorkerServer(listen_socket, metrics, access_log)
+
+    # Import handlers and open their pools before accepting the first request
+    for name in FUNCTION_NAMES:
+        module = load_function(name)
+        if os.environ.get('DATABASE_URL') and hasattr(module, 'get_pool'):
+            module.get_pool()
+        if os.environ.get('DATABASE_READ_URL') and hasattr(module, 'get_read_pool'):
+            module.get_read_pool()
+    metrics.worker_started()
+
+    def drain(signum, frame) -> None:
+        server.draining = True
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    server.serve_forever()
+    server.server_close()  # waits for in-flight requests (block_on_close)
+
+
+class Master:
+    '''
+    Business: Pre-forking supervisor for the worker processes
+    Args: listen_socket - bound listening socket shared with workers
+          workers - number of worker processes
+          metrics - shared counters
+          access_log - forwarded to workers
+    Returns: object whose run() blocks until shutdown
+
+    SIGHUP starts a fresh generation of workers (re-importing handler code) and
+    drains the previous one; SIGTERM/SIGINT drain all workers and exit. Workers
+    that die unexpectedly are replaced.
+    '''
+
+    def __init__(self, listen_socket: socket.socket, workers: int, metrics: Metrics, access_log: bool):
+        self.listen_socket = listen_socket
+        self.workers = workers
+        self.metrics = metrics
+        self.access_log = access_log
+        self.context = multiprocessing.get_context('fork')
+        self.processes: List[multiprocessing.Process] = []
+        self.reload_requested = False
+        self.stop_requested = False
+
+    def spawn(self) -> multiprocessing.Process:
+        process = self.context.Process(
+            target=worker_main,
+            args=(self.listen_socket, self.metrics, self.access_log),
+            daemon=False
+        )
+        process.start()
+        return process
+
+    def drain(self, processes: List[multiprocessing.Process], grace_seconds: float = 30) -> None:
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        deadline = time.monotonic() + grace_seconds
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, 'reload_requested', True))
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, 'stop_requested', True))
+        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, 'stop_requested', True))
+
+        self.processes = [self.spawn() for _ in range(self.workers)]
+        while not self.stop_requested:
+            time.sleep(0.2)
+
+            if self.reload_requested:
+                self.reload_requested = False
+                previous = self.processes
+                self.processes = [self.spawn() for _ in range(self.workers)]
+                self.drain(previous)
+                continue
+
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    process.join()
+                    self.processes[index] = self.spawn()
+
+        self.drain(self.processes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Serve backend functions over HTTP')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--backlog', type=int, default=1024)
+    parser.add_argument('--access-log', action='store_true')
+    args = parser.parse_args()
+
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind((args.host, args.port))
+    listen_socket.listen(args.backlog)
+
+    print(f'Serving {", ".join(FUNCTION_NAMES)} on {args.host}:{args.port} '
+          f'with {args.workers} workers (pid {os.getpid()})', file=sys.stderr)
+    Master(listen_socket, args.workers, Metrics(), args.access_log).run()
+    listen_socket.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import base64
+import importlib.util
+import os
+import sys
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cloud functions served by the self-hosted servers, by first path segment
+FUNCTION_NAMES = ('transactions', 'goals', 'auth')
+
+
+def load_function(name: str):
+    """Import backend/<name>/index.py under a unique module name"""
+    module_name = f'{name}_index'
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    function_dir = os.path.join(BACKEND_DIR, name)
+    if function_dir not in sys.path:
+        sys.path.insert(0, function_dir)
+
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(function_dir, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def resolve_route(path: str) -> Optional[str]:
+    """Map URL path (/transactions, /goals/...) to a function name"""
+    segment = path.strip('/').split('/', 1)[0]
+    return segment if segment in FUNCTION_NAMES else None
+
+
+def build_event(method: str, path: str, query_string: str, headers: Dict[str, str],
+                body: bytes, client_ip: str) -> Dict[str, Any]:
+    '''
+    Business: Translate an HTTP request into the event dict the cloud functions receive
+    Args: method, path, query_string - request line parts
+          headers - header name -> value
+          body - raw request body
+          client_ip - peer address
+    Returns: event dict with httpMethod, headers, queryStringParameters, body, requestContext
+    '''
+    try:
+        body_text, is_base64 = body.decode('utf-8'), False
+    except UnicodeDecodeError:
+        body_text, is_base64 = base64.b64encode(body).decode('ascii'), True
+
+    return {
+        'httpMethod': method.upper(),
+        'path': path,
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(query_string, keep_blank_values=True)),
+        'body': body_text,
+        'isBase64Encoded': is_base64,
+        'requestContext': {'identity': {'sourceIp': client_ip}, 'httpMethod': method.upper()}
+    }
+
+
+def decode_response(response: Dict[str, Any]) -> Tuple[int, Dict[str, str], bytes]:
+    """Split a function response dict into status, headers and raw body bytes"""
+    body = response.get('body') or ''
+    if response.get('isBase64Encoded'):
+        raw_body = base64.b64decode(body)
+    else:
+        raw_body = body.encode('utf-8') if isinstance(body, str) else body
+    headers = {name: str(value) for name, value in (response.get('headers') or {}).items()}
+    return int(response.get('statusCode', 200)), headers, raw_body
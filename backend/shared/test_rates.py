@@ -0,0 +1,127 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+from decimal import Decimal
+
+import rates
+from rates import ConvertedSum, RateCache, convert, rate_keys, read_rates_csv, unconverted_by_currency, validate_currency
+from runtime import SyncCursor, run_sync
+
+DAY = date(2026, 3, 2)
+RATES = {('USD', DAY): Decimal('90.5'), ('EUR', DAY): Decimal('98'), ('RUB', DAY): Decimal(1), ('KZT', DAY): None}
+
+
+class RateKeysTest(unittest.TestCase):
+    def test_both_currencies_of_a_foreign_group_need_a_rate(self):
+        keys = rate_keys([('USD', 'EUR', DAY), ('USD', 'RUB', DAY), ('RUB', 'RUB', DAY), ('USD', 'EUR', None)])
+        self.assertEqual(keys, {('USD', DAY), ('EUR', DAY), ('RUB', DAY)})
+
+
+class ConvertTest(unittest.TestCase):
+    def test_converts_through_rubles_rounding_half_up_to_cents(self):
+        self.assertEqual(convert(Decimal('10'), 'USD', 'RUB', DAY, RATES), Decimal('905.00'))
+        # 10.05 * 90.5 / 98 = 9.28086...
+        self.assertEqual(convert(Decimal('10.05'), 'USD', 'EUR', DAY, RATES), Decimal('9.28'))
+        # 0.49 / 98 = 0.005, rounded away from zero as ROUND() does
+        self.assertEqual(convert(Decimal('0.49'), 'RUB', 'EUR', DAY, RATES), Decimal('0.01'))
+
+    def test_same_currency_and_missing_amounts_pass_through(self):
+        self.assertEqual(convert(Decimal('12.34'), 'KZT', 'KZT', None, {}), Decimal('12.34'))
+        self.assertIsNone(convert(None, 'USD', 'RUB', DAY, RATES))
+
+    def test_none_without_a_rate_for_either_currency(self):
+        self.assertIsNone(convert(Decimal('10'), 'KZT', 'RUB', DAY, RATES))
+        self.assertIsNone(convert(Decimal('10'), 'RUB', 'GBP', DAY, RATES))
+
+
+class ConvertedSumTest(unittest.TestCase):
+    def test_keeps_amounts_it_cannot_convert_in_their_own_currency(self):
+        income, expenses = ConvertedSum(), ConvertedSum()
+        income.add(Decimal('10'), 'USD', 'RUB', DAY, RATES)
+        income.add(Decimal('100'), 'RUB', 'RUB', None, RATES)
+        income.add(None, 'USD', 'RUB', DAY, RATES)
+        expenses.add(Decimal('7'), 'KZT', 'RUB', DAY, RATES)
+        expenses.add(Decimal('3'), 'KZT', 'RUB', DAY, RATES)
+
+        self.assertEqual(income.total, Decimal('1005.00'))
+        self.assertEqual(income.unconverted, {})
+        self.assertEqual(expenses.total, 0)
+        self.assertEqual(unconverted_by_currency({'income': income, 'expenses': expenses}), {'KZT': {'expenses': 10.0}})
+
+
+class RateCacheTest(unittest.TestCase):
+    def test_rubles_are_never_looked_up(self):
+        cached, missing = RateCache(10, 60).get_many([('RUB', DAY), ('USD', DAY)])
+        self.assertEqual((cached, missing), ({('RUB', DAY): Decimal(1)}, [('USD', DAY)]))
+
+    def test_evicts_the_least_recently_used_pair(self):
+        cache = RateCache(2, 60)
+        cache.put_many([('USD', DAY, Decimal('90')), ('EUR', DAY, Decimal('98'))])
+        cache.get_many([('USD', DAY)])
+        cache.put_many([('KZT', DAY, None)])
+
+        cached, missing = cache.get_many([('USD', DAY), ('EUR', DAY), ('KZT', DAY)])
+        self.assertEqual(cached, {('USD', DAY): Decimal('90'), ('KZT', DAY): None})
+        self.assertEqual(missing, [('EUR', DAY)])
+
+    def test_expired_rates_are_looked_up_again(self):
+        cache = RateCache(10, 0)
+        cache.put_many([('USD', DAY, Decimal('90'))])
+        self.assertEqual(cache.get_many([('USD', DAY)]), ({}, [('USD', DAY)]))
+
+
+class CurrenciesCursor:
+    def __init__(self, currencies):
+        self.currencies = currencies
+        self.queries = 0
+
+    def execute(self, query, params=None, prepare=None):
+        self.queries += 1
+
+    def fetchall(self):
+        return [(currency,) for currency in self.currencies]
+
+
+class ValidateCurrencyTest(unittest.TestCase):
+    def setUp(self):
+        rates._known_currencies = {'RUB'}
+        rates._known_currencies_loaded_at = None
+
+    def test_accepts_currencies_with_rates_after_one_lookup(self):
+        cur = CurrenciesCursor(['USD', 'EUR'])
+        self.assertEqual(run_sync(validate_currency(SyncCursor(cur), ' usd ')), 'USD')
+        self.assertEqual(run_sync(validate_currency(SyncCursor(cur), 'EUR')), 'EUR')
+        self.assertEqual(cur.queries, 1)
+
+    def test_rejects_malformed_codes_without_a_query(self):
+        cur = CurrenciesCursor(['USD'])
+        for code in ('US', 'USDT', '12$', ''):
+            self.assertIsNone(run_sync(validate_currency(SyncCursor(cur), code)))
+        self.assertEqual(cur.queries, 0)
+
+    def test_unknown_codes_refresh_the_set_once_per_interval(self):
+        cur = CurrenciesCursor(['USD'])
+        self.assertIsNone(run_sync(validate_currency(SyncCursor(cur), 'GBP')))
+        self.assertIsNone(run_sync(validate_currency(SyncCursor(cur), 'JPY')))
+        self.assertEqual(cur.queries, 1)
+
+
+class ReadRatesCsvTest(unittest.TestCase):
+    def read(self, content):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as csv_file:
+            csv_file.write(content)
+        self.addCleanup(os.remove, csv_file.name)
+        return list(read_rates_csv(csv_file.name))
+
+    def test_divides_by_the_nominal_and_skips_rubles(self):
+        rows = self.read('date,currency,rate,nominal\n2026-03-02,usd,"90,5",\n2026-03-02,JPY,60.1,100\n2026-03-02,RUB,1,1\n')
+        self.assertEqual(rows, [('USD', DAY, Decimal('90.5')), ('JPY', DAY, Decimal('0.601'))])
+
+    def test_reports_the_line_of_an_invalid_row(self):
+        with self.assertRaisesRegex(ValueError, r':3: invalid row'):
+            self.read('date,currency,rate\n2026-03-02,USD,90.5\n2026-03-02,USD,-1\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
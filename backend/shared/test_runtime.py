@@ -0,0 +1,91 @@
+import asyncio
+import unittest
+from contextlib import contextmanager
+
+from runtime import SyncCursor, run_sync
+
+
+class RecordingCursor:
+    """psycopg-cursor stand-in that records statements and returns canned rows"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.statements = []
+        self.rowcount = len(self.rows)
+        self.connection = RecordingConnection(self)
+
+    def execute(self, query, params=None, prepare=None):
+        self.statements.append((query, params))
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+class RecordingConnection:
+    def __init__(self, cur):
+        self.cur = cur
+        self.pipelines = 0
+
+    def cursor(self):
+        return self.cur
+
+    @contextmanager
+    def pipeline(self):
+        self.pipelines += 1
+        yield
+
+
+class RunSyncTest(unittest.TestCase):
+    def test_returns_the_result_of_awaited_cursor_calls(self):
+        cur = RecordingCursor([(1, 'Food'), (2, 'Rent')])
+
+        async def handler(cur):
+            await cur.execute('SELECT id, name FROM categories WHERE user_id = %s', (7,))
+            first = await cur.fetchone()
+            return first, await cur.fetchall(), cur.rowcount
+
+        self.assertEqual(run_sync(handler(SyncCursor(cur))), ((1, 'Food'), [(1, 'Food'), (2, 'Rent')], 2))
+        self.assertEqual(cur.statements, [('SELECT id, name FROM categories WHERE user_id = %s', (7,))])
+
+    def test_runs_nested_coroutines_and_the_pipeline_context(self):
+        cur = RecordingCursor([(3,)])
+
+        async def insert(cur, value):
+            await cur.execute('INSERT INTO t VALUES (%s)', (value,))
+            return await cur.fetchone()
+
+        async def handler(cur):
+            async with cur.connection.pipeline():
+                return [await insert(cur.connection.cursor(), value) for value in (1, 2)]
+
+        self.assertEqual(run_sync(handler(SyncCursor(cur))), [(3,), (3,)])
+        self.assertEqual(cur.connection.pipelines, 1)
+        self.assertEqual(len(cur.statements), 2)
+
+    def test_propagates_handler_errors(self):
+        async def handler(cur):
+            await cur.execute('SELECT 1')
+            raise ValueError('Invalid amount')
+
+        with self.assertRaisesRegex(ValueError, 'Invalid amount'):
+            run_sync(handler(SyncCursor(RecordingCursor([]))))
+
+    def test_rejects_and_closes_a_coroutine_that_suspends(self):
+        finished = []
+
+        async def handler():
+            try:
+                await asyncio.sleep(0)
+            finally:
+                finished.append(True)
+
+        with self.assertRaisesRegex(RuntimeError, 'suspended'):
+            run_sync(handler())
+        self.assertEqual(finished, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
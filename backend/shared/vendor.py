@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+
+SHARED_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(SHARED_DIR)
+
+# Every function directory is deployed on its own, so each one carries a copy
+# of the shared modules it imports next to its index.py
+SHARED_MODULES = {
+    'runtime.py': ('transactions', 'goals', 'auth'),
+    'rates.py': ('transactions', 'goals'),
+}
+
+
+def stale_copies() -> list:
+    """Function-directory copies that differ from backend/shared"""
+    stale = []
+    for module, function_names in SHARED_MODULES.items():
+        with open(os.path.join(SHARED_DIR, module), 'rb') as source:
+            original = source.read()
+        for name in function_names:
+            path = os.path.join(BACKEND_DIR, name, module)
+            try:
+                with open(path, 'rb') as copy:
+                    if copy.read() == original:
+                        continue
+            except FileNotFoundError:
+                pass
+            stale.append((path, original))
+    return stale
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Copy backend/shared modules into every function directory')
+    parser.add_argument('--check', action='store_true', help='Only report stale copies; exit 1 if there are any')
+    args = parser.parse_args()
+
+    stale = stale_copies()
+    for path, original in stale:
+        if args.check:
+            print(f'stale: {os.path.relpath(path, BACKEND_DIR)}')
+            continue
+        with open(path, 'wb') as copy:
+            copy.write(original)
+        print(f'updated: {os.path.relpath(path, BACKEND_DIR)}')
+    if args.check and stale:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import psycopg
+
+# Robust z-score (Iglewicz & Hoaglin): 0.6745 * (x - median) / MAD; above 3.5 is an outlier
+OUTLIER_THRESHOLD = 3.5
+MIN_GROUP_SIZE = 8  # fewer amounts in a category give no meaningful median/MAD
+DUPLICATE_WINDOW_DAYS = 2
+BASELINE_DAYS = 365
+
+# One query returns, per (user, type, category, currency), the amounts of the
+# baseline window as parallel arrays ordered by id. In incremental mode only
+# groups that received rows since the user's last run are returned.
+GROUPS_SQL = """
+    WITH state AS (
+        SELECT u.user_id, COALESCE(s.last_transaction_id, 0) AS last_id
+        FROM unnest(%(user_ids)s::INTEGER[]) AS u(user_id)
+        LEFT JOIN detection_state s ON s.user_id = u.user_id
+    ), changed AS (
+        SELECT DISTINCT t.user_id, t.type, t.category_id, t.currency
+        FROM transactions t
+        JOIN state s ON s.user_id = t.user_id
+        WHERE t.transaction_date >= CURRENT_DATE - %(baseline_days)s::INTEGER
+            AND (t.id > s.last_id OR NOT %(incremental)s)
+    )
+    SELECT
+        t.user_id,
+        MAX(s.last_id),
+        array_agg(t.id ORDER BY t.id),
+        array_agg(t.amount::FLOAT8 ORDER BY t.id),
+        array_agg(t.transaction_date - DATE '2000-01-01' ORDER BY t.id)
+    FROM transactions t
+    JOIN changed c ON c.user_id = t.user_id AND c.type = t.type
+        AND c.category_id = t.category_id AND c.currency = t.currency
+    JOIN state s ON s.user_id = t.user_id
+    WHERE t.transaction_date >= CURRENT_DATE - %(baseline_days)s::INTEGER
+    GROUP BY t.user_id, t.type, t.category_id, t.currency
+"""
+
+SAVE_FLAGS_SQL = """
+    INSERT INTO transaction_flags (transaction_id, kind, user_id, score, details)
+    SELECT * FROM unnest(%(transaction_ids)s::INTEGER[], %(kinds)s::TEXT[], %(user_ids)s::INTEGER[],
+                         %(scores)s::FLOAT8[], %(details)s::JSONB[])
+    ON CONFLICT (transaction_id, kind) DO UPDATE SET
+        score = EXCLUDED.score,
+        details = EXCLUDED.details,
+        detected_at = CURRENT_TIMESTAMP
+"""
+
+SAVE_STATE_SQL = """
+    INSERT INTO detection_state (user_id, last_transaction_id)
+    SELECT * FROM unnest(%(user_ids)s::INTEGER[], %(last_ids)s::INTEGER[])
+    ON CONFLICT (user_id) DO UPDATE SET
+        last_transaction_id = GREATEST(detection_state.last_transaction_id, EXCLUDED.last_transaction_id),
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+def score_group(ids: List[int], amounts: List[float], days: List[int], last_id: int) -> List[Tuple[int, str, float, Dict[str, Any]]]:
+    '''
+    Business: Find outlier amounts and likely duplicates in one category's history
+    Args: ids, amounts, days - parallel arrays of the group's transactions
+          last_id - only transactions with a larger id are flagged
+    Returns: list of (transaction_id, kind, score, details)
+    '''
+    ids = np.asarray(ids, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    days = np.asarray(days, dtype=np.int64)
+    flags = []
+
+    if len(amounts) >= MIN_GROUP_SIZE:
+        median = float(np.median(amounts))
+        mad = float(np.median(np.abs(amounts - median)))
+        if mad > 0:
+            scores = 0.6745 * (amounts - median) / mad
+            hits = np.flatnonzero((ids > last_id) & (np.abs(scores) > OUTLIER_THRESHOLD))
+            for index in hits:
+                flags.append((int(ids[index]), 'outlier', round(float(scores[index]), 3), {
+                    'median': round(median, 2),
+                    'mad': round(mad, 2)
+                }))
+
+    # Same amount within the window: neighbours after sorting by (amount, day, id).
+    # The later-created row of a pair is the suspected duplicate.
+    order = np.lexsort((ids, days, amounts))
+    sorted_ids, sorted_amounts, sorted_days = ids[order], amounts[order], days[order]
+    day_gaps = np.diff(sorted_days)
+    pairs = np.flatnonzero((np.diff(sorted_amounts) == 0) & (day_gaps <= DUPLICATE_WINDOW_DAYS))
+    for index in pairs:
+        first, second = sorted_ids[index], sorted_ids[index + 1]
+        duplicate, original = (max(first, second), min(first, second))
+        if duplicate > last_id:
+            flags.append((int(duplicate), 'duplicate', float(day_gaps[index]), {
+                'duplicate_of': int(original),
+                'amount': float(sorted_amounts[index])
+            }))
+
+    return flags
+
+
+async def detect_anomalies(cur, user_ids: List[int], incremental: bool = True) -> Dict[str, int]:
+    '''
+    Business: Flag outliers and duplicates for a set of users with one read and set-based writes
+    Args: cur - AsyncCursor or SyncCursor of the caller's transaction
+          user_ids - users to scan
+          incremental - only evaluate rows added since each user's last run
+    Returns: dict with counts of scanned groups, outliers and duplicates
+    '''
+    if not incremental:
+        await cur.execute("DELETE FROM transaction_flags WHERE user_id = ANY(%s)", (user_ids,))
+
+    await cur.execute(GROUPS_SQL, {
+        'user_ids': user_ids,
+        'incremental': incremental,
+        'baseline_days': BASELINE_DAYS
+    }, prepare=True)
+    groups = await cur.fetchall()
+
+    # Keyed by (transaction_id, kind): a row can pair up with both neighbours,
+    # and one upsert statement must not touch the same row twice
+    found: Dict[Tuple[int, str], Tuple[int, float, str]] = {}
+    last_ids: Dict[int, int] = {}
+    for user_id, last_id, ids, amounts, days in groups:
+        last_ids[user_id] = max(last_ids.get(user_id, 0), max(ids))
+        for transaction_id, kind, score, details in score_group(ids, amounts, days, last_id if incremental else 0):
+            found[(transaction_id, kind)] = (user_id, score, json.dumps(details))
+
+    flags = {
+        'transaction_ids': [transaction_id for transaction_id, _ in found],
+        'kinds': [kind for _, kind in found],
+        'user_ids': [user_id for user_id, _, _ in found.values()],
+        'scores': [score for _, score, _ in found.values()],
+        'details': [details for _, _, details in found.values()]
+    }
+
+    if flags['transaction_ids']:
+        await cur.execute(SAVE_FLAGS_SQL, flags, prepare=True)
+    if last_ids:
+        await cur.execute(SAVE_STATE_SQL, {
+            'user_ids': list(last_ids),
+            'last_ids': list(last_ids.values())
+        }, prepare=True)
+
+    return {
+        'groups': len(groups),
+        'outliers': flags['kinds'].count('outlier'),
+        'duplicates': flags['kinds'].count('duplicate')
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Batch anomaly and duplicate detection for all users')
+    parser.add_argument('--full', action='store_true', help='re-evaluate every row, not only new ones')
+    parser.add_argument('--batch-size', type=int, default=500, help='users per transaction')
+    args = parser.parse_args()
+
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        raise SystemExit('DATABASE_URL is not set')
+
+    from runtime import SyncCursor, run_sync
+
+    started = time.perf_counter()
+    totals = {'users': 0, 'groups': 0, 'outliers': 0, 'duplicates': 0}
+    after_id = 0
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            while True:
+                cur.execute("SELECT id FROM users WHERE id > %s ORDER BY id LIMIT %s", (after_id, args.batch_size))
+                user_ids = [row[0] for row in cur.fetchall()]
+                if not user_ids:
+                    break
+
+                result = run_sync(detect_anomalies(SyncCursor(cur), user_ids, incremental=not args.full))
+                conn.commit()
+
+                totals['users'] += len(user_ids)
+                for key, value in result.items():
+                    totals[key] += value
+                after_id = user_ids[-1]
+
+    totals['seconds'] = round(time.perf_counter() - started, 3)
+    print(json.dumps(totals, indent=2))
+
+
+if __name__ == '__main__':
+    main()
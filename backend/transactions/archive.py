@@ -0,0 +1,329 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import re
+from datetime import date
+from typing import Dict, Any, List
+
+import psycopg
+from psycopg import sql
+
+PARTITION_NAME_RE = re.compile(r'^transactions_y(\d{4})$')
+
+# Partitions overlapping the last HOT_MONTHS stay live: the monthly stats
+# window reads raw rows only and relies on never touching archived data
+HOT_MONTHS = 6
+
+
+def maintain_partitions(conn, years_ahead: int = 1) -> Dict[str, Any]:
+    '''
+    Business: Create yearly partitions up to years_ahead ahead and for every year stuck in the default partition
+    Args: conn - psycopg connection
+          years_ahead - how many future years to pre-create
+    Returns: dict with created (partitions) and default_rows (rows left in transactions_default)
+
+    Back-dated rows of a year without a partition land in transactions_default;
+    creating that year's partition moves them out before it is attached
+    (create_transaction_partition). Rows of archived years cannot get a
+    partition again and are reported in default_rows.
+    '''
+    today = date.today()
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT ensure_transaction_partitions(%s, %s)",
+                (today, date(today.year + years_ahead, 1, 1))
+            )
+            created = cur.fetchone()[0]
+            cur.execute("SELECT DISTINCT EXTRACT(YEAR FROM transaction_date)::INTEGER FROM transactions_default")
+            for (year,) in cur.fetchall():
+                cur.execute("SELECT ensure_transaction_partitions(%s, %s)", (date(year, 1, 1), date(year, 1, 1)))
+                created += cur.fetchone()[0]
+            cur.execute("SELECT COUNT(*) FROM transactions_default")
+            return {'created': created, 'default_rows': cur.fetchone()[0]}
+
+
+def list_partitions(conn) -> List[Dict[str, Any]]:
+    """List yearly transaction partitions with their date ranges"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'transactions'::regclass
+            ORDER BY c.relname
+        """)
+        names = [row[0] for row in cur.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            year = int(match.group(1))
+            partitions.append({
+                'name': name,
+                'range_start': date(year, 1, 1),
+                'range_end': date(year + 1, 1, 1)
+            })
+    return partitions
+
+
+def hot_window_start(today: date) -> date:
+    """First day of the oldest month that must stay in live partitions"""
+    month_index = today.year * 12 + today.month - 1 - HOT_MONTHS
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def archive_partition(conn, partition: Dict[str, Any], archive_dir: str) -> Dict[str, Any]:
+    '''
+    Business: Export, roll up, detach and drop one yearly partition
+    Args: conn - psycopg connection in autocommit mode
+          partition - dict with name, range_start, range_end
+          archive_dir - directory for gzip-compressed CSV exports
+    Returns: dict with partition name, row count and archive path
+
+    The partition is frozen first (writes to its year fail until it is gone),
+    then exported from a REPEATABLE READ snapshot while still attached, so the
+    export takes no lock on transactions. Rollups, DETACH and DROP commit
+    together in a final short transaction: stats switch from the raw rows to the
+    rollups atomically, and the parent is locked only from DETACH to commit.
+    If the export fails the freeze is lifted; a run that died midway leaves it
+    in place until archive is run again or the trigger is dropped.
+    '''
+    name = partition['name']
+    archive_path = os.path.join(archive_dir, f'{name}.csv.gz')
+    partial_path = archive_path + '.partial'
+    table = sql.Identifier(name)
+    freeze_trigger = sql.Identifier(f'{name}_archiving')
+
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP TRIGGER IF EXISTS {} ON {}").format(freeze_trigger, table))
+            cur.execute(sql.SQL("""
+                CREATE TRIGGER {} BEFORE INSERT OR UPDATE OR DELETE ON {}
+                FOR EACH ROW EXECUTE FUNCTION reject_archiving_partition_write()
+            """).format(freeze_trigger, table))
+
+    try:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(table))
+                row_count = cur.fetchone()[0]
+
+                with gzip.open(partial_path, 'wb') as archive_file:
+                    with cur.copy(sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER true)").format(table)) as copy:
+                        for data in copy:
+                            archive_file.write(data)
+
+        with conn.transaction():
+            with conn.cursor() as cur:
+                # Monthly rollups keep stats and category totals complete after the drop;
+                # computed before DETACH, so the scan runs without the parent lock
+                cur.execute(sql.SQL("""
+                    INSERT INTO transaction_archive_rollups (user_id, month, type, category_id, currency, total_amount, transaction_count)
+                    SELECT user_id, DATE_TRUNC('month', transaction_date)::DATE, type, category_id, currency, SUM(amount), COUNT(*)
+                    FROM {}
+                    GROUP BY user_id, DATE_TRUNC('month', transaction_date), type, category_id, currency
+                    ON CONFLICT (user_id, month, type, category_id, currency) DO UPDATE SET
+                        total_amount = transaction_archive_rollups.total_amount + EXCLUDED.total_amount,
+                        transaction_count = transaction_archive_rollups.transaction_count + EXCLUDED.transaction_count
+                """).format(table))
+
+                cur.execute(sql.SQL("ALTER TABLE transactions DETACH PARTITION {}").format(table))
+
+                cur.execute("""
+                    INSERT INTO transaction_archives (partition_name, range_start, range_end, row_count, archive_path)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (name, partition['range_start'], partition['range_end'], row_count, archive_path))
+
+                cur.execute(sql.SQL("DROP TABLE {}").format(table))
+    except Exception:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP TRIGGER IF EXISTS {} ON {}").format(freeze_trigger, table))
+        raise
+
+    os.replace(partial_path, archive_path)
+    return {'partition': name, 'rows': row_count, 'archive_path': archive_path}
+
+
+def archive_partitions(conn, before_year: int, archive_dir: str) -> List[Dict[str, Any]]:
+    '''
+    Business: Archive every yearly partition that ends before before_year
+    Args: conn - psycopg connection
+          before_year - partitions for years strictly less than this are archived
+          archive_dir - directory for gzip-compressed CSV exports
+    Returns: list of archived partition summaries
+    '''
+    cutoff = date(before_year, 1, 1)
+    if cutoff > hot_window_start(date.today()):
+        raise ValueError(f'Partitions overlapping the last {HOT_MONTHS} months must stay live')
+
+    os.makedirs(archive_dir, exist_ok=True)
+    results = []
+    for partition in list_partitions(conn):
+        if partition['range_end'] <= cutoff:
+            results.append(archive_partition(conn, partition, archive_dir))
+    return results
+
+
+# Archives holding rows of users whose account deletion or reset finished after
+# the archive was written or last redacted
+REDACTION_PENDING_SQL = """
+    SELECT a.partition_name, a.archive_path, ARRAY(
+        SELECT j.user_id FROM account_purge_jobs j
+        WHERE j.status = 'done' AND j.finished_at > COALESCE(a.redacted_at, a.archived_at)
+        ORDER BY j.user_id
+    )
+    FROM transaction_archives a
+    ORDER BY a.partition_name
+"""
+
+
+def redact_archive(conn, partition_name: str, archive_path: str, user_ids: List[int]) -> int:
+    '''
+    Business: Remove the rows of purged users from one archived CSV export
+    Args: conn - psycopg connection
+          partition_name, archive_path - transaction_archives row
+          user_ids - users whose rows are removed
+    Returns: number of removed rows
+
+    The export is loaded into a temporary table of text columns named after its
+    header, so NULLs, empty strings and quoting survive the round-trip exactly.
+    '''
+    partial_path = archive_path + '.partial'
+    with gzip.open(archive_path, 'rt', encoding='utf-8', newline='') as archive_file:
+        header = next(csv.reader(io.StringIO(archive_file.readline())))
+
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("CREATE TEMP TABLE archive_rows ({}) ON COMMIT DROP").format(
+                sql.SQL(', ').join(sql.SQL('{} TEXT').format(sql.Identifier(column)) for column in header)
+            ))
+            with gzip.open(archive_path, 'rb') as archive_file:
+                with cur.copy("COPY archive_rows FROM STDIN WITH (FORMAT csv, HEADER true)") as copy:
+                    while True:
+                        data = archive_file.read(1 << 20)
+                        if not data:
+                            break
+                        copy.write(data)
+
+            cur.execute("DELETE FROM archive_rows WHERE user_id::INTEGER = ANY(%s)", (user_ids,))
+            removed = cur.rowcount
+            if removed:
+                with gzip.open(partial_path, 'wb') as archive_file:
+                    with cur.copy("COPY archive_rows TO STDOUT WITH (FORMAT csv, HEADER true)") as copy:
+                        for data in copy:
+                            archive_file.write(data)
+
+            cur.execute("""
+                UPDATE transaction_archives
+                SET row_count = row_count - %s, redacted_at = CURRENT_TIMESTAMP
+                WHERE partition_name = %s
+            """, (removed, partition_name))
+            # Replaced before the commit: if the commit fails, the next run finds
+            # nothing left to remove and only records the redaction
+            if removed:
+                os.replace(partial_path, archive_path)
+    return removed
+
+
+def redact_archives(conn) -> List[Dict[str, Any]]:
+    '''
+    Business: Remove rows of deleted and reset accounts (auth purge.py) from every archive
+    Args: conn - psycopg connection in autocommit mode
+    Returns: list of redacted archives with removed row counts
+    '''
+    with conn.cursor() as cur:
+        cur.execute(REDACTION_PENDING_SQL)
+        pending = cur.fetchall()
+
+    results = []
+    for partition_name, archive_path, user_ids in pending:
+        if user_ids:
+            removed = redact_archive(conn, partition_name, archive_path, user_ids)
+            results.append({'partition': partition_name, 'users': len(user_ids), 'removed_rows': removed})
+    return results
+
+
+def collect_scanned_relations(plan: Dict[str, Any], relations: List[str]) -> List[str]:
+    """Walk EXPLAIN JSON plan and collect relation names that were actually scanned"""
+    if 'Relation Name' in plan and plan.get('Actual Loops', 1) > 0:
+        relations.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        collect_scanned_relations(child, relations)
+    return relations
+
+
+def check_partition_pruning(conn, user_id: int) -> Dict[str, List[str]]:
+    '''
+    Business: Report which partitions the list and stats queries actually scan
+    Args: conn - psycopg connection
+          user_id - user whose queries are explained
+    Returns: dict query name -> list of scanned partitions
+    '''
+    today = date.today()
+    queries = {
+        'list_current_month': ("""
+            SELECT t.id FROM transactions t
+            WHERE t.user_id = %s AND t.transaction_date >= %s AND t.transaction_date <= %s
+            ORDER BY t.transaction_date DESC, t.created_at DESC LIMIT 50
+        """, (user_id, today.replace(day=1), today)),
+        'monthly_stats': ("""
+            SELECT DATE_TRUNC('month', transaction_date), type, SUM(amount)
+            FROM transactions
+            WHERE user_id = %s AND transaction_date >= CURRENT_DATE - INTERVAL '6 months'
+            GROUP BY 1, 2
+        """, (user_id,)),
+    }
+
+    report = {}
+    with conn.cursor() as cur:
+        for name, (query, params) in queries.items():
+            cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, params)
+            plan = cur.fetchone()[0][0]['Plan']
+            report[name] = sorted(set(collect_scanned_relations(plan, [])))
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Transaction partition maintenance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    maintain_parser = subparsers.add_parser('maintain', help='Pre-create yearly partitions, empty the default partition')
+    maintain_parser.add_argument('--years-ahead', type=int, default=1)
+
+    archive_parser = subparsers.add_parser('archive', help='Archive partitions before a year')
+    archive_parser.add_argument('--before-year', type=int, required=True)
+    archive_parser.add_argument('--dir', default='transaction_archives')
+
+    subparsers.add_parser('redact', help='Remove rows of deleted and reset accounts from archives')
+
+    explain_parser = subparsers.add_parser('explain', help='Verify partition pruning')
+    explain_parser.add_argument('--user-id', type=int, required=True)
+
+    args = parser.parse_args()
+
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        raise SystemExit('DATABASE_URL is not set')
+
+    # Autocommit: each step of archiving a partition is its own transaction
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        if args.command == 'maintain':
+            result = maintain_partitions(conn, args.years_ahead)
+        elif args.command == 'archive':
+            result = {'archived': archive_partitions(conn, args.before_year, args.dir)}
+        elif args.command == 'redact':
+            result = {'redacted': redact_archives(conn)}
+        else:
+            result = check_partition_pruning(conn, args.user_id)
+
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,22 @@
 import json
 import os
-import psycopg
+import threading
+import time
 from datetime import datetime, date
-from decimal import Decimal
-from typing import Dict, Any, List
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal, InvalidOperation
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+
+from rates import CENT, RATES_SQL, ConvertedSum, RateCache, rate_keys, unconverted_by_currency, validate_currency
+from runtime import UserFunction, decimal_default, to_columns
+# The servers and benchmarks reach the process's pools and the sync path through the function module
+from runtime import SyncCursor, close_async_pools, get_async_pool, get_pool, get_read_pool, run_sync  # noqa: F401
+
+# psycopg is imported where the database is first touched: OPTIONS preflights
+# and requests rejected before any query never pay for it on a cold start
+if TYPE_CHECKING:
+    from psycopg import sql
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -12,155 +25,80 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context - object with attributes: request_id, function_name, function_version, memory_limit_in_mb
     Returns: HTTP response dict
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    # Handle CORS OPTIONS request
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-User-ID',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    # Get database connection string
-    dsn = os.environ.get('DATABASE_URL')
-    if not dsn:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'Database connection not configured'})
-        }
-    
-    # Get user ID from headers
-    headers = event.get('headers', {})
-    user_id = headers.get('X-User-ID') or headers.get('x-user-id')
-    if not user_id:
-        return {
-            'statusCode': 401,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'User ID required in X-User-ID header'})
-        }
-    
-    try:
-        user_id = int(user_id)
-    except ValueError:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'Invalid user ID'})
-        }
-    
-    try:
-        with psycopg.connect(dsn) as conn:
-            with conn.cursor() as cur:
-                if method == 'GET':
-                    return handle_get_transactions(cur, user_id, event.get('queryStringParameters', {}))
-                elif method == 'POST':
-                    body_data = json.loads(event.get('body', '{}'))
-                    return handle_create_transaction(cur, user_id, body_data)
-                elif method == 'PUT':
-                    body_data = json.loads(event.get('body', '{}'))
-                    transaction_id = body_data.get('id')
-                    return handle_update_transaction(cur, user_id, transaction_id, body_data)
-                elif method == 'DELETE':
-                    query_params = event.get('queryStringParameters', {})
-                    transaction_id = query_params.get('id')
-                    return handle_delete_transaction(cur, user_id, transaction_id)
-                else:
-                    return {
-                        'statusCode': 405,
-                        'headers': {
-                            'Access-Control-Allow-Origin': '*',
-                            'Content-Type': 'application/json'
-                        },
-                        'body': json.dumps({'error': 'Method not allowed'})
-                    }
-    
-    except psycopg.Error as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': f'Database error: {str(e)}'})
-        }
-    except json.JSONDecodeError:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'Invalid JSON'})
-        }
-    except Exception as e:
+    return api.handler(event)
+
+async def async_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Same as handler, served from a shared AsyncConnectionPool for ASGI-style servers
+    Args: event - dict with httpMethod, body, queryStringParameters
+          context - request context object (may be None)
+    Returns: HTTP response dict
+    '''
+    return await api.async_handler(event)
+
+async def dispatch_request(cur, method: str, user_id: int, event: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the handler for the HTTP method"""
+    if method == 'GET':
+        return await handle_get_transactions(cur, user_id, event.get('queryStringParameters') or {})
+    elif method == 'POST':
+        body_data = json.loads(event.get('body') or '{}')
+        return await handle_create_transaction(cur, user_id, body_data)
+    elif method == 'PUT':
+        body_data = json.loads(event.get('body') or '{}')
+        if body_data.get('action') in ['rename_category', 'merge_categories']:
+            return await handle_update_category(cur, user_id, body_data)
+        if body_data.get('action') == 'detect_anomalies':
+            return await handle_detect_anomalies(cur, user_id, body_data)
+        transaction_id = body_data.get('id')
+        return await handle_update_transaction(cur, user_id, transaction_id, body_data)
+    elif method == 'DELETE':
+        query_params = event.get('queryStringParameters') or {}
+        transaction_id = query_params.get('id')
+        return await handle_delete_transaction(cur, user_id, transaction_id)
+    else:
         return {
-            'statusCode': 500,
+            'statusCode': 405,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({'error': f'Server error: {str(e)}'})
+            'body': json.dumps({'error': 'Method not allowed'})
         }
 
-def decimal_default(obj):
-    """JSON serializer for Decimal objects"""
-    if isinstance(obj, Decimal):
-        return float(obj)
-    if isinstance(obj, date):
-        return obj.isoformat()
-    raise TypeError
+TRANSACTION_FIELDS = ('id', 'type', 'amount', 'currency', 'category', 'category_id', 'description', 'date', 'created_at')
 
-def handle_get_transactions(cur, user_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+async def handle_get_transactions(cur, user_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
     """Get transactions for user with optional filtering"""
     action = params.get('action', 'list')
     
     if action == 'stats':
-        return get_user_statistics(cur, user_id)
+        return await get_user_statistics(cur, user_id)
     elif action == 'categories':
-        return get_categories_summary(cur, user_id)
+        return await get_categories_summary(cur, user_id)
+    elif action == 'categories_list':
+        return await get_categories_list(cur, user_id, params)
+    elif action == 'anomalies':
+        return await get_anomalies(cur, user_id, params)
     else:
         # Get transactions list
         limit = min(int(params.get('limit', 50)), 100)  # Max 100 transactions
         offset = int(params.get('offset', 0))
-        transaction_type = params.get('type')  # 'income' or 'expense'
-        category = params.get('category')
-        
-        query = """
-            SELECT id, type, amount, category, description, transaction_date, created_at 
-            FROM transactions 
-            WHERE user_id = %s
-        """
-        query_params = [user_id]
-        
-        if transaction_type:
-            query += " AND type = %s"
-            query_params.append(transaction_type)
         
-        if category:
-            query += " AND category = %s"
-            query_params.append(category)
-        
-        query += " ORDER BY transaction_date DESC, created_at DESC LIMIT %s OFFSET %s"
-        query_params.extend([limit, offset])
+        try:
+            filter_shape, filter_values = parse_transaction_filters(params)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': str(e)})
+            }
         
-        cur.execute(query, query_params)
-        transactions = cur.fetchall()
+        query_params = {**filter_values, 'user_id': user_id, 'limit': limit, 'offset': offset}
+        await cur.execute(build_transactions_list_query(filter_shape), query_params, prepare=True)
+        transactions = await cur.fetchall()
         
         result = []
         for t in transactions:
@@ -168,70 +106,295 @@ def handle_get_transactions(cur, user_id: int, params: Dict[str, Any]) -> Dict[s
                 'id': t[0],
                 'type': t[1],
                 'amount': float(t[2]),
+                'currency': t[8],
                 'category': t[3],
+                'category_id': t[7],
                 'description': t[4],
                 'date': t[5].isoformat(),
                 'created_at': t[6].isoformat()
             })
         
+        payload = {'total': len(result), 'limit': limit, 'offset': offset}
+        if params.get('format') == 'columnar':
+            payload['columns'] = to_columns(result, TRANSACTION_FIELDS)
+        else:
+            payload['transactions'] = result
+        
         return {
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({
-                'transactions': result,
-                'total': len(result),
-                'limit': limit,
-                'offset': offset
-            })
+            'body': json.dumps(payload, separators=(',', ':'))
         }
 
-def get_user_statistics(cur, user_id: int) -> Dict[str, Any]:
-    """Get user financial statistics"""
-    # Get income and expense totals
-    cur.execute("""
-        SELECT 
-            type,
-            SUM(amount) as total_amount,
-            COUNT(*) as transaction_count
-        FROM transactions 
-        WHERE user_id = %s 
-        GROUP BY type
-    """, (user_id,))
-    
-    stats = {'total_income': 0, 'total_expenses': 0, 'income_count': 0, 'expense_count': 0}
-    for row in cur.fetchall():
-        if row[0] == 'income':
-            stats['total_income'] = float(row[1])
-            stats['income_count'] = row[2]
-        elif row[0] == 'expense':
-            stats['total_expenses'] = float(row[1])
-            stats['expense_count'] = row[2]
+# Sargable list predicates in a fixed order; each is matched by an index on
+# (user_id, <column>) so filters never force a scan of the user's history
+# (type: idx_transactions_user_type_date, in the list's date order).
+# Category names are resolved to ids (directly or through an alias) in a subquery.
+TRANSACTION_LIST_FILTERS = (
+    ('type', 't.type = %(type)s'),
+    ('category_ids', 't.category_id = ANY(%(category_ids)s)'),
+    ('categories', """t.category_id IN (
+        SELECT id FROM categories WHERE user_id = %(user_id)s AND normalized_name = ANY(%(categories)s)
+        UNION ALL
+        SELECT category_id FROM category_aliases WHERE user_id = %(user_id)s AND alias = ANY(%(categories)s)
+    )"""),
+    ('min_amount', 't.amount >= %(min_amount)s'),
+    ('max_amount', 't.amount <= %(max_amount)s'),
+    ('date_from', 't.transaction_date >= %(date_from)s'),
+    ('date_to', 't.transaction_date <= %(date_to)s'),
+)
+
+# Amounts are DECIMAL(15,2): amount filters at or beyond this are rejected
+AMOUNT_FILTER_LIMIT = Decimal('1E13')
+
+def parse_transaction_filters(params: Dict[str, Any]) -> Tuple[Tuple[str, ...], Dict[str, Any]]:
+    """Parse list filters into a filter shape and its named query parameters"""
+    parsed: Dict[str, Any] = {}
+    
+    transaction_type = params.get('type')  # 'income' or 'expense'
+    if transaction_type:
+        if transaction_type not in ['income', 'expense']:
+            raise ValueError('Type must be "income" or "expense"')
+        parsed['type'] = transaction_type
+    
+    # Both ?category=Food and ?categories=Food,Transport are accepted
+    categories = [normalize_category_name(c) for c in params.get('categories', '').split(',') if c.strip()]
+    if params.get('category', '').strip():
+        categories.append(normalize_category_name(params['category']))
+    if categories:
+        parsed['categories'] = list(dict.fromkeys(categories))
+    
+    # ?category_id=3 and ?category_ids=3,7 filter by dictionary id
+    category_ids = [c for c in params.get('category_ids', '').split(',') if c.strip()]
+    if params.get('category_id'):
+        category_ids.append(params['category_id'])
+    if category_ids:
+        try:
+            parsed['category_ids'] = list(dict.fromkeys(int(c) for c in category_ids))
+        except ValueError:
+            raise ValueError('Invalid category_id')
+    
+    for name, rounding in (('min_amount', ROUND_CEILING), ('max_amount', ROUND_FLOOR)):
+        if params.get(name):
+            try:
+                amount = Decimal(params[name])
+            except InvalidOperation:
+                raise ValueError(f'Invalid {name}')
+            # NaN and Infinity do not compare
+            if not amount.is_finite() or abs(amount) >= AMOUNT_FILTER_LIMIT:
+                raise ValueError(f'Invalid {name}')
+            # Amounts are whole cents, so rounding the bounds inwards keeps the same rows
+            parsed[name] = amount.quantize(CENT, rounding=rounding)
+    
+    for name in ('date_from', 'date_to'):
+        if params.get(name):
+            try:
+                parsed[name] = date.fromisoformat(params[name])
+            except ValueError:
+                raise ValueError(f'Invalid {name}, expected YYYY-MM-DD')
+    
+    if 'min_amount' in parsed and 'max_amount' in parsed and parsed['min_amount'] > parsed['max_amount']:
+        raise ValueError('min_amount must not exceed max_amount')
+    if 'date_from' in parsed and 'date_to' in parsed and parsed['date_from'] > parsed['date_to']:
+        raise ValueError('date_from must not be after date_to')
+    
+    shape = tuple(name for name, _ in TRANSACTION_LIST_FILTERS if name in parsed)
+    return shape, parsed
+
+@lru_cache(maxsize=64)
+def build_transactions_list_query(filter_shape: Tuple[str, ...]) -> 'sql.Composed':
+    """Build the list query for a filter shape; identical shapes share one statement and prepared plan"""
+    from psycopg import sql
+    predicates = [sql.SQL('t.user_id = %(user_id)s')]
+    predicates.extend(sql.SQL(clause) for name, clause in TRANSACTION_LIST_FILTERS if name in filter_shape)
+    
+    return sql.SQL("""
+        SELECT t.id, t.type, t.amount, c.name, t.description, t.transaction_date, t.created_at, t.category_id, t.currency
+        FROM transactions t
+        JOIN categories c ON c.id = t.category_id
+        WHERE {where}
+        ORDER BY t.transaction_date DESC, t.created_at DESC LIMIT %(limit)s OFFSET %(offset)s
+    """).format(where=sql.SQL(' AND ').join(predicates))
+
+def normalize_category_name(name: str) -> str:
+    """Normalize category name for matching: trimmed, single-spaced, lowercase"""
+    return ' '.join(name.split()).lower()
+
+# Gate for resolving a category for an existing transaction: the row is locked,
+# so it cannot disappear between this statement and the UPDATE that uses the id
+CATEGORY_TARGET_GATE = """
+    AND EXISTS (
+        SELECT 1 FROM transactions
+        WHERE id = %(transaction_id)s AND user_id = %(user_id)s
+        FOR UPDATE
+    )"""
+
+async def resolve_category(cur, user_id: int, name: str, transaction_id: Any = None) -> Optional[Tuple[int, str]]:
+    """Resolve category name to (id, canonical name), creating the category on first use"""
+    # With transaction_id the category is only created if that transaction of
+    # the user exists; None means it does not, and nothing was written
+    normalized = normalize_category_name(name)
+    query_params = {'user_id': user_id, 'name': ' '.join(name.split()), 'normalized': normalized,
+                    'transaction_id': transaction_id}
+    gate = CATEGORY_TARGET_GATE if transaction_id is not None else ''
+    
+    await cur.execute("""
+        WITH alias AS (
+            SELECT c.id, c.name
+            FROM category_aliases a
+            JOIN categories c ON c.id = a.category_id
+            WHERE a.user_id = %(user_id)s AND a.alias = %(normalized)s
+        ), existing AS (
+            SELECT id, name FROM categories
+            WHERE user_id = %(user_id)s AND normalized_name = %(normalized)s
+        ), inserted AS (
+            INSERT INTO categories (user_id, name, normalized_name)
+            SELECT %(user_id)s, %(name)s, %(normalized)s
+            WHERE NOT EXISTS (SELECT 1 FROM alias) AND NOT EXISTS (SELECT 1 FROM existing)""" + gate + """
+            ON CONFLICT (user_id, normalized_name) DO NOTHING
+            RETURNING id, name
+        )
+        SELECT id, name FROM alias
+        UNION ALL SELECT id, name FROM existing
+        UNION ALL SELECT id, name FROM inserted
+        LIMIT 1
+    """, query_params, prepare=True)
+    row = await cur.fetchone()
+    
+    if not row:
+        # A concurrent request created the same category after our snapshot
+        # was taken, or the gated transaction does not exist
+        await cur.execute(
+            "SELECT id, name FROM categories WHERE user_id = %(user_id)s AND normalized_name = %(normalized)s",
+            query_params
+        )
+        row = await cur.fetchone()
+    
+    return (row[0], row[1]) if row else None
+
+async def get_owned_category(cur, user_id: int, category_id: Any):
+    """Get (id, name) of user's category by id, or None"""
+    try:
+        category_id = int(category_id)
+    except (TypeError, ValueError):
+        return None
+    
+    await cur.execute("SELECT id, name FROM categories WHERE id = %s AND user_id = %s", (category_id, user_id), prepare=True)
+    return await cur.fetchone()
+
+# Exchange rates for the aggregations below, cached per instance. The queries
+# return amounts summed per currency and rate date, unconverted; rows already
+# in the base currency collapse into one group per type that needs no rate.
+# The foreign-currency groups are converted with rates from _rate_cache, so a
+# warm instance sends no rate lookup at all and a cold one sends one query for
+# all missing (currency, date) pairs.
+RATE_CACHE_SECONDS = float(os.environ.get('RATE_CACHE_SECONDS', 300))
+RATE_CACHE_MAX_ENTRIES = 100000
+_rate_cache = RateCache(RATE_CACHE_MAX_ENTRIES, RATE_CACHE_SECONDS)
+
+async def load_rates(cur, groups) -> Dict[Tuple[str, date], Optional[Decimal]]:
+    """Rates for (currency, base_currency, rate_date) groups; cache misses cost one query"""
+    rates, missing = _rate_cache.get_many(rate_keys(groups))
+    if missing:
+        await cur.execute(RATES_SQL, (
+            [currency for currency, _ in missing],
+            [rate_date for _, rate_date in missing]
+        ), prepare=True)
+        rates.update(_rate_cache.put_many(await cur.fetchall()))
+    return rates
+
+async def get_user_statistics(cur, user_id: int) -> Dict[str, Any]:
+    """Get user financial statistics in the user's base currency"""
+    # The queries are independent: send them in one pipeline (a single round-trip)
+    # as server-side prepared statements
+    conn = cur.connection
+    async with conn.pipeline():
+        totals_cur = conn.cursor()
+        monthly_cur = conn.cursor()
+        currency_cur = conn.cursor()
+        
+        # Income and expense totals, including rollups of archived partitions,
+        # per currency and rate date (see RATE_CACHE_SECONDS)
+        await totals_cur.execute("""
+            SELECT 
+                type, currency, base_currency, rate_date,
+                SUM(total_amount) as total_amount,
+                SUM(transaction_count)::BIGINT as transaction_count
+            FROM (
+                SELECT t.type, t.currency, u.base_currency,
+                    CASE WHEN t.currency = u.base_currency THEN NULL ELSE t.transaction_date END as rate_date,
+                    SUM(t.amount) as total_amount, COUNT(*) as transaction_count
+                FROM transactions t
+                JOIN users u ON u.id = t.user_id
+                WHERE t.user_id = %(user_id)s 
+                GROUP BY 1, 2, 3, 4
+                UNION ALL
+                SELECT r.type, r.currency, u.base_currency,
+                    CASE WHEN r.currency = u.base_currency THEN NULL ELSE r.month END,
+                    SUM(r.total_amount), SUM(r.transaction_count)
+                FROM transaction_archive_rollups r
+                JOIN users u ON u.id = r.user_id
+                WHERE r.user_id = %(user_id)s
+                GROUP BY 1, 2, 3, 4
+            ) totals
+            GROUP BY 1, 2, 3, 4
+        """, {'user_id': user_id}, prepare=True)
+        
+        # Monthly statistics (last 6 months); archival never reaches into this
+        # window, so only live partitions are scanned and the rest are pruned
+        await monthly_cur.execute("""
+            SELECT DATE_TRUNC('month', t.transaction_date) as month, t.type, t.currency, u.base_currency,
+                CASE WHEN t.currency = u.base_currency THEN NULL ELSE t.transaction_date END as rate_date,
+                SUM(t.amount) as amount
+            FROM transactions t
+            JOIN users u ON u.id = t.user_id
+            WHERE t.user_id = %s 
+                AND t.transaction_date >= CURRENT_DATE - INTERVAL '6 months'
+            GROUP BY 1, 2, 3, 4, 5
+        """, (user_id,), prepare=True)
+        
+        await currency_cur.execute("SELECT base_currency FROM users WHERE id = %s", (user_id,), prepare=True)
+    
+    totals = await totals_cur.fetchall()
+    monthly = await monthly_cur.fetchall()
+    rates = await load_rates(cur, [row[1:4] for row in totals] + [row[2:5] for row in monthly])
+    
+    # Amounts in a currency without a rate for their date stay out of the
+    # totals and are reported, in their own currency, under 'unconverted'
+    amounts = {'income': ConvertedSum(), 'expenses': ConvertedSum()}
+    counts: Dict[str, int] = {}
+    for transaction_type, currency, base, rate_date, amount, count in totals:
+        amounts['expenses' if transaction_type == 'expense' else 'income'].add(amount, currency, base, rate_date, rates)
+        counts[transaction_type] = counts.get(transaction_type, 0) + count
+    
+    stats = {
+        'total_income': float(amounts['income'].total),
+        'total_expenses': float(amounts['expenses'].total),
+        'income_count': counts.get('income', 0),
+        'expense_count': counts.get('expense', 0),
+        'unconverted': unconverted_by_currency(amounts)
+    }
     
     stats['balance'] = stats['total_income'] - stats['total_expenses']
+    base_currency = await currency_cur.fetchone()
+    stats['currency'] = base_currency[0] if base_currency else None
     stats['total_transactions'] = stats['income_count'] + stats['expense_count']
     
-    # Get monthly statistics (last 6 months)
-    cur.execute("""
-        SELECT 
-            DATE_TRUNC('month', transaction_date) as month,
-            type,
-            SUM(amount) as amount
-        FROM transactions 
-        WHERE user_id = %s 
-            AND transaction_date >= CURRENT_DATE - INTERVAL '6 months'
-        GROUP BY DATE_TRUNC('month', transaction_date), type
-        ORDER BY month DESC
-    """, (user_id,))
+    monthly_amounts: Dict[Any, Dict[str, ConvertedSum]] = {}
+    for month, transaction_type, currency, base, rate_date, amount in monthly:
+        month_amounts = monthly_amounts.setdefault(month, {'income': ConvertedSum(), 'expenses': ConvertedSum()})
+        month_amounts['expenses' if transaction_type == 'expense' else 'income'].add(amount, currency, base, rate_date, rates)
     
     monthly_stats = {}
-    for row in cur.fetchall():
-        month_key = row[0].strftime('%Y-%m')
-        if month_key not in monthly_stats:
-            monthly_stats[month_key] = {'income': 0, 'expenses': 0}
-        monthly_stats[month_key][row[1] + 's' if row[1] == 'expense' else row[1]] = float(row[2])
+    for month, month_amounts in sorted(monthly_amounts.items(), key=lambda item: item[0], reverse=True):
+        month_stats = {'income': float(month_amounts['income'].total), 'expenses': float(month_amounts['expenses'].total)}
+        unconverted = unconverted_by_currency(month_amounts)
+        if unconverted:
+            month_stats['unconverted'] = unconverted
+        monthly_stats[month.strftime('%Y-%m')] = month_stats
     
     stats['monthly_breakdown'] = monthly_stats
     
@@ -244,32 +407,69 @@ def get_user_statistics(cur, user_id: int) -> Dict[str, Any]:
         'body': json.dumps(stats, default=decimal_default)
     }
 
-def get_categories_summary(cur, user_id: int) -> Dict[str, Any]:
-    """Get categories breakdown for user"""
-    cur.execute("""
+async def get_categories_summary(cur, user_id: int) -> Dict[str, Any]:
+    """Get categories breakdown for user in the user's base currency"""
+    # Group by the integer id (and currency/rate date for conversion) first,
+    # then attach names to the (few) result rows
+    await cur.execute("""
         SELECT 
-            type,
-            category,
-            SUM(amount) as total_amount,
-            COUNT(*) as transaction_count
-        FROM transactions 
-        WHERE user_id = %s 
-        GROUP BY type, category
-        ORDER BY type, total_amount DESC
-    """, (user_id,))
+            s.type,
+            c.name,
+            s.currency,
+            s.base_currency,
+            s.rate_date,
+            s.total_amount,
+            s.transaction_count,
+            c.id
+        FROM (
+            SELECT type, category_id, currency, base_currency, rate_date,
+                SUM(total_amount) as total_amount,
+                SUM(transaction_count)::BIGINT as transaction_count
+            FROM (
+                SELECT t.type, t.category_id, t.currency, u.base_currency,
+                    CASE WHEN t.currency = u.base_currency THEN NULL ELSE t.transaction_date END as rate_date,
+                    SUM(t.amount) as total_amount, COUNT(*) as transaction_count
+                FROM transactions t
+                JOIN users u ON u.id = t.user_id
+                WHERE t.user_id = %(user_id)s 
+                GROUP BY 1, 2, 3, 4, 5
+                UNION ALL
+                SELECT r.type, r.category_id, r.currency, u.base_currency,
+                    CASE WHEN r.currency = u.base_currency THEN NULL ELSE r.month END,
+                    SUM(r.total_amount), SUM(r.transaction_count)
+                FROM transaction_archive_rollups r
+                JOIN users u ON u.id = r.user_id
+                WHERE r.user_id = %(user_id)s
+                GROUP BY 1, 2, 3, 4, 5
+            ) totals
+            GROUP BY 1, 2, 3, 4, 5
+        ) s
+        JOIN categories c ON c.id = s.category_id
+    """, {'user_id': user_id}, prepare=True)
+    
+    rows = await cur.fetchall()
+    rates = await load_rates(cur, [row[2:5] for row in rows])
+    
+    summary: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    for transaction_type, name, currency, base, rate_date, amount, count, category_id in rows:
+        entry = summary.setdefault((transaction_type, category_id), {'name': name, 'amount': ConvertedSum(), 'count': 0})
+        entry['amount'].add(amount, currency, base, rate_date, rates)
+        entry['count'] += count
     
     categories = {'income': {}, 'expenses': {}}
-    for row in cur.fetchall():
-        transaction_type = row[0]
-        category = row[1]
-        amount = float(row[2])
-        count = row[3]
-        
+    for (transaction_type, category_id), entry in sorted(
+        summary.items(), key=lambda item: (item[0][0], -item[1]['amount'].total)
+    ):
         category_key = transaction_type + 's' if transaction_type == 'expense' else transaction_type
-        categories[category_key][category] = {
-            'amount': amount,
-            'count': count
+        categories[category_key][entry['name']] = {
+            'id': category_id,
+            'amount': float(entry['amount'].total),
+            'count': entry['count']
         }
+        if entry['amount'].unconverted:
+            categories[category_key][entry['name']]['unconverted'] = {
+                currency: float(amount) for currency, amount in entry['amount'].unconverted.items()
+            }
     
     return {
         'statusCode': 200,
@@ -280,13 +480,200 @@ def get_categories_summary(cur, user_id: int) -> Dict[str, Any]:
         'body': json.dumps(categories)
     }
 
-def handle_create_transaction(cur, user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+# Ranked category lists for pickers, cached per instance. A write on this
+# instance drops its user's entry; writes through other instances show up
+# once the entry expires after CATEGORY_LIST_CACHE_SECONDS.
+CATEGORY_LIST_CACHE_SECONDS = float(os.environ.get('CATEGORY_LIST_CACHE_SECONDS', 60))
+CATEGORY_LIST_CACHE_MAX_USERS = 10000
+_category_lists: 'OrderedDict[int, Tuple[float, List[Tuple[str, Dict[str, Any]]]]]' = OrderedDict()
+_category_lists_lock = threading.Lock()
+
+def forget_category_list(user_id: int) -> None:
+    with _category_lists_lock:
+        _category_lists.pop(user_id, None)
+
+async def get_categories_list(cur, user_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+    """User's categories ranked by usage count, then by last use; ?prefix= filters for autocomplete"""
+    try:
+        limit = min(int(params.get('limit', 100)), 500)
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Invalid limit'})
+        }
+    
+    now = time.monotonic()
+    with _category_lists_lock:
+        cached = _category_lists.get(user_id)
+        if cached and cached[0] > now:
+            _category_lists.move_to_end(user_id)
+            ranked = cached[1]
+        else:
+            ranked = None
+    
+    if ranked is None:
+        # Served by idx_categories_user_ranking in index order, without touching transactions
+        await cur.execute("""
+            SELECT id, name, normalized_name, usage_count, last_used_at
+            FROM categories
+            WHERE user_id = %s
+            ORDER BY usage_count DESC, last_used_at DESC NULLS LAST, id
+        """, (user_id,), prepare=True)
+        ranked = [(row[2], {
+            'id': row[0],
+            'name': row[1],
+            'usage_count': row[3],
+            'last_used_at': row[4].isoformat() if row[4] else None
+        }) for row in await cur.fetchall()]
+        with _category_lists_lock:
+            _category_lists[user_id] = (now + CATEGORY_LIST_CACHE_SECONDS, ranked)
+            _category_lists.move_to_end(user_id)
+            while len(_category_lists) > CATEGORY_LIST_CACHE_MAX_USERS:
+                _category_lists.popitem(last=False)
+    
+    prefix = normalize_category_name(params.get('prefix', ''))
+    categories = [category for normalized, category in ranked if normalized.startswith(prefix)][:limit]
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps({'categories': categories})
+    }
+
+async def get_anomalies(cur, user_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+    """List transactions flagged by the last anomaly detection runs"""
+    kind = params.get('kind')
+    if kind and kind not in ('outlier', 'duplicate'):
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Kind must be "outlier" or "duplicate"'})
+        }
+    
+    await cur.execute("""
+        SELECT f.transaction_id, f.kind, f.score, f.details, f.detected_at,
+               t.type, t.amount, t.currency, c.name, t.description, t.transaction_date
+        FROM transaction_flags f
+        JOIN transactions t ON t.id = f.transaction_id AND t.user_id = f.user_id
+        JOIN categories c ON c.id = t.category_id
+        WHERE f.user_id = %(user_id)s AND (%(kind)s::TEXT IS NULL OR f.kind = %(kind)s)
+        ORDER BY f.detected_at DESC, f.transaction_id DESC
+        LIMIT 100
+    """, {'user_id': user_id, 'kind': kind}, prepare=True)
+    
+    anomalies = [{
+        'transaction_id': row[0],
+        'kind': row[1],
+        'score': row[2],
+        'details': row[3],
+        'detected_at': row[4].isoformat(),
+        'type': row[5],
+        'amount': float(row[6]),
+        'currency': row[7],
+        'category': row[8],
+        'description': row[9],
+        'date': row[10].isoformat()
+    } for row in await cur.fetchall()]
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps({'anomalies': anomalies})
+    }
+
+async def handle_detect_anomalies(cur, user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Flag outlier amounts and likely duplicates; incremental by default"""
+    mode = data.get('mode', 'incremental')
+    if mode not in ('incremental', 'full'):
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Mode must be "incremental" or "full"'})
+        }
+    
+    # numpy is imported only by requests that run detection
+    from anomalies import detect_anomalies
+    result = await detect_anomalies(cur, [user_id], incremental=mode == 'incremental')
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps({'success': True, 'mode': mode, **result})
+    }
+
+def transaction_event_cte(source: str, operation: str) -> str:
+    """CTE appending a change event for every row returned by the source CTE"""
+    # Written by the same statement as the row itself: the event commits or
+    # rolls back with it and costs no extra round-trip
+    return f"""change_event AS (
+            INSERT INTO change_events (user_id, aggregate, aggregate_id, operation, payload)
+            SELECT user_id, 'transaction', id, '{operation}', jsonb_build_object(
+                'type', type,
+                'amount', amount,
+                'currency', currency,
+                'category_id', category_id,
+                'date', transaction_date
+            )
+            FROM {source}
+        )"""
+
+# Usage changes of a write as (category_id, delta, used_on) rows; a
+# re-categorized row moves one use from its previous category to the new one
+INSERTED_CATEGORY_USAGE = "SELECT category_id, 1 AS delta, transaction_date AS used_on FROM inserted"
+DELETED_CATEGORY_USAGE = "SELECT category_id, -1 AS delta, NULL::DATE AS used_on FROM deleted"
+UPDATED_CATEGORY_USAGE = """
+    SELECT category_id, (category_id <> previous_category_id)::INTEGER AS delta, transaction_date AS used_on
+    FROM updated
+    UNION ALL
+    SELECT previous_category_id, -1, NULL FROM updated WHERE category_id <> previous_category_id
+"""
+
+def category_usage_cte(changes: str) -> str:
+    """CTE applying (category_id, delta, used_on) rows to the categories' usage ranking"""
+    return f"""category_usage AS (
+            UPDATE categories c
+            SET usage_count = c.usage_count + u.delta,
+                last_used_at = GREATEST(c.last_used_at, u.used_on)
+            FROM ({changes}) u
+            WHERE c.id = u.category_id
+        )"""
+
+async def emit_change_event(cur, user_id: int, aggregate: str, aggregate_id: int,
+                            operation: str, payload: Dict[str, Any]) -> None:
+    """Append a change event inside the current transaction"""
+    await cur.execute("""
+        INSERT INTO change_events (user_id, aggregate, aggregate_id, operation, payload)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (user_id, aggregate, aggregate_id, operation, json.dumps(payload)), prepare=True)
+
+async def handle_create_transaction(cur, user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
     """Create new transaction"""
     transaction_type = data.get('type')
     amount = data.get('amount')
     category = data.get('category', '').strip()
+    category_id = data.get('category_id')
     description = data.get('description', '').strip()
     transaction_date = data.get('date')
+    currency = data.get('currency')
     
     # Validation
     if transaction_type not in ['income', 'expense']:
@@ -309,7 +696,7 @@ def handle_create_transaction(cur, user_id: int, data: Dict[str, Any]) -> Dict[s
             'body': json.dumps({'error': 'Amount must be positive'})
         }
     
-    if not category or not description:
+    if not (category or category_id) or not description:
         return {
             'statusCode': 400,
             'headers': {
@@ -322,14 +709,44 @@ def handle_create_transaction(cur, user_id: int, data: Dict[str, Any]) -> Dict[s
     if not transaction_date:
         transaction_date = date.today().isoformat()
     
+    if currency:
+        currency = await validate_currency(cur, currency)
+        if not currency:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Unknown currency'})
+            }
+    
+    if category_id:
+        owned_category = await get_owned_category(cur, user_id, category_id)
+        if not owned_category:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Category not found'})
+            }
+        category_id, category = owned_category
+    else:
+        category_id, category = await resolve_category(cur, user_id, category)
+    
     # Insert transaction
-    cur.execute("""
-        INSERT INTO transactions (user_id, type, amount, category, description, transaction_date)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        RETURNING id, created_at
-    """, (user_id, transaction_type, amount, category, description, transaction_date))
+    await cur.execute(f"""
+        WITH inserted AS (
+            INSERT INTO transactions (user_id, type, amount, currency, category_id, description, transaction_date)
+            VALUES (%s, %s, %s, COALESCE(%s, (SELECT base_currency FROM users WHERE id = %s)), %s, %s, %s)
+            RETURNING id, user_id, type, amount, currency, category_id, transaction_date, created_at
+        ), {transaction_event_cte('inserted', 'create')}, {category_usage_cte(INSERTED_CATEGORY_USAGE)}
+        SELECT id, created_at, currency FROM inserted
+    """, (user_id, transaction_type, amount, currency, user_id, category_id, description, transaction_date), prepare=True)
     
-    transaction_id, created_at = cur.fetchone()
+    transaction_id, created_at, currency = await cur.fetchone()
     
     return {
         'statusCode': 201,
@@ -343,7 +760,9 @@ def handle_create_transaction(cur, user_id: int, data: Dict[str, Any]) -> Dict[s
                 'id': transaction_id,
                 'type': transaction_type,
                 'amount': float(amount),
+                'currency': currency,
                 'category': category,
+                'category_id': category_id,
                 'description': description,
                 'date': transaction_date,
                 'created_at': created_at.isoformat()
@@ -351,7 +770,7 @@ def handle_create_transaction(cur, user_id: int, data: Dict[str, Any]) -> Dict[s
         })
     }
 
-def handle_update_transaction(cur, user_id: int, transaction_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+async def handle_update_transaction(cur, user_id: int, transaction_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
     """Update existing transaction"""
     if not transaction_id:
         return {
@@ -363,19 +782,7 @@ def handle_update_transaction(cur, user_id: int, transaction_id: int, data: Dict
             'body': json.dumps({'error': 'Transaction ID is required'})
         }
     
-    # Check if transaction belongs to user
-    cur.execute("SELECT id FROM transactions WHERE id = %s AND user_id = %s", (transaction_id, user_id))
-    if not cur.fetchone():
-        return {
-            'statusCode': 404,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'Transaction not found'})
-        }
-    
-    # Build update query dynamically
+    # Build update query dynamically; ownership is checked by the UPDATE itself
     updates = []
     params = []
     
@@ -387,9 +794,48 @@ def handle_update_transaction(cur, user_id: int, transaction_id: int, data: Dict
         updates.append("amount = %s")
         params.append(data['amount'])
     
-    if 'category' in data and data['category'].strip():
-        updates.append("category = %s")
-        params.append(data['category'].strip())
+    if data.get('currency'):
+        currency = await validate_currency(cur, data['currency'])
+        if not currency:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Unknown currency'})
+            }
+        updates.append("currency = %s")
+        params.append(currency)
+    
+    if data.get('category_id'):
+        owned_category = await get_owned_category(cur, user_id, data['category_id'])
+        if not owned_category:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Category not found'})
+            }
+        updates.append("category_id = %s")
+        params.append(owned_category[0])
+    elif 'category' in data and data['category'].strip():
+        # A new category is only created if the transaction exists: a 404
+        # must not leave an unused category behind in the ranked list
+        category = await resolve_category(cur, user_id, data['category'], transaction_id)
+        if not category:
+            return {
+                'statusCode': 404,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Transaction not found'})
+            }
+        updates.append("category_id = %s")
+        params.append(category[0])
     
     if 'description' in data and data['description'].strip():
         updates.append("description = %s")
@@ -411,14 +857,31 @@ def handle_update_transaction(cur, user_id: int, transaction_id: int, data: Dict
     
     params.extend([transaction_id, user_id])
     
-    cur.execute(f"""
-        UPDATE transactions 
-        SET {', '.join(updates)}
-        WHERE id = %s AND user_id = %s
-        RETURNING id, type, amount, category, description, transaction_date, created_at
+    # The self-join exposes the row's previous category to move its usage count
+    await cur.execute(f"""
+        WITH updated AS (
+            UPDATE transactions t
+            SET {', '.join(updates)}
+            FROM transactions previous
+            WHERE t.id = %s AND t.user_id = %s AND previous.id = t.id AND previous.user_id = t.user_id
+            RETURNING t.id, t.user_id, t.type, t.amount, t.currency, t.category_id, t.description,
+                      t.transaction_date, t.created_at, previous.category_id AS previous_category_id
+        ), {transaction_event_cte('updated', 'update')}, {category_usage_cte(UPDATED_CATEGORY_USAGE)}
+        SELECT u.id, u.type, u.amount, c.name, u.description, u.transaction_date, u.created_at, u.category_id, u.currency
+        FROM updated u
+        JOIN categories c ON c.id = u.category_id
     """, params)
     
-    updated_transaction = cur.fetchone()
+    updated_transaction = await cur.fetchone()
+    if not updated_transaction:
+        return {
+            'statusCode': 404,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Transaction not found'})
+        }
     
     return {
         'statusCode': 200,
@@ -432,7 +895,9 @@ def handle_update_transaction(cur, user_id: int, transaction_id: int, data: Dict
                 'id': updated_transaction[0],
                 'type': updated_transaction[1],
                 'amount': float(updated_transaction[2]),
+                'currency': updated_transaction[8],
                 'category': updated_transaction[3],
+                'category_id': updated_transaction[7],
                 'description': updated_transaction[4],
                 'date': updated_transaction[5].isoformat(),
                 'created_at': updated_transaction[6].isoformat()
@@ -440,7 +905,129 @@ def handle_update_transaction(cur, user_id: int, transaction_id: int, data: Dict
         })
     }
 
-def handle_delete_transaction(cur, user_id: int, transaction_id: str) -> Dict[str, Any]:
+async def handle_update_category(cur, user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Rename a category or merge one category into another"""
+    action = data.get('action')
+    
+    if action == 'rename_category':
+        category = await get_owned_category(cur, user_id, data.get('category_id'))
+        new_name = ' '.join(data.get('name', '').split())
+        if not category or not new_name:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Existing category_id and new name are required'})
+            }
+        
+        new_normalized = normalize_category_name(new_name)
+        await cur.execute(
+            "SELECT id FROM categories WHERE user_id = %s AND normalized_name = %s AND id <> %s",
+            (user_id, new_normalized, category[0])
+        )
+        if await cur.fetchone():
+            return {
+                'statusCode': 409,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'Category with this name already exists, merge instead'})
+            }
+        
+        # Transactions reference the id, so a rename touches a single row;
+        # the old spelling keeps resolving to the category through an alias
+        old_normalized = normalize_category_name(category[1])
+        await cur.execute(
+            "UPDATE categories SET name = %s, normalized_name = %s WHERE id = %s AND user_id = %s",
+            (new_name, new_normalized, category[0], user_id)
+        )
+        await cur.execute("DELETE FROM category_aliases WHERE user_id = %s AND alias = %s", (user_id, new_normalized))
+        if old_normalized != new_normalized:
+            await cur.execute("""
+                INSERT INTO category_aliases (user_id, alias, category_id) VALUES (%s, %s, %s)
+                ON CONFLICT (user_id, alias) DO UPDATE SET category_id = EXCLUDED.category_id
+            """, (user_id, old_normalized, category[0]))
+        await emit_change_event(cur, user_id, 'category', category[0], 'update', {'name': new_name})
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'success': True, 'category': {'id': category[0], 'name': new_name}})
+        }
+    
+    source = await get_owned_category(cur, user_id, data.get('source_id'))
+    target = await get_owned_category(cur, user_id, data.get('target_id'))
+    if not source or not target or source[0] == target[0]:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps({'error': 'Two different existing categories (source_id, target_id) are required'})
+        }
+    
+    # Set-based merge: re-point rows, archived rollups and aliases, keep the source spelling as an alias
+    await cur.execute(
+        "UPDATE transactions SET category_id = %s WHERE user_id = %s AND category_id = %s",
+        (target[0], user_id, source[0])
+    )
+    moved_count = cur.rowcount
+    await cur.execute("""
+        INSERT INTO transaction_archive_rollups (user_id, month, type, category_id, currency, total_amount, transaction_count)
+        SELECT user_id, month, type, %s, currency, total_amount, transaction_count
+        FROM transaction_archive_rollups
+        WHERE user_id = %s AND category_id = %s
+        ON CONFLICT (user_id, month, type, category_id, currency) DO UPDATE SET
+            total_amount = transaction_archive_rollups.total_amount + EXCLUDED.total_amount,
+            transaction_count = transaction_archive_rollups.transaction_count + EXCLUDED.transaction_count
+    """, (target[0], user_id, source[0]))
+    await cur.execute(
+        "DELETE FROM transaction_archive_rollups WHERE user_id = %s AND category_id = %s",
+        (user_id, source[0])
+    )
+    await cur.execute(
+        "UPDATE category_aliases SET category_id = %s WHERE user_id = %s AND category_id = %s",
+        (target[0], user_id, source[0])
+    )
+    await cur.execute("""
+        UPDATE categories t
+        SET usage_count = t.usage_count + s.usage_count,
+            last_used_at = GREATEST(t.last_used_at, s.last_used_at)
+        FROM categories s
+        WHERE t.id = %s AND s.id = %s AND t.user_id = %s AND s.user_id = t.user_id
+    """, (target[0], source[0], user_id))
+    await cur.execute("""
+        INSERT INTO category_aliases (user_id, alias, category_id) VALUES (%s, %s, %s)
+        ON CONFLICT (user_id, alias) DO UPDATE SET category_id = EXCLUDED.category_id
+    """, (user_id, normalize_category_name(source[1]), target[0]))
+    await cur.execute("DELETE FROM categories WHERE id = %s AND user_id = %s", (source[0], user_id))
+    # One event for the whole merge instead of one per re-pointed transaction
+    await emit_change_event(cur, user_id, 'category', source[0], 'merge', {
+        'target_id': target[0],
+        'moved_transactions': moved_count
+    })
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps({
+            'success': True,
+            'category': {'id': target[0], 'name': target[1]},
+            'moved_transactions': moved_count
+        })
+    }
+
+async def handle_delete_transaction(cur, user_id: int, transaction_id: str) -> Dict[str, Any]:
     """Delete transaction"""
     if not transaction_id:
         return {
@@ -465,9 +1052,17 @@ def handle_delete_transaction(cur, user_id: int, transaction_id: str) -> Dict[st
         }
     
     # Delete transaction
-    cur.execute("DELETE FROM transactions WHERE id = %s AND user_id = %s", (transaction_id, user_id))
+    await cur.execute(f"""
+        WITH deleted AS (
+            DELETE FROM transactions WHERE id = %s AND user_id = %s
+            RETURNING id, user_id, type, amount, currency, category_id, transaction_date
+        ), {transaction_event_cte('deleted', 'delete')}, {category_usage_cte(DELETED_CATEGORY_USAGE)}, flags AS (
+            DELETE FROM transaction_flags f USING deleted d WHERE f.transaction_id = d.id
+        )
+        SELECT id FROM deleted
+    """, (transaction_id, user_id), prepare=True)
     
-    if cur.rowcount == 0:
+    if not await cur.fetchone():
         return {
             'statusCode': 404,
             'headers': {
@@ -484,4 +1079,8 @@ def handle_delete_transaction(cur, user_id: int, transaction_id: str) -> Dict[st
             'Content-Type': 'application/json'
         },
         'body': json.dumps({'success': True, 'message': 'Transaction deleted'})
-    }
\ No newline at end of file
+    }
+
+# CORS, rate limits, Idempotency-Key replay, replica routing and compression
+# come from the vendored runtime; this function only adds its route table
+api = UserFunction('transactions', dispatch_request, on_write=forget_category_list)
@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg
+
+from rates import RATES_SQL, ConvertedSum, RateCache, rate_keys, unconverted_by_currency
+
+# Same figures as get_user_statistics and get_categories_summary, for a batch
+# of users per statement: amounts are summed per (user, currency, rate date)
+# and converted here with rates from a RateCache shared by the batches of a
+# shard, so each (currency, day) is looked up once per process.
+TOTALS_SQL = """
+    SELECT user_id, type, currency, base_currency, rate_date,
+        SUM(total_amount) as total_amount,
+        SUM(transaction_count)::BIGINT as transaction_count
+    FROM (
+        SELECT t.user_id, t.type, t.currency, u.base_currency,
+            CASE WHEN t.currency = u.base_currency THEN NULL ELSE t.transaction_date END as rate_date,
+            SUM(t.amount) as total_amount, COUNT(*) as transaction_count
+        FROM transactions t
+        JOIN users u ON u.id = t.user_id
+        WHERE t.user_id = ANY(%(user_ids)s)
+        GROUP BY 1, 2, 3, 4, 5
+        UNION ALL
+        SELECT r.user_id, r.type, r.currency, u.base_currency,
+            CASE WHEN r.currency = u.base_currency THEN NULL ELSE r.month END,
+            SUM(r.total_amount), SUM(r.transaction_count)
+        FROM transaction_archive_rollups r
+        JOIN users u ON u.id = r.user_id
+        WHERE r.user_id = ANY(%(user_ids)s)
+        GROUP BY 1, 2, 3, 4, 5
+    ) totals
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+MONTHLY_SQL = """
+    SELECT t.user_id, DATE_TRUNC('month', t.transaction_date) as month, t.type, t.currency, u.base_currency,
+        CASE WHEN t.currency = u.base_currency THEN NULL ELSE t.transaction_date END as rate_date,
+        SUM(t.amount) as amount
+    FROM transactions t
+    JOIN users u ON u.id = t.user_id
+    WHERE t.user_id = ANY(%(user_ids)s)
+        AND t.transaction_date >= CURRENT_DATE - INTERVAL '6 months'
+    GROUP BY 1, 2, 3, 4, 5, 6
+"""
+
+CATEGORIES_SQL = """
+    SELECT s.user_id, s.type, c.name, s.currency, s.base_currency, s.rate_date,
+        s.total_amount, s.transaction_count, c.id
+    FROM (
+        SELECT user_id, type, category_id, currency, base_currency, rate_date,
+            SUM(total_amount) as total_amount,
+            SUM(transaction_count)::BIGINT as transaction_count
+        FROM (
+            SELECT t.user_id, t.type, t.category_id, t.currency, u.base_currency,
+                CASE WHEN t.currency = u.base_currency THEN NULL ELSE t.transaction_date END as rate_date,
+                SUM(t.amount) as total_amount, COUNT(*) as transaction_count
+            FROM transactions t
+            JOIN users u ON u.id = t.user_id
+            WHERE t.user_id = ANY(%(user_ids)s)
+            GROUP BY 1, 2, 3, 4, 5, 6
+            UNION ALL
+            SELECT r.user_id, r.type, r.category_id, r.currency, u.base_currency,
+                CASE WHEN r.currency = u.base_currency THEN NULL ELSE r.month END,
+                SUM(r.total_amount), SUM(r.transaction_count)
+            FROM transaction_archive_rollups r
+            JOIN users u ON u.id = r.user_id
+            WHERE r.user_id = ANY(%(user_ids)s)
+            GROUP BY 1, 2, 3, 4, 5, 6
+        ) totals
+        GROUP BY 1, 2, 3, 4, 5, 6
+    ) s
+    JOIN categories c ON c.id = s.category_id
+"""
+
+# Rates do not change while a report runs; the bound only caps memory
+RATE_CACHE_MAX_ENTRIES = 100000
+
+USERS_SQL = """
+    SELECT id, base_currency FROM users
+    WHERE id > %s AND id <= %s
+    ORDER BY id
+    LIMIT %s
+"""
+
+
+def load_rates(conn, cache: RateCache, groups: List[tuple]) -> Dict[Tuple[str, date], Optional[Decimal]]:
+    """Rates for (currency, base_currency, rate_date) groups; cache misses cost one query"""
+    rates, missing = cache.get_many(rate_keys(groups))
+    if missing:
+        rows = conn.execute(RATES_SQL, (
+            [currency for currency, _ in missing],
+            [rate_date for _, rate_date in missing]
+        ), prepare=True).fetchall()
+        rates.update(cache.put_many(rows))
+    return rates
+
+
+def build_reports(users: List[Tuple[int, str]], totals: List[tuple], monthly: List[tuple],
+                  categories: List[tuple], rates: Dict[Tuple[str, date], Optional[Decimal]]) -> List[Dict[str, Any]]:
+    '''
+    Business: Assemble per-user statements from the batch query results
+    Args: users - (user_id, base_currency) of the batch, in id order
+          totals, monthly, categories - rows of TOTALS_SQL, MONTHLY_SQL, CATEGORIES_SQL
+          rates - (currency, date) -> rubles per unit for every group of the batch (load_rates)
+    Returns: one dict per user, shaped like the stats and categories API responses
+    '''
+    reports = {}
+    for user_id, base_currency in users:
+        reports[user_id] = {
+            'user_id': user_id,
+            'currency': base_currency,
+            'total_income': 0,
+            'total_expenses': 0,
+            'income_count': 0,
+            'expense_count': 0,
+            'unconverted': {},
+            'monthly_breakdown': {},
+            'categories': {'income': {}, 'expenses': {}}
+        }
+
+    # Amounts without a rate are reported under 'unconverted', as in the API
+    amounts: Dict[int, Dict[str, ConvertedSum]] = defaultdict(lambda: {'income': ConvertedSum(), 'expenses': ConvertedSum()})
+    counts: Dict[Tuple[int, str], int] = defaultdict(int)
+    for user_id, transaction_type, currency, base, rate_date, amount, count in totals:
+        amounts[user_id]['expenses' if transaction_type == 'expense' else 'income'].add(amount, currency, base, rate_date, rates)
+        counts[user_id, transaction_type] += count
+    for user_id, user_amounts in amounts.items():
+        reports[user_id]['total_income'] = float(user_amounts['income'].total)
+        reports[user_id]['total_expenses'] = float(user_amounts['expenses'].total)
+        reports[user_id]['income_count'] = counts[user_id, 'income']
+        reports[user_id]['expense_count'] = counts[user_id, 'expense']
+        reports[user_id]['unconverted'] = unconverted_by_currency(user_amounts)
+
+    monthly_amounts: Dict[Tuple[int, Any], Dict[str, ConvertedSum]] = {}
+    for user_id, month, transaction_type, currency, base, rate_date, amount in monthly:
+        month_amounts = monthly_amounts.setdefault((user_id, month), {'income': ConvertedSum(), 'expenses': ConvertedSum()})
+        month_amounts['expenses' if transaction_type == 'expense' else 'income'].add(amount, currency, base, rate_date, rates)
+
+    months: Dict[int, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+    for (user_id, month), month_amounts in sorted(monthly_amounts.items(), key=lambda item: item[0][1], reverse=True):
+        month_stats = {'income': float(month_amounts['income'].total), 'expenses': float(month_amounts['expenses'].total)}
+        unconverted = unconverted_by_currency(month_amounts)
+        if unconverted:
+            month_stats['unconverted'] = unconverted
+        months[user_id][month.strftime('%Y-%m')] = month_stats
+
+    summary: Dict[Tuple[int, str, int], Dict[str, Any]] = {}
+    for user_id, transaction_type, name, currency, base, rate_date, amount, count, category_id in categories:
+        entry = summary.setdefault((user_id, transaction_type, category_id), {'name': name, 'amount': ConvertedSum(), 'count': 0})
+        entry['amount'].add(amount, currency, base, rate_date, rates)
+        entry['count'] += count
+    for (user_id, transaction_type, category_id), entry in sorted(
+        summary.items(), key=lambda item: (item[0][1], -item[1]['amount'].total)
+    ):
+        key = 'expenses' if transaction_type == 'expense' else 'income'
+        category = {'id': category_id, 'amount': float(entry['amount'].total), 'count': entry['count']}
+        if entry['amount'].unconverted:
+            category['unconverted'] = {currency: float(amount) for currency, amount in entry['amount'].unconverted.items()}
+        reports[user_id]['categories'][key][entry['name']] = category
+
+    for user_id, report in reports.items():
+        report['balance'] = report['total_income'] - report['total_expenses']
+        report['total_transactions'] = report['income_count'] + report['expense_count']
+        report['monthly_breakdown'] = months.get(user_id, {})
+    return list(reports.values())
+
+
+def report_shard(dsn: str, first_id: int, last_id: int, path: str, batch_size: int) -> Dict[str, Any]:
+    '''
+    Business: Write NDJSON statements for users with first_id <= id <= last_id
+    Args: dsn - database connection string (a replica is fine: the job only reads)
+          first_id, last_id - inclusive user id range of the shard
+          path - output file; written as path.partial and renamed when complete
+          batch_size - users per set of queries, bounds memory
+    Returns: dict with path, users and seconds
+    '''
+    started = time.perf_counter()
+    partial_path = path + '.partial'
+    written = 0
+    after_id = first_id - 1
+    rate_cache = RateCache(RATE_CACHE_MAX_ENTRIES, float('inf'))
+    with psycopg.connect(dsn) as conn, open(partial_path, 'w', encoding='utf-8') as output:
+        while True:
+            users = conn.execute(USERS_SQL, (after_id, last_id, batch_size), prepare=True).fetchall()
+            if not users:
+                break
+            params = {'user_ids': [user_id for user_id, _ in users]}
+
+            # Three independent statements, one round-trip
+            with conn.pipeline():
+                totals_cur = conn.cursor()
+                monthly_cur = conn.cursor()
+                categories_cur = conn.cursor()
+                totals_cur.execute(TOTALS_SQL, params, prepare=True)
+                monthly_cur.execute(MONTHLY_SQL, params, prepare=True)
+                categories_cur.execute(CATEGORIES_SQL, params, prepare=True)
+            totals, monthly, categories = totals_cur.fetchall(), monthly_cur.fetchall(), categories_cur.fetchall()
+            rates = load_rates(conn, rate_cache, [row[2:5] for row in totals] + [row[3:6] for row in monthly]
+                               + [row[3:6] for row in categories])
+            reports = build_reports(users, totals, monthly, categories, rates)
+            conn.rollback()  # end the read transaction between batches
+
+            for report in reports:
+                output.write(json.dumps(report, separators=(',', ':')) + '\n')
+            written += len(users)
+            after_id = users[-1][0]
+
+    os.replace(partial_path, path)
+    return {'path': path, 'users': written, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def shard_ranges(first_id: int, last_id: int, shards: int) -> List[Tuple[int, int]]:
+    """Split [first_id, last_id] into at most `shards` contiguous id ranges"""
+    size = max(1, -(-(last_id - first_id + 1) // shards))
+    return [(start, min(start + size - 1, last_id)) for start in range(first_id, last_id + 1, size)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Stats and category statements for many users as NDJSON')
+    parser.add_argument('output_dir')
+    parser.add_argument('--from-user', type=int, help='first user id (default: lowest)')
+    parser.add_argument('--to-user', type=int, help='last user id (default: highest)')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-size', type=int, default=1000, help='users per set of queries')
+    args = parser.parse_args()
+
+    # Heavy reads go to the replica when there is one
+    dsn = os.environ.get('DATABASE_READ_URL') or os.environ.get('DATABASE_URL')
+    if not dsn:
+        raise SystemExit('DATABASE_URL is not set')
+
+    started = time.perf_counter()
+    with psycopg.connect(dsn) as conn:
+        low, high = conn.execute("SELECT MIN(id), MAX(id) FROM users").fetchone()
+    first_id = args.from_user if args.from_user is not None else low
+    last_id = args.to_user if args.to_user is not None else high
+
+    shards = []
+    if first_id is not None and last_id is not None and first_id <= last_id:
+        shards = shard_ranges(first_id, last_id, args.processes)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=max(1, min(args.processes, len(shards)))) as pool:
+        futures = [
+            pool.submit(report_shard, dsn, shard_first, shard_last,
+                        os.path.join(args.output_dir, f'stats-{shard_first}-{shard_last}.ndjson'), args.batch_size)
+            for shard_first, shard_last in shards
+        ]
+        results = [future.result() for future in futures]
+
+    print(json.dumps({
+        'shards': results,
+        'users': sum(result['users'] for result in results),
+        'seconds': round(time.perf_counter() - started, 3)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
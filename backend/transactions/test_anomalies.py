@@ -0,0 +1,71 @@
+import json
+import unittest
+
+from anomalies import GROUPS_SQL, SAVE_FLAGS_SQL, SAVE_STATE_SQL, detect_anomalies, score_group
+from runtime import SyncCursor, run_sync
+
+# A steady category: ids 1..9 around 100, one a day
+IDS = list(range(1, 10))
+AMOUNTS = [100.0, 101.0, 99.0, 102.0, 98.0, 100.5, 99.5, 101.5, 98.5]
+DAYS = [day * 3 for day in range(9)]
+
+
+class ScoreGroupTest(unittest.TestCase):
+    def test_flags_an_amount_far_from_the_median(self):
+        flags = score_group(IDS + [10], AMOUNTS + [1000.0], DAYS + [30], last_id=0)
+
+        self.assertEqual([(transaction_id, kind) for transaction_id, kind, _, _ in flags], [(10, 'outlier')])
+        _, _, score, details = flags[0]
+        self.assertGreater(score, 3.5)
+        self.assertEqual(details, {'median': 100.25, 'mad': 1.25})
+
+    def test_small_groups_have_no_outliers(self):
+        self.assertEqual(score_group([1, 2, 3], [100.0, 101.0, 5000.0], [0, 5, 10], last_id=0), [])
+
+    def test_only_rows_after_last_id_are_flagged(self):
+        self.assertEqual(score_group(IDS + [10], AMOUNTS + [1000.0], DAYS + [30], last_id=10), [])
+
+    def test_flags_the_later_created_row_of_a_pair_within_the_window(self):
+        flags = score_group([1, 2, 3, 4], [250.0, 250.0, 250.0, 40.0], [10, 8, 20, 10], last_id=0)
+
+        self.assertEqual(flags, [(2, 'duplicate', 2.0, {'duplicate_of': 1, 'amount': 250.0})])
+
+    def test_same_amount_outside_the_window_is_not_a_duplicate(self):
+        self.assertEqual(score_group([1, 2], [250.0, 250.0], [10, 13], last_id=0), [])
+
+
+class RecordingCursor:
+    def __init__(self, groups):
+        self.groups = groups
+        self.statements = []
+
+    def execute(self, query, params=None, prepare=None):
+        self.statements.append((query, params))
+
+    def fetchall(self):
+        return self.groups
+
+
+class DetectAnomaliesTest(unittest.TestCase):
+    def test_saves_each_flag_once_and_the_last_seen_id_per_user(self):
+        # Row 3 falls between rows 1 and 2 by day, pairs up with both, and is stored once
+        groups = [
+            (7, 2, [1, 2, 3], [50.0, 50.0, 50.0], [0, 2, 1]),
+            (7, 2, [4, 5], [10.0, 11.0], [0, 1]),
+            (8, 0, [6], [20.0], [0]),
+        ]
+        cur = RecordingCursor(groups)
+
+        counts = run_sync(detect_anomalies(SyncCursor(cur), [7, 8]))
+
+        self.assertEqual(counts, {'groups': 3, 'outliers': 0, 'duplicates': 1})
+        statements = dict(cur.statements)
+        self.assertEqual(statements[GROUPS_SQL]['incremental'], True)
+        flags = statements[SAVE_FLAGS_SQL]
+        self.assertEqual((flags['transaction_ids'], flags['kinds'], flags['user_ids']), ([3], ['duplicate'], [7]))
+        self.assertEqual(json.loads(flags['details'][0]), {'duplicate_of': 2, 'amount': 50.0})
+        self.assertEqual(statements[SAVE_STATE_SQL], {'user_ids': [7, 8], 'last_ids': [5, 6]})
+
+
+if __name__ == '__main__':
+    unittest.main()
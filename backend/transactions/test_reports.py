@@ -0,0 +1,119 @@
+import unittest
+from datetime import date
+from decimal import Decimal
+
+from rates import RATES_SQL, RateCache
+from reports import build_reports, load_rates, shard_ranges
+
+MARCH = date(2026, 3, 1)
+APRIL = date(2026, 4, 1)
+RATES = {('USD', MARCH): Decimal('90'), ('RUB', MARCH): Decimal(1), ('USD', APRIL): Decimal('95'), ('RUB', APRIL): Decimal(1)}
+
+
+class ShardRangesTest(unittest.TestCase):
+    def test_splits_the_id_range_into_contiguous_shards(self):
+        self.assertEqual(shard_ranges(1, 10, 3), [(1, 4), (5, 8), (9, 10)])
+        self.assertEqual(shard_ranges(1, 9, 3), [(1, 3), (4, 6), (7, 9)])
+
+    def test_never_makes_empty_shards(self):
+        self.assertEqual(shard_ranges(5, 6, 4), [(5, 5), (6, 6)])
+        self.assertEqual(shard_ranges(7, 7, 2), [(7, 7)])
+
+    def test_covers_every_id_exactly_once(self):
+        for shards in range(1, 12):
+            ids = [user_id for first, last in shard_ranges(3, 40, shards) for user_id in range(first, last + 1)]
+            self.assertEqual(ids, list(range(3, 41)))
+            self.assertLessEqual(len(shard_ranges(3, 40, shards)), shards)
+
+
+class ScriptedConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def execute(self, query, params=None, prepare=None):
+        self.statements.append((query, params))
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+
+class LoadRatesTest(unittest.TestCase):
+    def test_looks_up_only_the_pairs_missing_from_the_cache(self):
+        cache = RateCache(100, float('inf'))
+        cache.put_many([('USD', MARCH, Decimal('90'))])
+        conn = ScriptedConnection([('EUR', MARCH, Decimal('98'))])
+
+        rates = load_rates(conn, cache, [('USD', 'RUB', MARCH), ('EUR', 'RUB', MARCH), ('RUB', 'RUB', MARCH)])
+
+        self.assertEqual(rates, {('USD', MARCH): Decimal('90'), ('EUR', MARCH): Decimal('98'), ('RUB', MARCH): Decimal(1)})
+        self.assertEqual(conn.statements, [(RATES_SQL, (['EUR'], [MARCH]))])
+
+    def test_a_warm_cache_costs_no_query(self):
+        cache = RateCache(100, float('inf'))
+        cache.put_many([('USD', MARCH, Decimal('90'))])
+        conn = ScriptedConnection([])
+
+        load_rates(conn, cache, [('USD', 'RUB', MARCH)])
+        self.assertEqual(conn.statements, [])
+
+
+class BuildReportsTest(unittest.TestCase):
+    def setUp(self):
+        users = [(1, 'RUB'), (2, 'USD')]
+        totals = [
+            (1, 'income', 'RUB', 'RUB', None, Decimal('50000'), 2),
+            (1, 'expense', 'USD', 'RUB', MARCH, Decimal('10'), 1),
+            (1, 'expense', 'EUR', 'RUB', MARCH, Decimal('5'), 1),
+        ]
+        monthly = [
+            (1, MARCH, 'expense', 'USD', 'RUB', MARCH, Decimal('10')),
+            (1, MARCH, 'expense', 'EUR', 'RUB', MARCH, Decimal('5')),
+            (1, APRIL, 'income', 'RUB', 'RUB', None, Decimal('50000')),
+        ]
+        categories = [
+            (1, 'expense', 'Travel', 'USD', 'RUB', MARCH, Decimal('10'), 1, 7),
+            (1, 'expense', 'Travel', 'EUR', 'RUB', MARCH, Decimal('5'), 1, 7),
+            (1, 'expense', 'Food', 'RUB', 'RUB', None, Decimal('100'), 3, 4),
+            (1, 'income', 'Salary', 'RUB', 'RUB', None, Decimal('50000'), 2, 2),
+        ]
+        self.reports = {report['user_id']: report for report in build_reports(users, totals, monthly, categories, RATES)}
+
+    def test_converts_totals_into_the_base_currency(self):
+        report = self.reports[1]
+        self.assertEqual(report['total_income'], 50000.0)
+        self.assertEqual(report['total_expenses'], 900.0)
+        self.assertEqual(report['balance'], 49100.0)
+        self.assertEqual(report['total_transactions'], 4)
+
+    def test_lists_amounts_without_a_rate_as_unconverted(self):
+        report = self.reports[1]
+        self.assertEqual(report['unconverted'], {'EUR': {'expenses': 5.0}})
+        self.assertEqual(report['monthly_breakdown']['2026-03']['unconverted'], {'EUR': {'expenses': 5.0}})
+        self.assertNotIn('unconverted', report['monthly_breakdown']['2026-04'])
+        self.assertEqual(report['categories']['expenses']['Travel'], {'id': 7, 'amount': 900.0, 'count': 2, 'unconverted': {'EUR': 5.0}})
+
+    def test_orders_months_newest_first_and_categories_by_amount(self):
+        report = self.reports[1]
+        self.assertEqual(list(report['monthly_breakdown']), ['2026-04', '2026-03'])
+        self.assertEqual(list(report['categories']['expenses']), ['Travel', 'Food'])
+
+    def test_a_user_without_transactions_gets_an_empty_statement(self):
+        self.assertEqual(self.reports[2], {
+            'user_id': 2,
+            'currency': 'USD',
+            'total_income': 0,
+            'total_expenses': 0,
+            'income_count': 0,
+            'expense_count': 0,
+            'unconverted': {},
+            'monthly_breakdown': {},
+            'categories': {'income': {}, 'expenses': {}},
+            'balance': 0,
+            'total_transactions': 0
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,12 @@
+-- Составные индексы под фильтры списка транзакций (тип, категории, сумма, период)
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions(user_id, transaction_date DESC, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_amount ON transactions(user_id, amount);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_category_date ON transactions(user_id, category, transaction_date DESC);
+
+-- BRIN по дате для выборок по диапазону дат сразу по всем пользователям
+CREATE INDEX IF NOT EXISTS idx_transactions_date_brin ON transactions USING BRIN (transaction_date);
+
+-- Покрываются составными индексами выше
+DROP INDEX IF EXISTS idx_transactions_user_id;
+DROP INDEX IF EXISTS idx_transactions_date;
+DROP INDEX IF EXISTS idx_transactions_category;
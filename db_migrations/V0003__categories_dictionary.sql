@@ -0,0 +1,53 @@
+-- Справочник категорий пользователя: транзакции ссылаются на целочисленный id
+CREATE TABLE IF NOT EXISTS categories (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    name VARCHAR(100) NOT NULL,
+    normalized_name VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, normalized_name)
+);
+
+-- Альтернативные написания ("Food", "food ") и имена объединённых категорий
+CREATE TABLE IF NOT EXISTS category_aliases (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    alias VARCHAR(100) NOT NULL,
+    category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    PRIMARY KEY (user_id, alias)
+);
+
+CREATE INDEX IF NOT EXISTS idx_category_aliases_category_id ON category_aliases(category_id);
+
+-- Заполнение справочника: одна категория на нормализованное имя,
+-- отображаемое имя берётся из самого частого написания
+INSERT INTO categories (user_id, name, normalized_name)
+SELECT DISTINCT ON (user_id, normalized_name) user_id, display_name, normalized_name
+FROM (
+    SELECT
+        user_id,
+        regexp_replace(btrim(category), '\s+', ' ', 'g') AS display_name,
+        lower(regexp_replace(btrim(category), '\s+', ' ', 'g')) AS normalized_name,
+        COUNT(*) AS usage_count
+    FROM transactions
+    GROUP BY user_id, category
+) spellings
+ORDER BY user_id, normalized_name, usage_count DESC
+ON CONFLICT (user_id, normalized_name) DO NOTHING;
+
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS category_id INTEGER REFERENCES categories(id);
+
+UPDATE transactions t
+SET category_id = c.id
+FROM categories c
+WHERE c.user_id = t.user_id
+    AND c.normalized_name = lower(regexp_replace(btrim(t.category), '\s+', ' ', 'g'))
+    AND t.category_id IS NULL;
+
+ALTER TABLE transactions ALTER COLUMN category_id SET NOT NULL;
+
+DROP INDEX IF EXISTS idx_transactions_user_category_date;
+CREATE INDEX IF NOT EXISTS idx_transactions_user_category_id_date ON transactions(user_id, category_id, transaction_date DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_category_id ON transactions(category_id);
+
+-- Строковая категория больше не хранится в каждой строке
+ALTER TABLE transactions DROP COLUMN IF EXISTS category;
@@ -0,0 +1,108 @@
+-- Секционирование транзакций по году transaction_date
+ALTER TABLE transactions RENAME TO transactions_unpartitioned;
+ALTER INDEX transactions_pkey RENAME TO transactions_unpartitioned_pkey;
+
+CREATE TABLE transactions (
+    id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    type VARCHAR(10) NOT NULL CHECK (type IN ('income', 'expense')),
+    amount DECIMAL(15,2) NOT NULL CHECK (amount > 0),
+    category_id INTEGER NOT NULL REFERENCES categories(id),
+    description TEXT NOT NULL,
+    transaction_date DATE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, transaction_date)
+) PARTITION BY RANGE (transaction_date);
+
+-- Страховочная секция: вставка не падает, даже если секция года ещё не создана
+CREATE TABLE transactions_default PARTITION OF transactions DEFAULT;
+
+-- Создание секции за год; строки этого года переносятся из секции по умолчанию
+CREATE OR REPLACE FUNCTION create_transaction_partition(partition_year INTEGER) RETURNS TEXT AS $$
+DECLARE
+    partition_name TEXT := format('transactions_y%s', partition_year);
+    range_start DATE := make_date(partition_year, 1, 1);
+    range_end DATE := make_date(partition_year + 1, 1, 1);
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM transactions_default WHERE transaction_date >= %L AND transaction_date < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        range_start, range_end, partition_name
+    );
+    -- CHECK-ограничение позволяет ATTACH обойтись без повторного сканирования секции
+    EXECUTE format(
+        'ALTER TABLE %I ADD CONSTRAINT %I CHECK (transaction_date >= %L AND transaction_date < %L)',
+        partition_name, partition_name || '_range', range_start, range_end
+    );
+    EXECUTE format(
+        'ALTER TABLE transactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, range_start, range_end
+    );
+    EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', partition_name, partition_name || '_range');
+
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Создание недостающих годовых секций в диапазоне дат, возвращает число созданных
+CREATE OR REPLACE FUNCTION ensure_transaction_partitions(from_date DATE, to_date DATE) RETURNS INTEGER AS $$
+DECLARE
+    partition_year INTEGER;
+    created_count INTEGER := 0;
+BEGIN
+    FOR partition_year IN EXTRACT(YEAR FROM from_date)::INTEGER .. EXTRACT(YEAR FROM to_date)::INTEGER LOOP
+        IF to_regclass(format('transactions_y%s', partition_year)) IS NULL
+            AND NOT EXISTS (SELECT 1 FROM transaction_archives WHERE partition_name = format('transactions_y%s', partition_year))
+        THEN
+            PERFORM create_transaction_partition(partition_year);
+            created_count := created_count + 1;
+        END IF;
+    END LOOP;
+    RETURN created_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Журнал секций, выгруженных в архив
+CREATE TABLE IF NOT EXISTS transaction_archives (
+    partition_name VARCHAR(63) PRIMARY KEY,
+    range_start DATE NOT NULL,
+    range_end DATE NOT NULL,
+    row_count BIGINT NOT NULL,
+    archive_path TEXT NOT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Помесячные агрегаты архивных секций: статистика остаётся полной после архивации
+CREATE TABLE IF NOT EXISTS transaction_archive_rollups (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    month DATE NOT NULL,
+    type VARCHAR(10) NOT NULL CHECK (type IN ('income', 'expense')),
+    category_id INTEGER NOT NULL REFERENCES categories(id),
+    total_amount DECIMAL(17,2) NOT NULL,
+    transaction_count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, month, type, category_id)
+);
+
+SELECT ensure_transaction_partitions(
+    COALESCE((SELECT MIN(transaction_date) FROM transactions_unpartitioned), CURRENT_DATE),
+    (CURRENT_DATE + INTERVAL '1 year')::DATE
+);
+
+INSERT INTO transactions (id, user_id, type, amount, category_id, description, transaction_date, created_at)
+SELECT id, user_id, type, amount, category_id, description, transaction_date, created_at
+FROM transactions_unpartitioned;
+
+ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id;
+DROP TABLE transactions_unpartitioned;
+
+-- Индексы на родительской таблице создаются в каждой секции
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions(user_id, transaction_date DESC, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_amount ON transactions(user_id, amount);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_category_id_date ON transactions(user_id, category_id, transaction_date DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_category_id ON transactions(category_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_date_brin ON transactions USING BRIN (transaction_date);
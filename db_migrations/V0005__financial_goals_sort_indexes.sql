@@ -0,0 +1,8 @@
+-- Индексы под сортировки и постраничную выдачу списка целей (keyset по id)
+CREATE INDEX IF NOT EXISTS idx_financial_goals_user_created ON financial_goals(user_id, is_completed, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_financial_goals_user_deadline ON financial_goals(user_id, is_completed, deadline_date, id);
+CREATE INDEX IF NOT EXISTS idx_financial_goals_user_progress ON financial_goals(user_id, is_completed, (current_amount / target_amount), id);
+CREATE INDEX IF NOT EXISTS idx_financial_goals_user_remaining ON financial_goals(user_id, is_completed, (target_amount - current_amount), id);
+
+-- Покрывается составными индексами выше
+DROP INDEX IF EXISTS idx_financial_goals_user_id;
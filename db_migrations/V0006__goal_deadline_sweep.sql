@@ -0,0 +1,22 @@
+-- Просроченные цели помечаются пакетной задачей и выпадают из её индекса
+ALTER TABLE financial_goals ADD COLUMN IF NOT EXISTS is_overdue BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Очередь уведомлений; dedup_key не даёт отправить одно напоминание дважды
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    goal_id INTEGER REFERENCES financial_goals(id) ON DELETE CASCADE,
+    kind VARCHAR(40) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    dedup_key VARCHAR(120) NOT NULL UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_unsent ON notification_outbox(id) WHERE sent_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_goal_id ON notification_outbox(goal_id);
+
+-- Обход открытых целей в порядке срока (keyset по deadline_date, id)
+DROP INDEX IF EXISTS idx_financial_goals_deadline;
+CREATE INDEX IF NOT EXISTS idx_financial_goals_open_deadline ON financial_goals(deadline_date, id)
+    WHERE is_completed = FALSE AND is_overdue = FALSE;
@@ -0,0 +1,29 @@
+-- Поток изменений для внешних потребителей (аналитика, уведомления, бюджеты).
+-- Событие пишется тем же запросом, что и изменение строки, и фиксируется вместе с ним.
+-- xact_id нужен потребителям: они читают только транзакции старше pg_snapshot_xmin,
+-- поэтому событие, закоммиченное позже соседей, не будет пропущено.
+CREATE TABLE IF NOT EXISTS change_events (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    shard SMALLINT GENERATED ALWAYS AS ((user_id % 16)::SMALLINT) STORED,
+    aggregate VARCHAR(20) NOT NULL CHECK (aggregate IN ('transaction', 'goal', 'category')),
+    aggregate_id INTEGER NOT NULL,
+    operation VARCHAR(10) NOT NULL CHECK (operation IN ('create', 'update', 'delete', 'merge')),
+    payload JSONB NOT NULL DEFAULT '{}',
+    xact_id XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_events_shard_position ON change_events(shard, xact_id, id);
+CREATE INDEX IF NOT EXISTS idx_change_events_user_id ON change_events(user_id);
+
+-- Позиция каждого потребителя в каждом шарде; строка блокируется FOR UPDATE SKIP LOCKED,
+-- так что параллельные воркеры одного потребителя разбирают разные шарды
+CREATE TABLE IF NOT EXISTS change_event_offsets (
+    consumer VARCHAR(100) NOT NULL,
+    shard SMALLINT NOT NULL,
+    last_xact_id XID8 NOT NULL DEFAULT '0',
+    last_event_id BIGINT NOT NULL DEFAULT 0,
+    polled_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (consumer, shard)
+);
@@ -0,0 +1,16 @@
+-- Ответы на запросы с заголовком Idempotency-Key: повтор запроса получает
+-- сохранённый ответ одним поиском по первичному ключу, без повторной записи
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id INTEGER NOT NULL,
+    scope VARCHAR(20) NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status_code SMALLINT,
+    response_body TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, scope, idempotency_key)
+);
+
+-- Для пакетной очистки просроченных ключей
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
@@ -0,0 +1,12 @@
+-- Общие для всех экземпляров функций token bucket'ы (RATE_LIMIT_SHARED=1).
+-- UNLOGGED: счётчики не пишутся в WAL, после сбоя лимиты просто начинаются заново
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    bucket_key VARCHAR(300) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    per_second DOUBLE PRECISION NOT NULL,
+    burst DOUBLE PRECISION NOT NULL,
+    allowed BOOLEAN NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated_at ON rate_limit_buckets(updated_at);
@@ -0,0 +1,38 @@
+-- Валюта операций, целей и базовая валюта пользователя (в ней считаются статистика и категории)
+ALTER TABLE users ADD COLUMN IF NOT EXISTS base_currency CHAR(3) NOT NULL DEFAULT 'RUB';
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS currency CHAR(3) NOT NULL DEFAULT 'RUB';
+ALTER TABLE financial_goals ADD COLUMN IF NOT EXISTS currency CHAR(3) NOT NULL DEFAULT 'RUB';
+
+-- Свёртки архива хранятся по валютам и пересчитываются по курсу на начало месяца
+ALTER TABLE transaction_archive_rollups ADD COLUMN IF NOT EXISTS currency CHAR(3) NOT NULL DEFAULT 'RUB';
+ALTER TABLE transaction_archive_rollups DROP CONSTRAINT IF EXISTS transaction_archive_rollups_pkey;
+ALTER TABLE transaction_archive_rollups ADD PRIMARY KEY (user_id, month, type, category_id, currency);
+
+-- Курсы валют, загружаемые локально (backend/transactions/rates.py): рублей за единицу валюты
+-- на дату, как публикует ЦБ РФ. У рубля курс всегда 1 и в таблице не хранится.
+CREATE TABLE IF NOT EXISTS exchange_rates (
+    currency CHAR(3) NOT NULL,
+    rate_date DATE NOT NULL,
+    rate NUMERIC(20, 10) NOT NULL CHECK (rate > 0),
+    PRIMARY KEY (currency, rate_date)
+);
+
+-- Последний известный курс на дату (выходные и праздники берут предыдущий рабочий день);
+-- для дат раньше первой загруженной — самый ранний курс
+CREATE OR REPLACE FUNCTION rub_rate(p_currency CHAR(3), p_date DATE) RETURNS NUMERIC
+LANGUAGE sql STABLE AS $$
+    SELECT CASE WHEN p_currency = 'RUB' THEN 1::NUMERIC ELSE COALESCE(
+        (SELECT rate FROM exchange_rates
+         WHERE currency = p_currency AND rate_date <= p_date
+         ORDER BY rate_date DESC LIMIT 1),
+        (SELECT rate FROM exchange_rates
+         WHERE currency = p_currency
+         ORDER BY rate_date LIMIT 1)
+    ) END
+$$;
+
+CREATE OR REPLACE FUNCTION convert_amount(p_amount NUMERIC, p_from CHAR(3), p_to CHAR(3), p_date DATE) RETURNS NUMERIC
+LANGUAGE sql STABLE AS $$
+    SELECT CASE WHEN p_from = p_to THEN p_amount
+        ELSE ROUND(p_amount * rub_rate(p_from, p_date) / rub_rate(p_to, p_date), 2) END
+$$;
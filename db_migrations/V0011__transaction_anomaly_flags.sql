@@ -0,0 +1,21 @@
+-- Результаты поиска аномалий: выбросы суммы внутри категории и вероятные дубли.
+-- Без внешнего ключа на transactions: архивирование отсоединяет партиции целиком,
+-- а удаление операции удаляет и её отметки тем же запросом
+CREATE TABLE IF NOT EXISTS transaction_flags (
+    transaction_id INTEGER NOT NULL,
+    kind VARCHAR(20) NOT NULL CHECK (kind IN ('outlier', 'duplicate')),
+    user_id INTEGER NOT NULL,
+    score DOUBLE PRECISION NOT NULL,
+    details JSONB NOT NULL DEFAULT '{}',
+    detected_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (transaction_id, kind)
+);
+
+CREATE INDEX IF NOT EXISTS idx_transaction_flags_user_id ON transaction_flags(user_id, detected_at DESC);
+
+-- Инкрементальный режим проверяет только операции с id больше последнего проверенного
+CREATE TABLE IF NOT EXISTS detection_state (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    last_transaction_id INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
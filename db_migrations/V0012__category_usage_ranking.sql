@@ -0,0 +1,27 @@
+-- Частота и давность использования категорий для выпадающего списка (action=categories_list).
+-- Поддерживаются теми же запросами, что создают, меняют и удаляют транзакции;
+-- архивирование строки не уменьшает счётчик: архивные операции тоже считаются использованием.
+ALTER TABLE categories ADD COLUMN IF NOT EXISTS usage_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE categories ADD COLUMN IF NOT EXISTS last_used_at DATE;
+
+UPDATE categories c
+SET usage_count = u.usage_count, last_used_at = u.last_used_at
+FROM (
+    SELECT category_id, SUM(usage_count)::INTEGER AS usage_count, MAX(last_used_at) AS last_used_at
+    FROM (
+        SELECT category_id, COUNT(*) AS usage_count, MAX(transaction_date) AS last_used_at
+        FROM transactions
+        GROUP BY category_id
+        UNION ALL
+        SELECT category_id, SUM(transaction_count), MAX(month)
+        FROM transaction_archive_rollups
+        GROUP BY category_id
+    ) usage
+    GROUP BY category_id
+) u
+WHERE c.id = u.category_id;
+
+-- Список категорий пользователя читается одним проходом по индексу в порядке ранжирования
+CREATE INDEX IF NOT EXISTS idx_categories_user_ranking
+    ON categories(user_id, usage_count DESC, last_used_at DESC NULLS LAST, id)
+    INCLUDE (name, normalized_name);
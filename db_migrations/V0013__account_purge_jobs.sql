@@ -0,0 +1,26 @@
+-- Удаление аккаунта и сброс данных пользователя (backend/auth/purge.py).
+-- Данные удаляются пакетами, каждый пакет фиксируется вместе с прогрессом задания,
+-- поэтому прерванное удаление продолжается с того же места.
+-- Без внешнего ключа на users: при удалении аккаунта строка пользователя удаляется
+-- последней, а завершённое задание остаётся как запись об удалении.
+CREATE TABLE IF NOT EXISTS account_purge_jobs (
+    user_id INTEGER PRIMARY KEY,
+    mode VARCHAR(10) NOT NULL CHECK (mode IN ('delete', 'reset')),
+    status VARCHAR(10) NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'done')),
+    step VARCHAR(40),
+    deleted_rows JSONB NOT NULL DEFAULT '{}',
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Пакеты удаления выбирают строки пользователя по индексу
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_user_id ON notification_outbox(user_id);
+
+-- Итоговое событие удаления/сброса для потребителей потока изменений
+ALTER TABLE change_events DROP CONSTRAINT IF EXISTS change_events_aggregate_check;
+ALTER TABLE change_events ADD CONSTRAINT change_events_aggregate_check
+    CHECK (aggregate IN ('transaction', 'goal', 'category', 'account'));
+ALTER TABLE change_events DROP CONSTRAINT IF EXISTS change_events_operation_check;
+ALTER TABLE change_events ADD CONSTRAINT change_events_operation_check
+    CHECK (operation IN ('create', 'update', 'delete', 'merge', 'reset'));
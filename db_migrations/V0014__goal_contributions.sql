@@ -0,0 +1,16 @@
+-- История пополнений целей (действие contribute в backend/goals).
+-- Пополнение увеличивает current_amount одним UPDATE и пишет строку истории тем же
+-- запросом, поэтому параллельные пополнения не теряются.
+-- current_amount хранит накопленную сумму цели сразу после пополнения.
+CREATE TABLE IF NOT EXISTS goal_contributions (
+    id BIGSERIAL PRIMARY KEY,
+    goal_id INTEGER NOT NULL REFERENCES financial_goals(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL,
+    amount DECIMAL(15,2) NOT NULL CHECK (amount > 0),
+    current_amount DECIMAL(15,2) NOT NULL,
+    note VARCHAR(255),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_goal_contributions_goal_id ON goal_contributions(goal_id, id);
+CREATE INDEX IF NOT EXISTS idx_goal_contributions_user_id ON goal_contributions(user_id);
@@ -0,0 +1,4 @@
+-- Удалённые и сброшенные аккаунты вычищаются и из архивных CSV (archive.py redact).
+-- redacted_at отмечает последнюю очистку архива: следующая обрабатывает только
+-- задания удаления, завершённые позже.
+ALTER TABLE transaction_archives ADD COLUMN IF NOT EXISTS redacted_at TIMESTAMP;
@@ -0,0 +1,6 @@
+-- Ключи сортировки по прогрессу и остатку считают NULL в current_amount нулём
+-- (COALESCE), индексы пересоздаются под те же выражения
+DROP INDEX IF EXISTS idx_financial_goals_user_progress;
+DROP INDEX IF EXISTS idx_financial_goals_user_remaining;
+CREATE INDEX IF NOT EXISTS idx_financial_goals_user_progress ON financial_goals(user_id, is_completed, (COALESCE(current_amount, 0) / target_amount), id);
+CREATE INDEX IF NOT EXISTS idx_financial_goals_user_remaining ON financial_goals(user_id, is_completed, (target_amount - COALESCE(current_amount, 0)), id);
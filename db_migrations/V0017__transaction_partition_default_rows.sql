@@ -0,0 +1,33 @@
+-- Создание секции за год: секция по умолчанию блокируется до переноса строк,
+-- чтобы между переносом и ATTACH в неё не попала строка этого года и ATTACH не упал
+CREATE OR REPLACE FUNCTION create_transaction_partition(partition_year INTEGER) RETURNS TEXT AS $$
+DECLARE
+    partition_name TEXT := format('transactions_y%s', partition_year);
+    range_start DATE := make_date(partition_year, 1, 1);
+    range_end DATE := make_date(partition_year + 1, 1, 1);
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+
+    LOCK TABLE transactions_default IN SHARE ROW EXCLUSIVE MODE;
+    EXECUTE format('CREATE TABLE %I (LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM transactions_default WHERE transaction_date >= %L AND transaction_date < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        range_start, range_end, partition_name
+    );
+    -- CHECK-ограничение позволяет ATTACH обойтись без повторного сканирования секции
+    EXECUTE format(
+        'ALTER TABLE %I ADD CONSTRAINT %I CHECK (transaction_date >= %L AND transaction_date < %L)',
+        partition_name, partition_name || '_range', range_start, range_end
+    );
+    EXECUTE format(
+        'ALTER TABLE transactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, range_start, range_end
+    );
+    EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', partition_name, partition_name || '_range');
+
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
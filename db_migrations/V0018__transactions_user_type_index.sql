@@ -0,0 +1,2 @@
+-- Индекс под фильтр списка транзакций по типу (доход/расход) в порядке выдачи списка
+CREATE INDEX IF NOT EXISTS idx_transactions_user_type_date ON transactions(user_id, type, transaction_date DESC, created_at DESC);
@@ -0,0 +1,11 @@
+-- Секцию, которую выгружает archive.py, замораживает строковый триггер: выгрузка
+-- идёт без блокировки родительской таблицы, и пока она не закончилась, строки
+-- этого года нельзя добавить, изменить или удалить. Поэтому выгрузка, свёртки
+-- и отсоединяемая секция совпадают. Триггер уровня строки, так как триггеры
+-- уровня оператора секции не срабатывают при записи через transactions.
+CREATE OR REPLACE FUNCTION reject_archiving_partition_write() RETURNS TRIGGER AS $$
+BEGIN
+    RAISE EXCEPTION 'Partition % is being archived', TG_TABLE_NAME
+        USING ERRCODE = 'object_not_in_prerequisite_state';
+END;
+$$ LANGUAGE plpgsql;
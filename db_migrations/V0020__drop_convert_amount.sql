@@ -0,0 +1,4 @@
+-- Статистика, сводка по категориям и reports.py пересчитывают суммы в базовую
+-- валюту в Python (backend/shared/rates.py) по курсам rub_rate(), которые
+-- функции кешируют; convert_amount() больше никто не вызывает
+DROP FUNCTION IF EXISTS convert_amount(NUMERIC, CHAR(3), CHAR(3), DATE);
@@ -0,0 +1,8 @@
+-- После удаления аккаунта строки users больше нет, и повтор запроса на удаление
+-- (например, если ответ 200 потерялся) не прошёл бы проверку пароля. Задание
+-- хранит хеш от email и хеша пароля, с которыми оно было начато: по нему
+-- auth/index.py находит завершённое удаление и возвращает его состояние.
+ALTER TABLE account_purge_jobs ADD COLUMN IF NOT EXISTS credentials_hash CHAR(64);
+
+CREATE INDEX IF NOT EXISTS idx_account_purge_jobs_credentials_hash
+    ON account_purge_jobs(credentials_hash) WHERE mode = 'delete' AND status = 'done';